@@ -1,5 +1,9 @@
 from flask_mail import Mail
 
+from mail_queue import MailQueue
+
 # Centralized Flask extensions to avoid circular imports
 mail = Mail()
+# 后台邮件发送队列，视图中使用 mail_queue.enqueue(msg) 代替 mail.send(msg)
+mail_queue = MailQueue(mail=mail)
 
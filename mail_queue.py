@@ -0,0 +1,302 @@
+# mail_queue.py
+"""
+后台邮件发送队列：请求内只负责入队，SMTP 连接、握手与发送都在后台线程中完成。
+
+- 有界队列：队列满时 enqueue() 立即返回 False，不阻塞 Web 请求；
+- 每个工作线程持有一条长连接（Flask-Mail Connection），空闲超过 idle_timeout 后断开，下次发送再建立；
+- 批量：一次取出最多 batch_size 封邮件，在同一连接上连续发送；
+- 重试：连接断开、超时或 4xx 临时错误时按指数退避重新入队，5xx 与收件人被拒等永久错误直接丢弃；
+- 指标：发送耗时直方图、发送结果计数与队列长度（spiders/metrics.py，Prometheus 文本格式）。
+
+本地测试可用 aiosmtpd 作为 SMTP 服务：
+    python -m aiosmtpd -n -l 127.0.0.1:8025
+    python mail_queue.py 200 127.0.0.1 8025
+"""
+import atexit
+import queue
+import random
+import smtplib
+import sys
+import threading
+import time
+
+from flask import Flask, current_app
+from flask_mail import Mail, Message
+
+from spiders import metrics
+
+# --- 配置区（可在 app.config 中以 MAIL_QUEUE_* 覆盖） ---
+MAIL_QUEUE_CONFIG = {
+    'MAIL_QUEUE_SIZE': 1000,         # 队列容量
+    'MAIL_QUEUE_WORKERS': 2,         # 工作线程数（即最多同时保持的 SMTP 连接数）
+    'MAIL_QUEUE_BATCH_SIZE': 20,     # 单次取出并在同一连接上发送的最大邮件数
+    'MAIL_QUEUE_MAX_RETRIES': 4,     # 临时错误的最大重试次数
+    'MAIL_QUEUE_BACKOFF': 2.0,       # 首次重试等待（秒），之后每次翻倍，并加入随机抖动
+    'MAIL_QUEUE_IDLE_TIMEOUT': 60,   # 连接空闲多久后断开（秒）
+}
+
+MAIL_SEND_SECONDS = metrics.REGISTRY.histogram(
+    'mail_send_seconds', '单封邮件的 SMTP 发送耗时（秒，不含排队）',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+MAIL_CONNECT_SECONDS = metrics.REGISTRY.histogram(
+    'mail_connect_seconds', '建立 SMTP 连接（含 TLS 与登录）的耗时（秒）')
+MAIL_QUEUE_WAIT_SECONDS = metrics.REGISTRY.histogram(
+    'mail_queue_wait_seconds', '邮件从入队到开始发送的等待时间（秒）')
+MAIL_MESSAGES = metrics.REGISTRY.counter(
+    'mail_messages_total', '邮件处理结果计数', ['result'])
+MAIL_QUEUE_DEPTH = metrics.REGISTRY.gauge(
+    'mail_queue_depth', '当前等待发送的邮件数')
+
+_STOP = object()
+
+
+class _Job:
+    __slots__ = ('message', 'attempt', 'enqueued_at')
+
+    def __init__(self, message, attempt=0):
+        self.message = message
+        self.attempt = attempt
+        self.enqueued_at = time.perf_counter()
+
+
+def _is_transient(error):
+    """连接类错误与 4xx 响应可以重试；5xx、收件人被拒、消息格式错误不重试。"""
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+class MailQueue:
+    """
+    用法：
+        mail_queue = MailQueue(mail=mail)       # extensions.py
+        mail_queue.init_app(app)                 # 可选；未调用时在第一次入队时按 current_app 初始化
+        mail_queue.enqueue(Message(...))
+    """
+
+    def __init__(self, app=None, mail=None):
+        self.app = None
+        self.mail = mail
+        self.config = dict(MAIL_QUEUE_CONFIG)
+        self._queue = None
+        self._workers = []
+        self._timers = set()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._idle = threading.Condition(self._lock)
+        self._stopped = False
+        if app is not None:
+            self.init_app(app, mail)
+
+    def init_app(self, app, mail=None):
+        self.app = app
+        self.mail = mail or self.mail
+        for key in MAIL_QUEUE_CONFIG:
+            if key in app.config:
+                self.config[key] = app.config[key]
+        self._queue = queue.Queue(maxsize=self.config['MAIL_QUEUE_SIZE'])
+        app.extensions['mail_queue'] = self
+
+    # ---------- 入队 ----------
+
+    def _ensure_workers(self):
+        # 线程在第一次入队时才启动，避免开发服务器的重载父进程也启动工作线程
+        if self._workers:
+            return
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.config['MAIL_QUEUE_WORKERS']):
+                worker = threading.Thread(target=self._run, name=f"mail-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            atexit.register(self.shutdown)
+
+    def enqueue(self, message):
+        """加入发送队列，立即返回；队列已满或已关闭时返回 False。"""
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    self.init_app(current_app._get_current_object())
+        if self._stopped:
+            return False
+        self._ensure_workers()
+        return self._put(_Job(message))
+
+    def _put(self, job):
+        with self._lock:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._done(1)
+            MAIL_MESSAGES.inc(result='dropped')
+            return False
+        MAIL_QUEUE_DEPTH.inc()
+        return True
+
+    def _done(self, n):
+        with self._lock:
+            self._pending -= n
+            if self._pending <= 0:
+                self._idle.notify_all()
+
+    def _schedule_retry(self, job):
+        delay = self.config['MAIL_QUEUE_BACKOFF'] * (2 ** job.attempt) * random.uniform(0.8, 1.2)
+        job.attempt += 1
+
+        def _requeue():
+            self._timers.discard(timer)
+            if not self._stopped:
+                self._queue.put(job)
+                MAIL_QUEUE_DEPTH.inc()
+            else:
+                self._done(1)
+
+        timer = threading.Timer(delay, _requeue)
+        timer.daemon = True
+        self._timers.add(timer)
+        timer.start()
+
+    # ---------- 工作线程 ----------
+
+    def _take_batch(self, timeout):
+        try:
+            first = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        batch = [first]
+        while first is not _STOP and len(batch) < self.config['MAIL_QUEUE_BATCH_SIZE']:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(job)
+            if job is _STOP:
+                break
+        MAIL_QUEUE_DEPTH.dec(sum(1 for job in batch if job is not _STOP))
+        return batch
+
+    def _open(self):
+        started = time.perf_counter()
+        connection = self.mail.connect()
+        connection.__enter__()
+        MAIL_CONNECT_SECONDS.observe(time.perf_counter() - started)
+        return connection
+
+    @staticmethod
+    def _close(connection):
+        if connection is None:
+            return
+        try:
+            connection.__exit__(None, None, None)
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    def _run(self):
+        connection = None
+        with self.app.app_context():
+            while True:
+                batch = self._take_batch(self.config['MAIL_QUEUE_IDLE_TIMEOUT'])
+                if batch is None:
+                    # 空闲超时：释放连接
+                    self._close(connection)
+                    connection = None
+                    continue
+                stop = batch[-1] is _STOP
+                jobs = batch[:-1] if stop else batch
+                for job in jobs:
+                    connection = self._send(connection, job)
+                if stop:
+                    self._close(connection)
+                    return
+
+    def _send(self, connection, job):
+        """发送一封邮件，返回之后可继续使用的连接（出错时为 None）。"""
+        MAIL_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - job.enqueued_at)
+        try:
+            if connection is None:
+                connection = self._open()
+            with MAIL_SEND_SECONDS.time():
+                connection.send(job.message)
+        except Exception as e:
+            self._close(connection)
+            connection = None
+            if _is_transient(e) and job.attempt < self.config['MAIL_QUEUE_MAX_RETRIES']:
+                MAIL_MESSAGES.inc(result='retried')
+                print(f"邮件发送失败（第 {job.attempt + 1} 次），稍后重试: {e}")
+                self._schedule_retry(job)
+                return None
+            MAIL_MESSAGES.inc(result='failed')
+            print(f"邮件发送失败，已放弃: {job.message.recipients} {e}")
+        else:
+            MAIL_MESSAGES.inc(result='sent')
+        self._done(1)
+        return connection
+
+    # ---------- 等待与关闭 ----------
+
+    def join(self, timeout=None):
+        """等待队列中（含等待重试的）邮件全部处理完；超时返回 False。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._pending > 0:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def shutdown(self, timeout=10):
+        """停止接收新邮件，尽量发完队列中的邮件后关闭连接。"""
+        if self._stopped or self._queue is None:
+            return
+        self.join(timeout)
+        self._stopped = True
+        for timer in list(self._timers):
+            timer.cancel()
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'pending': self._pending,
+            'sent': MAIL_MESSAGES.value(result='sent'),
+            'retried': MAIL_MESSAGES.value(result='retried'),
+            'failed': MAIL_MESSAGES.value(result='failed'),
+            'dropped': MAIL_MESSAGES.value(result='dropped'),
+        }
+
+
+def main():
+    """向本地 SMTP 服务（如 aiosmtpd）批量发送测试邮件，输出吞吐与耗时分布。"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    host = sys.argv[2] if len(sys.argv) > 2 else '127.0.0.1'
+    port = int(sys.argv[3]) if len(sys.argv) > 3 else 8025
+
+    app = Flask(__name__)
+    app.config.update(MAIL_SERVER=host, MAIL_PORT=port, MAIL_DEFAULT_SENDER='noreply@localhost')
+    mail = Mail(app)
+    mail_queue = MailQueue(app, mail)
+
+    started = time.perf_counter()
+    with app.app_context():
+        for i in range(count):
+            mail_queue.enqueue(Message(subject=f"测试邮件 {i}", recipients=[f"user{i}@localhost"],
+                                       html=f"<p>第 {i} 封</p>", charset='utf-8'))
+    enqueued = time.perf_counter() - started
+    mail_queue.join()
+    elapsed = time.perf_counter() - started
+    print(f"入队 {count} 封耗时 {enqueued * 1000:.1f} ms，全部发送耗时 {elapsed:.2f} 秒（{count / elapsed:.0f} 封/秒）")
+    print(mail_queue.stats())
+    print(metrics.REGISTRY.render())
+    mail_queue.shutdown()
+
+
+if __name__ == '__main__':
+    main()
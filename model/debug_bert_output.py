@@ -119,13 +119,16 @@ def robust_sentiment_analysis(text, classifier):
 
 def fallback_analysis(text):
     """备用分析方法"""
-    import jieba
+    try:
+        from model.segment_service import cut_text
+    except ImportError:
+        from segment_service import cut_text
 
     # 简单的关键词分析
     pos_keywords = ['期待', '美', '棒', '好', '赞', '支持', '666', '热血', '扬帆起航']
     neg_keywords = ['差', '坏', '失望', '烂']
 
-    words = jieba.lcut(text)
+    words = cut_text(text)
 
     pos_score = sum(1 for word in words if any(pk in word for pk in pos_keywords))
     neg_score = sum(1 for word in words if any(nk in word for nk in neg_keywords))
@@ -153,7 +156,7 @@ def fallback_analysis(text):
 
 def run_fixed_analysis():
     """运行修复后的分析"""
-    from utils.getPublicData import getAllCommentData
+    from utils.stream_query import iter_comments
 
     print("🚀 运行修复后的情感分析...")
 
@@ -164,15 +167,14 @@ def run_fixed_analysis():
         print("❌ 无法加载BERT模型，使用备用方案")
         return
 
-    # 获取数据
-    commentsList = getAllCommentData()
+    # 只流式读取需要的列与行数，不加载整张评论表
+    comments = iter_comments(columns=['content'], limit=10)
 
     # 分析前几条，确认修复效果
     print(f"\n📊 分析前10条评论，验证修复效果:")
     print("=" * 80)
 
-    for i in range(min(10, len(commentsList))):
-        text = commentsList[i][5]
+    for i, (text,) in enumerate(comments):
         score, label, confidence = robust_sentiment_analysis(text, classifier)
 
         print(f"{i + 1:2d} | {score:5.3f} | {label:8s} | {text[:50]}")
@@ -6,6 +6,12 @@ os.environ["PYTORCH_ENABLE_MPS_FALLBACK"] = "1"
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 torch.set_printoptions(precision=4, sci_mode=False)
 
+try:
+    from spiders import profiling
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "spiders"))
+    import profiling
+
 MAC_DIR = "./sentiment_model_clean_v2"   # 你的 MacBERT ckpt 目录
 ROB_DIR = "./sentiment_roberta"         # 你的 RoBERTa ckpt 目录
 MAX_LEN = 160
@@ -39,30 +45,63 @@ def load_models(tokenizer_dir, mac_dir, rob_dir, device):
 
     return tok, m_mac, m_rob
 
+@profiling.timed('predict_ensemble', profile=True)
 @torch.inference_mode()
 def predict_ensemble(texts, tok, m_mac, m_rob, device, max_length=160, temp=1.0, bias=None):
     assert isinstance(texts, (list, tuple)), "texts must be a list of strings"
     assert len(texts) > 0, "texts is empty"
     print(f"[run] batch_size={len(texts)}  max_length={max_length}  temp={temp}")
 
-    enc = tok(texts, truncation=True, padding=True, max_length=max_length, return_tensors="pt")
-    enc = {k: v.to(device) for k, v in enc.items()}
+    with profiling.span('bert.tokenize'):
+        enc = tok(texts, truncation=True, padding=True, max_length=max_length, return_tensors="pt")
+        enc = {k: v.to(device) for k, v in enc.items()}
     print("[shape] input_ids:", tuple(enc["input_ids"].shape))
 
-    logit_mac = m_mac(**enc).logits
-    logit_rob = m_rob(**enc).logits
-    print("[shape] logits mac:", tuple(logit_mac.shape), "rob:", tuple(logit_rob.shape))
+    # GPU / MPS 上前向是异步的，耗时会计入之后同步的 .cpu()，因此 forward 区段一直包到取回结果
+    with profiling.span('bert.forward'):
+        logit_mac = m_mac(**enc).logits
+        logit_rob = m_rob(**enc).logits
+        print("[shape] logits mac:", tuple(logit_mac.shape), "rob:", tuple(logit_rob.shape))
+
+        logits = (logit_mac + logit_rob) / 2
+        if bias is not None:
+            # bias 例如：对 negative 轻扣 0.10 -> torch.tensor([-0.10, 0.0, 0.0], device=device)
+            logits = logits + bias
 
-    logits = (logit_mac + logit_rob) / 2
-    if bias is not None:
-        # bias 例如：对 negative 轻扣 0.10 -> torch.tensor([-0.10, 0.0, 0.0], device=device)
-        logits = logits + bias
+        probs = torch.softmax(logits / float(temp), dim=-1)
+        pred  = probs.argmax(dim=-1).cpu().tolist()
+        return pred, probs.cpu().numpy()
 
-    probs = torch.softmax(logits / float(temp), dim=-1)
-    pred  = probs.argmax(dim=-1).cpu().tolist()
-    return pred, probs.cpu().numpy()
+def _load_dedup():
+    try:
+        from spiders import dedup
+    except ImportError:
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "spiders"))
+        import dedup
+    return dedup
+
+def predict_deduplicated(texts, tok, m_mac, m_rob, device, batch_size=64, **kwargs):
+    """
+    近似重复评论只推理一次：先用 MinHash/LSH 聚类，只对每个簇的代表文本打分，再广播回所有文本。
+    返回值与 predict_ensemble 相同（pred 列表, probs 数组），顺序与 texts 一致。
+    """
+    assert isinstance(texts, (list, tuple)), "texts must be a list of strings"
+    assert len(texts) > 0, "texts is empty"
+    with profiling.span('dedup.cluster'):
+        canonical = np.asarray(_load_dedup().cluster_texts(texts))
+    reps, inverse = np.unique(canonical, return_inverse=True)
+    print(f"[dedup] {len(texts)} texts -> {len(reps)} representatives")
+
+    rep_probs = []
+    for i in range(0, len(reps), batch_size):
+        batch = [texts[j] for j in reps[i:i + batch_size]]
+        _, probs = predict_ensemble(batch, tok, m_mac, m_rob, device, **kwargs)
+        rep_probs.append(probs)
+    probs = np.concatenate(rep_probs)[inverse]
+    return probs.argmax(axis=-1).tolist(), probs
 
 def main():
+    profiling.start_run('ensemble', sys.argv)
     device = get_device()
     try:
         tok, m_mac, m_rob = load_models(MAC_DIR, MAC_DIR, ROB_DIR, device)
@@ -0,0 +1,238 @@
+"""
+增量 TF-IDF 关键词引擎。
+
+评论词元来自 segment_service.TokenStore（词表ID即列下标），每条评论的词频存为 scipy CSR 行，
+文档频率（DF）随导入增量累加。按文章 / 分类 / 地区 / 时间窗口的 Top-K 关键词均在查询时
+用 NumPy 向量化计算，新一天的数据只需追加新行，无需全量重算。
+"""
+import csv
+import os
+import re
+import sys
+
+import numpy as np
+from scipy import sparse
+
+try:
+    from model.segment_service import TokenStore, update_store, load_comments_from_csv
+except ImportError:
+    from segment_service import TokenStore, update_store, load_comments_from_csv
+
+# --- 配置区 ---
+ENGINE_PATH = './keyword_engine'          # 保存为 <path>_matrix.npz 与 <path>_meta.npz
+KEYWORDS_FILE = './tfidf_keywords.txt'
+ARTICLES_CSV = '../articleData_sample.csv'
+COMMENTS_CSV = '../commentsData.csv'
+
+_META_FIELDS = ('comment_ids', 'article_ids', 'typenames', 'regions')
+_DAY_RE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+def _day(created_at):
+    match = _DAY_RE.match(str(created_at or ''))
+    return match.group(0) if match else 'NaT'
+
+
+class KeywordEngine:
+
+    def __init__(self):
+        self.df = np.zeros(0, dtype=np.int64)
+        self.n_docs = 0
+        self._blocks = []
+        self._matrix = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.comment_ids = np.array([], dtype=object)
+        self.article_ids = np.array([], dtype=object)
+        self.typenames = np.array([], dtype=object)
+        self.regions = np.array([], dtype=object)
+        self.days = np.array([], dtype='datetime64[D]')
+        self._known = set()
+
+    # --- 构建 ---
+    def _grow(self, n_terms):
+        if n_terms > self.df.size:
+            self.df = np.concatenate([self.df, np.zeros(n_terms - self.df.size, dtype=np.int64)])
+
+    def add_documents(self, store, docs):
+        """
+        追加评论文档。docs 为字典可迭代对象，字段：commentId, articleId, typename, region, created_at；
+        词元从 store 中按 commentId 读取，库中没有或已加入引擎的评论会被跳过。返回新增文档数。
+        """
+        token_ids, offsets = store.token_ids, store.offsets
+        indptr, indices, data = [0], [], []
+        meta = {field: [] for field in _META_FIELDS}
+        days = []
+        for doc in docs:
+            comment_id = str(doc['commentId'])
+            if comment_id in self._known:
+                continue
+            i = store.index_of(comment_id)
+            if i is None:
+                continue
+            terms, counts = np.unique(token_ids[offsets[i]:offsets[i + 1]], return_counts=True)
+            indices.append(terms)
+            data.append(counts)
+            indptr.append(indptr[-1] + terms.size)
+            self._known.add(comment_id)
+            meta['comment_ids'].append(comment_id)
+            meta['article_ids'].append(str(doc.get('articleId', '')))
+            meta['typenames'].append(doc.get('typename') or '')
+            meta['regions'].append(doc.get('region') or '')
+            days.append(_day(doc.get('created_at')))
+
+        if len(indptr) == 1:
+            return 0
+        n_terms = len(store.vocab)
+        self._grow(n_terms)
+        block = sparse.csr_matrix(
+            (np.concatenate(data).astype(np.int32), np.concatenate(indices), np.asarray(indptr)),
+            shape=(len(indptr) - 1, n_terms))
+        # 每行的 indices 已去重，直接累加即为文档频率
+        self.df[:n_terms] += np.bincount(block.indices, minlength=n_terms)
+        self.n_docs += block.shape[0]
+        self._blocks.append(block)
+
+        for field in _META_FIELDS:
+            setattr(self, field, np.concatenate([getattr(self, field), np.array(meta[field], dtype=object)]))
+        self.days = np.concatenate([self.days, np.array(days, dtype='datetime64[D]')])
+        return block.shape[0]
+
+    @property
+    def matrix(self):
+        """合并后的文档-词频 CSR 矩阵（按需合并追加的分块）。"""
+        n_terms = self.df.size
+        if self._blocks or self._matrix.shape[1] != n_terms:
+            parts = [self._resize(self._matrix, n_terms)] + [self._resize(b, n_terms) for b in self._blocks]
+            self._matrix = sparse.vstack(parts, format='csr')
+            self._blocks = []
+        return self._matrix
+
+    @staticmethod
+    def _resize(m, n_terms):
+        if m.shape[1] == n_terms:
+            return m
+        return sparse.csr_matrix((m.data, m.indices, m.indptr), shape=(m.shape[0], n_terms))
+
+    # --- 查询 ---
+    def _mask(self, article=None, typename=None, region=None, start=None, end=None):
+        mask = np.ones(self.n_docs, dtype=bool)
+        if article is not None:
+            mask &= self.article_ids == str(article)
+        if typename is not None:
+            mask &= self.typenames == typename
+        if region is not None:
+            mask &= self.regions == region
+        if start is not None:
+            mask &= self.days >= np.datetime64(start, 'D')
+        if end is not None:
+            mask &= self.days <= np.datetime64(end, 'D')
+        return mask
+
+    def idf(self):
+        return np.log((1.0 + self.n_docs) / (1.0 + self.df)) + 1.0
+
+    def _top_from_counts(self, vocab, counts, k):
+        total = counts.sum()
+        if total == 0:
+            return []
+        scores = (counts / total) * self.idf()
+        k = min(k, int(np.count_nonzero(counts)))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(vocab[i], round(float(scores[i]), 4)) for i in top]
+
+    def top_keywords(self, vocab, k=30, **filters):
+        """
+        按过滤条件（article / typename / region / start / end，日期为 'YYYY-MM-DD'）
+        汇总选中评论的词频并乘以全库 IDF，返回 [(词, 分数), ...]。
+        """
+        if self.n_docs == 0:
+            return []
+        mask = self._mask(**filters)
+        if not mask.any():
+            return []
+        counts = np.asarray(self.matrix[mask].sum(axis=0)).ravel()
+        return self._top_from_counts(vocab, counts, k)
+
+    def top_keywords_by(self, vocab, field, k=10):
+        """对 article_ids / typenames / regions 中的每个取值分别计算 Top-K。"""
+        values = getattr(self, field)
+        if values.size == 0:
+            return {}
+        keys, group = np.unique(values.astype(str), return_inverse=True)
+        # 分组指示矩阵 × 文档词频矩阵 = 各组词频，一次稀疏乘法完成所有分组
+        indicator = sparse.csr_matrix(
+            (np.ones(group.size, dtype=np.int32), (group, np.arange(group.size))),
+            shape=(keys.size, group.size))
+        grouped = (indicator @ self.matrix).tocsr()
+        return {str(key): self._top_from_counts(vocab, grouped[i].toarray().ravel(), k)
+                for i, key in enumerate(keys)}
+
+    # --- 持久化 ---
+    def save(self, path=ENGINE_PATH):
+        sparse.save_npz(f"{path}_matrix.npz", self.matrix)
+        np.savez_compressed(
+            f"{path}_meta.npz", df=self.df, n_docs=np.array(self.n_docs), days=self.days,
+            **{field: getattr(self, field).astype(str) for field in _META_FIELDS})
+
+    @classmethod
+    def load(cls, path=ENGINE_PATH):
+        engine = cls()
+        if not (os.path.exists(f"{path}_matrix.npz") and os.path.exists(f"{path}_meta.npz")):
+            return engine
+        engine._matrix = sparse.load_npz(f"{path}_matrix.npz").tocsr()
+        with np.load(f"{path}_meta.npz") as meta:
+            engine.df = meta['df'].astype(np.int64)
+            engine.n_docs = int(meta['n_docs'])
+            engine.days = meta['days']
+            for field in _META_FIELDS:
+                setattr(engine, field, meta[field].astype(object))
+        engine._known = set(engine.comment_ids.tolist())
+        return engine
+
+
+def load_article_typenames(csv_file=ARTICLES_CSV):
+    """文章ID → 分类名映射。"""
+    if not os.path.exists(csv_file):
+        return {}
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        return {row['id']: row.get('typename') or row.get('type') or '' for row in csv.DictReader(f)}
+
+
+def load_comment_docs(csv_file=COMMENTS_CSV, typenames=None):
+    """从评论CSV构造引擎所需的文档元数据。"""
+    typenames = typenames or {}
+    if not os.path.exists(csv_file):
+        print(f"评论CSV文件 {csv_file} 不存在。")
+        return []
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        return [{
+            'commentId': row['commentId'], 'articleId': row['articleId'],
+            'typename': typenames.get(row['articleId'], ''), 'region': row.get('region', ''),
+            'created_at': row.get('created_at', ''),
+        } for row in csv.DictReader(f)]
+
+
+def export_keywords(engine, vocab, path=KEYWORDS_FILE, k=30):
+    """写出全库 Top-K 关键词（与原 tfidf_keywords.txt 格式一致：词\\t分数）。"""
+    keywords = engine.top_keywords(vocab, k=k)
+    with open(path, 'w', encoding='utf-8') as f:
+        for word, score in keywords:
+            f.write(f"{word}\t{score:.4f}\n")
+    return keywords
+
+
+def main():
+    comments_csv = sys.argv[1] if len(sys.argv) > 1 else COMMENTS_CSV
+    store = TokenStore.load()
+    engine = KeywordEngine.load()
+    new_ids = update_store(load_comments_from_csv(comments_csv), store)
+    added = engine.add_documents(store, load_comment_docs(comments_csv, load_article_typenames()))
+    print(f"新增分词 {len(new_ids)} 条，新增关键词文档 {added} 条，引擎共 {engine.n_docs} 条。")
+    if added:
+        engine.save()
+    for word, score in export_keywords(engine, store.vocab):
+        print(f"{word}\t{score:.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+文章 / 评论 / 情感结果的 Parquet 列式归档。
+
+- 每个数据集按分区列写成 Hive 风格目录（如 articles/month=2025-09/part-*.parquet），
+  按月分区保证每个分区文件足够大；分类、日期等其余条件靠行组统计裁剪。字符串列使用字典编码 + zstd 压缩；
+- append() 支持增量追加：按主键列投影读取已有ID（批量导出时只读一次），只写入新行，每次追加生成新的分片文件；
+- read() 通过 pyarrow.dataset 做列投影与谓词下推，分区过滤在目录层面直接裁剪，不读无关文件；
+- compact() 把零碎的追加分片按分区合并为单个文件。
+"""
+import csv
+import os
+import shutil
+import sys
+import time
+import uuid
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+# --- 配置区 ---
+ARCHIVE_DIR = './parquet_archive'
+SOURCES = {
+    'articles': ['../articleData_21.csv', '../spiders/article.csv'],
+    'comments': ['../commentsData.csv', '../spiders/commentsData.csv'],
+    'sentiment': ['./sentiment_analysis_results.csv'],
+}
+
+_STR = pa.string()
+DATASETS = {
+    'articles': {
+        'key': 'id',
+        'partitions': ['month'],
+        'schema': pa.schema([
+            ('id', _STR), ('typename', _STR), ('content', _STR), ('created_at', pa.timestamp('s')),
+            ('likeNum', pa.int64()), ('commentsLen', pa.int64()), ('reposts_count', pa.int64()),
+            ('region', _STR), ('contentLen', pa.int64()), ('detailUrl', _STR), ('authorName', _STR),
+            ('authorDetail', _STR), ('authorAvatar', _STR), ('isVip', _STR), ('month', _STR),
+        ]),
+    },
+    'comments': {
+        'key': 'commentId',
+        'partitions': ['month'],
+        'schema': pa.schema([
+            ('articleId', _STR), ('commentId', _STR), ('created_at', pa.timestamp('s')),
+            ('like_counts', pa.int64()), ('region', _STR), ('content', _STR), ('authorName', _STR),
+            ('authorGender', _STR), ('authorAddress', _STR), ('authorAvatar', _STR), ('month', _STR),
+        ]),
+    },
+    'sentiment': {
+        'key': 'index',
+        'partitions': ['predicted_sentiment'],
+        'schema': pa.schema([
+            ('index', _STR), ('text', _STR), ('score', pa.float64()), ('label', _STR),
+            ('volcano_label', _STR), ('confidence_score', pa.float64()),
+            ('predicted_sentiment', _STR), ('predicted_confidence_score', pa.float64()),
+        ]),
+    },
+}
+
+# 低基数字符串列，写出时使用字典编码
+_DICTIONARY_COLUMNS = {'typename', 'region', 'isVip', 'authorGender', 'authorAddress',
+                       'label', 'volcano_label', 'predicted_sentiment', 'month'}
+
+
+def _dataset_dir(name, root):
+    return os.path.join(root, name)
+
+
+def _partitioning(name):
+    schema = DATASETS[name]['schema']
+    return ds.partitioning(pa.schema([schema.field(c) for c in DATASETS[name]['partitions']]), flavor='hive')
+
+
+def _coerce(value, type_):
+    value = (value or '').strip() if isinstance(value, str) else value
+    if value in ('', None):
+        return None
+    if pa.types.is_integer(type_):
+        return int(value) if str(value).lstrip('-').isdigit() else None
+    if pa.types.is_floating(type_):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    if pa.types.is_timestamp(type_):
+        value = str(value)[:19]
+        try:
+            time.strptime(value, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return None
+        return value
+    return str(value)
+
+
+def rows_to_table(name, rows):
+    """把字典行（CSV DictReader 的输出）转换为该数据集 schema 的 Arrow 表，缺失的分区列 month 由 created_at 推出。"""
+    schema = DATASETS[name]['schema']
+    columns = {field.name: [] for field in schema}
+    for row in rows:
+        for field in schema:
+            if field.name == 'month':
+                continue
+            columns[field.name].append(_coerce(row.get(field.name), field.type))
+        if 'month' in columns:
+            created = columns['created_at'][-1]
+            columns['month'].append(created[:7] if created else 'unknown')
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        if pa.types.is_timestamp(field.type):
+            arrays.append(pc.strptime(pa.array(values, _STR), format='%Y-%m-%d %H:%M:%S', unit='s'))
+        else:
+            arrays.append(pa.array(values, field.type))
+    table = pa.Table.from_arrays(arrays, schema=schema)
+    # 分区列不能为空值
+    for column in DATASETS[name]['partitions']:
+        i = table.schema.get_field_index(column)
+        table = table.set_column(i, column, pc.fill_null(table[column], 'unknown'))
+    return table
+
+
+def _existing_keys(name, root):
+    path = _dataset_dir(name, root)
+    if not os.path.isdir(path):
+        return set()
+    key = DATASETS[name]['key']
+    dataset = ds.dataset(path, format='parquet', partitioning=_partitioning(name))
+    return set(dataset.to_table(columns=[key])[key].to_pylist())
+
+
+def _write(name, table, root, basename_template):
+    file_format = ds.ParquetFileFormat()
+    options = file_format.make_write_options(
+        compression='zstd',
+        use_dictionary=[c for c in table.column_names if c in _DICTIONARY_COLUMNS])
+    ds.write_dataset(
+        table, _dataset_dir(name, root), format=file_format, file_options=options,
+        partitioning=_partitioning(name), basename_template=basename_template,
+        existing_data_behavior='overwrite_or_ignore', max_rows_per_group=64 * 1024)
+
+
+def append(name, rows, root=ARCHIVE_DIR, existing=None):
+    """
+    增量追加一批字典行到数据集，主键已存在的行会被跳过；返回写入的行数。
+    每次追加写出新的分片文件（part-<时间戳>-<随机串>-{i}.parquet），不改动已有文件。
+    existing 为已归档主键的集合，连续多次追加时由调用方读取一次后传入，本函数会把新写入的主键加进去；
+    不传时从归档中读取。
+    """
+    table = rows if isinstance(rows, pa.Table) else rows_to_table(name, rows)
+    if table.num_rows == 0:
+        return 0
+    key = DATASETS[name]['key']
+    # 同批内按主键去重，保留首次出现的行
+    keys = table[key].to_pylist()
+    seen = existing if existing is not None else _existing_keys(name, root)
+    keep = []
+    for i, k in enumerate(keys):
+        if k is not None and k not in seen:
+            seen.add(k)
+            keep.append(i)
+    if not keep:
+        return 0
+    table = table.take(pa.array(keep, pa.int64()))
+    _write(name, table, root, f"part-{int(time.time())}-{uuid.uuid4().hex[:8]}-{{i}}.parquet")
+    return table.num_rows
+
+
+def append_csv(name, csv_file, root=ARCHIVE_DIR):
+    if not os.path.exists(csv_file):
+        print(f"CSV文件 {csv_file} 不存在，跳过。")
+        return 0
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        return append(name, csv.DictReader(f), root)
+
+
+def _filters_to_expression(filters):
+    """[('typename', '=', '热门'), ('month', '>=', '2025-09'), ('region', 'in', [...])] → 数据集表达式"""
+    ops = {
+        '=': lambda f, v: f == v, '==': lambda f, v: f == v, '!=': lambda f, v: f != v,
+        '<': lambda f, v: f < v, '<=': lambda f, v: f <= v, '>': lambda f, v: f > v, '>=': lambda f, v: f >= v,
+        'in': lambda f, v: f.isin(list(v)), 'not in': lambda f, v: ~f.isin(list(v)),
+    }
+    expression = None
+    for column, op, value in filters:
+        if op not in ops:
+            raise ValueError(f"不支持的过滤运算符: {op}")
+        term = ops[op](ds.field(column), value)
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def read(name, columns=None, filters=None, root=ARCHIVE_DIR, to_pandas=True):
+    """
+    读取数据集，columns 为需要的列（投影），filters 为 (列, 运算符, 值) 列表（谓词下推）。
+    分区列（month / predicted_sentiment）上的条件直接裁剪目录，其余条件利用行组统计跳过数据块。
+    """
+    path = _dataset_dir(name, root)
+    if not os.path.isdir(path):
+        schema = DATASETS[name]['schema']
+        table = schema.empty_table() if columns is None else pa.schema([schema.field(c) for c in columns]).empty_table()
+    else:
+        dataset = ds.dataset(path, format='parquet', partitioning=_partitioning(name))
+        table = dataset.to_table(columns=columns, filter=_filters_to_expression(filters or []))
+    return table.to_pandas() if to_pandas else table
+
+
+def compact(name, root=ARCHIVE_DIR):
+    """按分区把多次追加产生的小文件合并成一个文件；返回合并后的行数。"""
+    path = _dataset_dir(name, root)
+    if not os.path.isdir(path):
+        return 0
+    table = ds.dataset(path, format='parquet', partitioning=_partitioning(name)).to_table()
+    tmp_path = f"{path}.compact-{uuid.uuid4().hex[:8]}"
+    _write(name, table, tmp_path, 'part-0-{i}.parquet')
+    backup = f"{path}.old"
+    os.replace(path, backup)
+    os.replace(_dataset_dir(name, tmp_path), path)
+    shutil.rmtree(backup)
+    shutil.rmtree(tmp_path)
+    return table.num_rows
+
+
+def export_from_database(connection, root=ARCHIVE_DIR, batch_size=50000):
+    """
+    从 MySQL 导出文章与评论到归档（增量，已归档的ID会被跳过）。
+    使用服务端游标逐批读取，已归档主键每个数据集只读一次。
+    """
+    import pymysql.cursors
+
+    totals = {}
+    for name, table_name in (('articles', 'articles'), ('comments', 'comments')):
+        fields = [f.name for f in DATASETS[name]['schema'] if f.name != 'month']
+        existing = _existing_keys(name, root)
+        cursor = connection.cursor(pymysql.cursors.SSCursor)
+        try:
+            cursor.execute(f"SELECT {', '.join(fields)} FROM {table_name}")
+            totals[name] = 0
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                dict_rows = ({f: (str(v) if v is not None else None) for f, v in zip(fields, row)} for row in rows)
+                totals[name] += append(name, dict_rows, root, existing=existing)
+        finally:
+            cursor.close()
+    return totals
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else ARCHIVE_DIR
+    for name, files in SOURCES.items():
+        for csv_file in files:
+            started = time.perf_counter()
+            written = append_csv(name, csv_file, root)
+            if written:
+                print(f"{name}: 从 {csv_file} 追加 {written} 行，耗时 {time.perf_counter() - started:.2f} 秒。")
+    for name in DATASETS:
+        path = _dataset_dir(name, root)
+        if os.path.isdir(path):
+            files = sum(len(fs) for _, _, fs in os.walk(path))
+            size = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(path) for f in fs)
+            print(f"{name}: {files} 个文件，共 {size / 1024:.1f} KB")
+
+
+if __name__ == '__main__':
+    main()
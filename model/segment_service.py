@@ -0,0 +1,263 @@
+"""
+评论分词服务：多进程 jieba 分词 + 按 commentId 缓存的列式词元库。
+
+- segment_texts()      批量分词 API，每个工作进程只加载一次词典；
+- TokenStore           列式存储（词表 + int32 词元ID + 偏移量），保存为 .npz；
+- update_store()       只对库中不存在的新评论分词，先保存词元库，再把新词元追加到 cutComments.txt；
+- word_frequencies()   词频统计直接基于已存词元，不再重新切分整个语料。
+"""
+import csv
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+# --- 配置区 ---
+STORE_PATH = './segment_store.npz'
+CUT_FILE = './cutComments.txt'
+COMMENTS_CSV = '../commentsData.csv'
+USER_DICT = None  # 可选的 jieba 自定义词典路径
+CHUNK_SIZE = 500  # 每个子任务的评论条数
+
+STOPWORDS = {
+    '的', '了', '是', '我', '你', '他', '她', '它', '们', '这', '那', '啊', '吧', '呢', '吗', '哦', '嗯',
+    '一个', '什么', '没有', '就是', '还是', '不是', '自己', '这个', '那个', '这样', '怎么', '可以',
+    '快来', '一下', '我们', '你们', '他们', '已经', '因为', '所以', '但是', '如果', '而且',
+}
+_NOISE_RE = re.compile(r'@\S+|https?://\S+|\[[^\]]{1,8}\]')
+_PUNCT_RE = re.compile(r'^[\W_]+$', re.UNICODE)
+
+_jieba = None
+
+
+def _load_jieba(user_dict=None):
+    """加载 jieba 并初始化词典；每个进程只执行一次。"""
+    global _jieba
+    if _jieba is None:
+        import jieba
+        jieba.setLogLevel(60)
+        jieba.initialize()
+        if user_dict and os.path.exists(user_dict):
+            jieba.load_userdict(user_dict)
+        _jieba = jieba
+    return _jieba
+
+
+def _init_worker(user_dict):
+    _load_jieba(user_dict)
+
+
+@lru_cache(maxsize=20000)
+def cut_text(text):
+    """单条文本的原始分词结果（未过滤），带缓存，供规则分析等零散调用。"""
+    return tuple(_load_jieba(USER_DICT).lcut(text or ''))
+
+
+def filter_tokens(tokens):
+    """去除单字、纯标点与停用词，得到统计用词元。"""
+    return [t for t in (tok.strip() for tok in tokens)
+            if len(t) >= 2 and t not in STOPWORDS and not _PUNCT_RE.match(t)]
+
+
+def _cut_batch(texts):
+    jieba = _load_jieba()
+    return [filter_tokens(jieba.lcut(_NOISE_RE.sub(' ', text or ''))) for text in texts]
+
+
+def segment_texts(texts, processes=None, chunk_size=CHUNK_SIZE, user_dict=USER_DICT):
+    """
+    批量分词，返回与输入等长的词元列表。
+    数据量不足两个分块时直接在当前进程中完成，避免进程启动开销。
+    """
+    texts = list(texts)
+    if len(texts) <= chunk_size * 2 or processes == 1:
+        _load_jieba(user_dict)
+        return _cut_batch(texts)
+
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    results = []
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(user_dict,)) as executor:
+        for tokens in executor.map(_cut_batch, chunks):
+            results.extend(tokens)
+    return results
+
+
+class TokenStore:
+    """
+    按 commentId 存放分词结果的列式词元库。
+    词元以 int32 词表ID连续存放，offsets[i]:offsets[i+1] 为第 i 条评论的词元区间。
+    """
+
+    def __init__(self):
+        self.vocab = []
+        self._vocab_index = {}
+        self.comment_ids = []
+        self._id_index = {}
+        self._token_ids = np.zeros(0, dtype=np.int32)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._pending_tokens = []
+        self._pending_offsets = []
+
+    def __len__(self):
+        return len(self.comment_ids)
+
+    def __contains__(self, comment_id):
+        return str(comment_id) in self._id_index
+
+    def index_of(self, comment_id):
+        """commentId 在库中的行号，不存在时返回 None。"""
+        return self._id_index.get(str(comment_id))
+
+    def _flush(self):
+        if not self._pending_offsets:
+            return
+        base = self._offsets[-1]
+        self._token_ids = np.concatenate([self._token_ids, np.asarray(self._pending_tokens, dtype=np.int32)])
+        self._offsets = np.concatenate([self._offsets, base + np.asarray(self._pending_offsets, dtype=np.int64)])
+        self._pending_tokens = []
+        self._pending_offsets = []
+
+    def add(self, comment_id, tokens):
+        comment_id = str(comment_id)
+        if comment_id in self._id_index:
+            return False
+        for token in tokens:
+            idx = self._vocab_index.get(token)
+            if idx is None:
+                idx = self._vocab_index[token] = len(self.vocab)
+                self.vocab.append(token)
+            self._pending_tokens.append(idx)
+        self._pending_offsets.append(len(self._pending_tokens))
+        self._id_index[comment_id] = len(self.comment_ids)
+        self.comment_ids.append(comment_id)
+        return True
+
+    @property
+    def token_ids(self):
+        self._flush()
+        return self._token_ids
+
+    @property
+    def offsets(self):
+        self._flush()
+        return self._offsets
+
+    def tokens(self, comment_id):
+        i = self._id_index.get(str(comment_id))
+        if i is None:
+            return None
+        offsets = self.offsets
+        return [self.vocab[t] for t in self.token_ids[offsets[i]:offsets[i + 1]]]
+
+    def iter_documents(self, comment_ids=None):
+        """依次产出 (commentId, 词元列表)；comment_ids 为空时遍历全部。"""
+        ids = self.comment_ids if comment_ids is None else comment_ids
+        token_ids, offsets = self.token_ids, self.offsets
+        for comment_id in ids:
+            i = self._id_index.get(str(comment_id))
+            if i is not None:
+                yield comment_id, [self.vocab[t] for t in token_ids[offsets[i]:offsets[i + 1]]]
+
+    def term_counts(self):
+        """全库词频向量（下标为词表ID）。"""
+        return np.bincount(self.token_ids, minlength=len(self.vocab))
+
+    def save(self, path=STORE_PATH):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            vocab=np.array(self.vocab, dtype=str),
+            comment_ids=np.array(self.comment_ids, dtype=str),
+            token_ids=self.token_ids,
+            offsets=self.offsets,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=STORE_PATH):
+        store = cls()
+        if not os.path.exists(path):
+            return store
+        with np.load(path) as data:
+            store.vocab = data['vocab'].tolist()
+            store.comment_ids = data['comment_ids'].tolist()
+            store._token_ids = data['token_ids'].astype(np.int32)
+            store._offsets = data['offsets'].astype(np.int64)
+        store._vocab_index = {tok: i for i, tok in enumerate(store.vocab)}
+        store._id_index = {cid: i for i, cid in enumerate(store.comment_ids)}
+        return store
+
+
+def load_comments_from_csv(csv_file=COMMENTS_CSV):
+    """读取评论CSV，返回 [(commentId, content), ...]。"""
+    if not os.path.exists(csv_file):
+        print(f"评论CSV文件 {csv_file} 不存在。")
+        return []
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return [(row[1], row[5]) for row in reader if len(row) > 5]
+
+
+def update_store(comments, store=None, processes=None, cut_file=CUT_FILE, store_path=STORE_PATH):
+    """
+    只对词元库中不存在的评论分词并入库，新词元按一行一个追加写入 cut_file。
+    comments 为 (commentId, content) 可迭代对象；返回本次新增的 commentId 列表。
+    有新评论时先把词元库保存到 store_path，再追加 cut_file：中途崩溃最多少写几行，
+    不会出现词元库不认识、下次又被重复追加的行。
+    """
+    store = store if store is not None else TokenStore.load()
+    new_comments = []
+    seen = set()
+    for comment_id, content in comments:
+        comment_id = str(comment_id)
+        if comment_id in store or comment_id in seen:
+            continue
+        seen.add(comment_id)
+        new_comments.append((comment_id, content))
+    if not new_comments:
+        return []
+
+    token_lists = segment_texts([content for _, content in new_comments], processes=processes)
+    for (comment_id, _), tokens in zip(new_comments, token_lists):
+        store.add(comment_id, tokens)
+    store.save(store_path)
+
+    if cut_file:
+        with open(cut_file, 'a', encoding='utf-8') as f:
+            for tokens in token_lists:
+                if tokens:
+                    f.write('\n'.join(tokens))
+                    f.write('\n')
+    return [comment_id for comment_id, _ in new_comments]
+
+
+def word_frequencies(store, top_k=100):
+    """基于已存词元的词频 Top-K，返回 [(词, 次数), ...]。"""
+    counts = store.term_counts()
+    if counts.size == 0:
+        return []
+    top_k = min(top_k, counts.size)
+    top = np.argpartition(-counts, top_k - 1)[:top_k]
+    top = top[np.argsort(-counts[top], kind='stable')]
+    return [(store.vocab[i], int(counts[i])) for i in top if counts[i] > 0]
+
+
+def main():
+    csv_file = sys.argv[1] if len(sys.argv) > 1 else COMMENTS_CSV
+    store = TokenStore.load()
+    print(f"词元库已有 {len(store)} 条评论。")
+    new_ids = update_store(load_comments_from_csv(csv_file), store)
+    if new_ids:
+        print(f"新增分词 {len(new_ids)} 条评论，词元库共 {len(store)} 条，词表 {len(store.vocab)} 个。")
+    else:
+        print("没有新评论需要分词。")
+    for word, count in word_frequencies(store, top_k=20):
+        print(f"{word}\t{count}")
+
+
+if __name__ == '__main__':
+    main()
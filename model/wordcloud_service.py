@@ -0,0 +1,250 @@
+"""
+词云渲染服务：基于预计算词频表按需生成分类 / 文章词云。
+
+- 输入直接使用 keyword_engine / segment_service 的词频结果，不再读取全量分词文本；
+- 渲染结果（PNG/SVG）按 词频数据 + 字体 + 蒙版 + 尺寸 的哈希缓存在磁盘，命中即直接返回文件；
+- 布局（layout_）按 预览 / 正式 尺寸分别缓存：预览图用低分辨率布局快速出图，
+  不同 scale 的正式图复用同一个正式布局按倍率重绘；
+- 字体对象按 (字体文件, 字号) 进程内复用，避免每个词、每次渲染都重新解析字体文件；
+  替换只在本服务计算布局、绘制期间生效，不影响进程内其他使用 wordcloud 的代码。
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageFont
+import wordcloud.wordcloud as _wordcloud_module
+from wordcloud import WordCloud
+
+# --- 配置区 ---
+WORDCLOUD_CONFIG = {
+    'cache_dir': './wordcloud_cache',
+    'width': 800,
+    'height': 600,
+    'preview_width': 320,      # 预览图布局宽度，高度按比例缩放
+    'max_words': 200,
+    'background_color': 'white',
+    'colormap': 'viridis',
+    'random_state': 42,        # 固定随机种子，保证同一数据的布局可复现、可缓存
+    'layout_cache_size': 64,   # 进程内布局 LRU 大小
+}
+
+# 字体名 → 字体文件（与 hierarchical_wordcloud/ 下的两种样式对应）
+FONTS = {
+    'STHeiti': '/System/Library/Fonts/STHeiti Medium.ttc',
+    'FZZJ-LongYTJW': './fonts/FZZJ-LongYTJW.TTF',
+}
+
+
+class _CachedImageFont:
+    """ImageFont 代理：truetype() 结果按 (字体文件, 字号) 缓存，其余属性透传给 PIL.ImageFont。"""
+
+    truetype = staticmethod(lru_cache(maxsize=1024)(ImageFont.truetype))
+
+    def __getattr__(self, name):
+        return getattr(ImageFont, name)
+
+
+_font_lock = threading.Lock()
+_font_users = 0
+
+
+@contextmanager
+def _cached_fonts():
+    """
+    wordcloud 在布局与绘制中逐词调用模块级的 ImageFont.truetype；
+    在此期间把它换成带缓存的代理，最后一个使用者退出时恢复原模块。
+    """
+    global _font_users
+    with _font_lock:
+        if _font_users == 0:
+            _wordcloud_module.ImageFont = _CachedImageFont()
+        _font_users += 1
+    try:
+        yield
+    finally:
+        with _font_lock:
+            _font_users -= 1
+            if _font_users == 0:
+                _wordcloud_module.ImageFont = ImageFont
+
+
+def frequency_hash(frequencies):
+    """词频表的稳定哈希（与字典插入顺序无关）。"""
+    payload = json.dumps(sorted((str(w), round(float(f), 6)) for w, f in frequencies.items()),
+                         ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _file_signature(path):
+    if not path:
+        return ''
+    try:
+        return f"{os.path.abspath(path)}:{os.path.getmtime(path):.0f}"
+    except OSError:
+        return os.path.abspath(path)
+
+
+class WordCloudService:
+
+    def __init__(self, cache_dir=None, fonts=None, config=None):
+        self.config = dict(WORDCLOUD_CONFIG, **(config or {}))
+        self.cache_dir = cache_dir or self.config['cache_dir']
+        self.fonts = dict(FONTS, **(fonts or {}))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._layouts = OrderedDict()
+
+    # --- 资源 ---
+    def _font_path(self, font):
+        path = self.fonts.get(font, font)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"字体文件不存在: {path}")
+        return path
+
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def _load_mask(mask_path, signature):
+        return np.array(Image.open(mask_path).convert('L'))
+
+    def _mask(self, mask_path, preview):
+        if not mask_path:
+            return None
+        mask = self._load_mask(mask_path, _file_signature(mask_path))
+        if preview:
+            ratio = self.config['preview_width'] / mask.shape[1]
+            size = (self.config['preview_width'], max(1, int(mask.shape[0] * ratio)))
+            mask = np.array(Image.fromarray(mask).resize(size, Image.NEAREST))
+        return mask
+
+    # --- 布局 ---
+    def _dimensions(self, preview):
+        width, height = self.config['width'], self.config['height']
+        if preview:
+            height = max(1, int(height * self.config['preview_width'] / width))
+            width = self.config['preview_width']
+        return width, height
+
+    def _new_wordcloud(self, font_path, mask, preview):
+        width, height = self._dimensions(preview)
+        return WordCloud(
+            font_path=font_path, width=width, height=height, mask=mask,
+            max_words=self.config['max_words'], background_color=self.config['background_color'],
+            colormap=self.config['colormap'], random_state=self.config['random_state'],
+            prefer_horizontal=0.9)
+
+    def _layout_path(self, key):
+        return os.path.join(self.cache_dir, f"layout_{key}.json")
+
+    def _cache_key(self, frequencies, font_path, mask_path, preview, *extra):
+        parts = [
+            frequency_hash(frequencies), _file_signature(font_path), _file_signature(mask_path),
+            'preview' if preview else 'full', json.dumps(self._dimensions(preview)),
+            str(self.config['max_words']), str(self.config['random_state']),
+        ] + [str(e) for e in extra]
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def layout(self, frequencies, font='STHeiti', mask_path=None, preview=False):
+        """计算（或从缓存取出）布局，返回已带 layout_ 的 WordCloud 对象。"""
+        font_path = self._font_path(font)
+        key = self._cache_key(frequencies, font_path, mask_path, preview)
+
+        wc = self._new_wordcloud(font_path, self._mask(mask_path, preview), preview)
+        layout = self._layouts.get(key)
+        if layout is None and os.path.exists(self._layout_path(key)):
+            with open(self._layout_path(key), 'r', encoding='utf-8') as f:
+                layout = [((w, c), size, tuple(pos), orient, color)
+                          for (w, c), size, pos, orient, color in json.load(f)]
+        if layout is None:
+            with _cached_fonts():
+                wc.generate_from_frequencies(frequencies)
+            layout = wc.layout_
+            tmp_path = f"{self._layout_path(key)}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump([[[str(w), float(c)], int(size), [int(x) for x in pos],
+                            None if orient is None else int(orient), color]
+                           for (w, c), size, pos, orient, color in layout], f, ensure_ascii=False)
+            os.replace(tmp_path, self._layout_path(key))
+        wc.layout_ = layout
+
+        self._layouts[key] = layout
+        self._layouts.move_to_end(key)
+        while len(self._layouts) > self.config['layout_cache_size']:
+            self._layouts.popitem(last=False)
+        return wc
+
+    # --- 渲染 ---
+    def render(self, frequencies, font='STHeiti', mask_path=None, fmt='png', scale=1, preview=False):
+        """
+        渲染词云并返回缓存文件路径。
+        preview=True 时使用低分辨率布局快速出图；scale>1 时复用同一布局按倍率绘制高清图。
+        """
+        if fmt not in ('png', 'svg'):
+            raise ValueError(f"不支持的输出格式: {fmt}")
+        if not frequencies:
+            raise ValueError("词频表为空，无法生成词云")
+        font_path = self._font_path(font)
+        key = self._cache_key(frequencies, font_path, mask_path, preview,
+                              fmt, scale, self.config['background_color'], self.config['colormap'])
+        path = os.path.join(self.cache_dir, f"{key}.{fmt}")
+        if os.path.exists(path):
+            return path
+
+        wc = self.layout(frequencies, font, mask_path, preview)
+        wc.scale = scale
+        tmp_path = f"{path}.tmp"
+        with _cached_fonts():
+            if fmt == 'svg':
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(wc.to_svg(embed_font=False))
+            else:
+                wc.to_image().save(tmp_path, format='PNG', optimize=True)
+        os.replace(tmp_path, path)
+        return path
+
+    def render_keywords(self, keywords, **kwargs):
+        """keywords 为 [(词, 权重), ...]，如 KeywordEngine.top_keywords() 的返回值。"""
+        return self.render({word: weight for word, weight in keywords}, **kwargs)
+
+
+def render_for_typename(service, engine, vocab, typename, k=200, **kwargs):
+    """按分类的 TF-IDF 关键词生成词云。"""
+    return service.render_keywords(engine.top_keywords(vocab, k=k, typename=typename), **kwargs)
+
+
+def render_for_article(service, engine, vocab, article_id, k=200, **kwargs):
+    """按文章的 TF-IDF 关键词生成词云。"""
+    return service.render_keywords(engine.top_keywords(vocab, k=k, article=article_id), **kwargs)
+
+
+def main():
+    try:
+        from model.keyword_engine import KeywordEngine
+        from model.segment_service import TokenStore
+    except ImportError:
+        from keyword_engine import KeywordEngine
+        from segment_service import TokenStore
+
+    font = sys.argv[1] if len(sys.argv) > 1 else 'STHeiti'
+    store = TokenStore.load()
+    engine = KeywordEngine.load()
+    if engine.n_docs == 0:
+        print("关键词引擎为空，请先运行 keyword_engine.py。")
+        return
+    service = WordCloudService()
+    for typename in sorted(set(engine.typenames.astype(str)) - {''}):
+        keywords = engine.top_keywords(store.vocab, k=service.config['max_words'], typename=typename)
+        if not keywords:
+            continue
+        preview = service.render_keywords(keywords, font=font, preview=True)
+        full = service.render_keywords(keywords, font=font, scale=2)
+        print(f"{typename}: 预览 {preview}，高清 {full}")
+
+
+if __name__ == '__main__':
+    main()
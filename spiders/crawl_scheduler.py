@@ -0,0 +1,226 @@
+"""
+评论爬取调度：按文章热度（commentsLen / likeNum / reposts_count）和距上次爬取的时长排序，
+跳过零评论文章，并把有限的请求预算按比例分配给最可能产出新评论的文章。
+"""
+import csv
+import json
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+
+# 调度任务：文章ID、优先级分数、本轮评论预算
+CrawlTask = namedtuple('CrawlTask', ['article_id', 'priority', 'budget'])
+
+SCHEDULER_CONFIG = {
+    'state_file': './crawl_state.json',
+    'refresh_hours': 6.0,        # 距上次爬取超过该时长视为完全过期
+    'min_recrawl_minutes': 30,   # 距上次爬取不足该时长的文章本轮跳过
+    'min_budget': 10,            # 单篇文章的最小预算（不超过其剩余评论数）
+    'max_budget_factor': 5,      # 单篇预算上限 = 基础预算 × 该系数
+    'weights': {'commentsLen': 1.0, 'likeNum': 0.3, 'reposts_count': 0.5},
+}
+
+
+class CrawlStateStore:
+    """
+    每篇文章的爬取状态（上次爬取时间、已抓取评论数、最新评论水位线、未完成时的续爬位置），持久化为 JSON 文件。
+    线程安全；save() 通过临时文件原子替换，避免中途退出写坏状态文件。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or SCHEDULER_CONFIG['state_file']
+        self._lock = threading.Lock()
+        self._state = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._state = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[调度] 读取爬取状态文件 {self.path} 失败，将从空状态开始: {e}")
+
+    def get(self, article_id):
+        with self._lock:
+            return dict(self._state.get(str(article_id), {}))
+
+    def record_crawl(self, article_id, fetched, crawled_at=None):
+        with self._lock:
+            entry = self._state.setdefault(str(article_id), {})
+            entry['last_crawled'] = crawled_at or time.time()
+            entry['crawled_count'] = entry.get('crawled_count', 0) + int(fetched)
+
+    def watermark(self, article_id):
+        """返回该文章已见过的最新 commentId（整数），从未爬过时为 None。"""
+        with self._lock:
+            value = self._state.get(str(article_id), {}).get('newest_comment_id')
+        return int(value) if value else None
+
+    def resume_point(self, article_id):
+        """上一轮未翻到水位线时留下的续爬位置 (max_id, below_id)，没有则为 None。"""
+        with self._lock:
+            entry = self._state.get(str(article_id), {})
+            if 'resume_max_id' not in entry:
+                return None
+            return entry['resume_max_id'], entry.get('resume_below_id')
+
+    def advance_watermark(self, article_id, comments, resume=None):
+        """
+        用本次抓到的评论行（articleId, commentId, created_at, ...）推进水位线，只前进不后退。
+        resume 非 None 表示本轮没有翻到旧水位线（预算用尽、请求失败或被终止），中间仍有未抓的评论：
+        水位线保持不变，本轮见到的最新评论暂存为待定水位线，并记下续爬位置；
+        之后某一轮续爬完成时，才把待定水位线与该轮结果一起提升为水位线。
+        """
+        newest = None
+        for row in comments:
+            try:
+                comment_id = int(row[1])
+            except (TypeError, ValueError, IndexError):
+                continue
+            if newest is None or comment_id > newest[0]:
+                newest = (comment_id, row[2])
+        with self._lock:
+            entry = self._state.setdefault(str(article_id), {})
+            pending = entry.get('pending_newest_comment_id')
+            if pending and (newest is None or int(pending) > newest[0]):
+                newest = (int(pending), entry.get('pending_newest_created_at'))
+            if resume is not None:
+                entry['resume_max_id'], entry['resume_below_id'] = resume
+                if newest is not None:
+                    entry['pending_newest_comment_id'] = str(newest[0])
+                    entry['pending_newest_created_at'] = newest[1]
+                return
+            for key in ('resume_max_id', 'resume_below_id', 'pending_newest_comment_id', 'pending_newest_created_at'):
+                entry.pop(key, None)
+            if newest is not None and newest[0] > int(entry.get('newest_comment_id') or 0):
+                entry['newest_comment_id'] = str(newest[0])
+                entry['newest_created_at'] = newest[1]
+
+    def update(self, article_id, **fields):
+        with self._lock:
+            self._state.setdefault(str(article_id), {}).update(fields)
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self._state, ensure_ascii=False)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+
+def _to_int(value):
+    value = str(value or '').strip()
+    return int(value) if value.isdigit() else 0
+
+
+def load_article_stats(filename):
+    """
+    从文章CSV读取调度所需字段，按表头名取值，兼容 article.csv 与 articleData.csv 两种列顺序。
+    返回 [{'id', 'commentsLen', 'likeNum', 'reposts_count'}, ...]
+    """
+    if not os.path.exists(filename):
+        print(f"错误: 输入文件 {filename} 不存在。")
+        return []
+    with open(filename, 'r', encoding='utf-8') as f:
+        return [article_stats_from_row(row) for row in csv.DictReader(f) if row.get('id')]
+
+
+def article_stats_from_row(row):
+    return {
+        'id': row['id'],
+        'commentsLen': _to_int(row.get('commentsLen')),
+        'likeNum': _to_int(row.get('likeNum')),
+        'reposts_count': _to_int(row.get('reposts_count')),
+    }
+
+
+def priority_score(article, state_entry, now=None, refresh_hours=None, weights=None):
+    """
+    热度分（对数压缩，避免超级爆款独占）× 过期系数。
+    从未爬过的文章过期系数为 1；刚爬过的文章接近 0，随时间线性恢复到 1。
+    """
+    weights = weights or SCHEDULER_CONFIG['weights']
+    refresh_hours = refresh_hours or SCHEDULER_CONFIG['refresh_hours']
+    engagement = sum(w * math.log1p(article.get(field, 0)) for field, w in weights.items())
+    last_crawled = state_entry.get('last_crawled')
+    if last_crawled is None:
+        staleness = 1.0
+    else:
+        age_hours = max(0.0, ((now or time.time()) - last_crawled) / 3600.0)
+        staleness = min(1.0, age_hours / refresh_hours)
+    return engagement * staleness
+
+
+def _allocate(demands, weights, total):
+    """注水法按权重分配预算：已满足需求的文章让出的余量继续分给其他文章。"""
+    budgets = [0] * len(demands)
+    active = [i for i, d in enumerate(demands) if d > 0 and weights[i] > 0]
+    remaining = total
+    while active and remaining > 0:
+        weight_sum = sum(weights[i] for i in active)
+        spent = 0
+        still_active = []
+        for i in active:
+            share = max(1, int(remaining * weights[i] / weight_sum))
+            grant = max(0, min(share, demands[i] - budgets[i], remaining - spent))
+            budgets[i] += grant
+            spent += grant
+            if budgets[i] < demands[i]:
+                still_active.append(i)
+        remaining -= spent
+        if spent == 0:
+            break
+        active = still_active
+    return budgets
+
+
+def plan_crawl(articles, state_store, base_budget=100, total_budget=None, now=None, config=None):
+    """
+    生成按优先级降序排列的 CrawlTask 列表。
+    - commentsLen == 0 的文章直接跳过；
+    - 已爬过的文章只为估计的新增评论（commentsLen - 已抓取数）分配预算，且需已过期才会重排；
+    - total_budget 默认为 base_budget × 可调度文章数，按优先级权重分配，单篇上限为 base_budget × max_budget_factor。
+    """
+    config = dict(SCHEDULER_CONFIG, **(config or {}))
+    now = now or time.time()
+    per_article_cap = int(base_budget * config['max_budget_factor'])
+
+    candidates = []
+    for article in articles:
+        if article['commentsLen'] <= 0:
+            continue
+        entry = state_store.get(article['id']) if state_store is not None else {}
+        last_crawled = entry.get('last_crawled')
+        if last_crawled is not None and now - last_crawled < config['min_recrawl_minutes'] * 60:
+            continue
+        expected_new = article['commentsLen'] - entry.get('crawled_count', 0)
+        if last_crawled is not None and expected_new <= 0:
+            # 已抓到的数量不少于发布时的评论数，仍给少量预算用于发现新评论
+            expected_new = config['min_budget']
+        if 'resume_max_id' in entry:
+            # 上一轮未翻到水位线，中间还有未抓的评论，至少给一整份基础预算续爬
+            expected_new = max(expected_new, base_budget)
+        score = priority_score(article, entry, now, config['refresh_hours'], config['weights'])
+        if score <= 0:
+            continue
+        demand = min(per_article_cap, expected_new)
+        candidates.append((article['id'], score, demand))
+
+    if not candidates:
+        return []
+    if total_budget is None:
+        total_budget = base_budget * len(candidates)
+
+    candidates.sort(key=lambda c: c[1], reverse=True)
+    demands = [c[2] for c in candidates]
+    weights = [c[1] for c in candidates]
+    budgets = _allocate(demands, weights, total_budget)
+
+    tasks = []
+    for (article_id, score, demand), budget in zip(candidates, budgets):
+        # 保底预算，但不超过该文章的需求
+        budget = max(budget, min(config['min_budget'], demand))
+        if budget > 0:
+            tasks.append(CrawlTask(article_id, round(score, 4), budget))
+    return tasks
@@ -0,0 +1,234 @@
+"""
+评论近似重复 / 灌水检测：MinHash 签名 + LSH 分桶。
+
+- 文本先归一化（去掉 @昵称、链接、数字和空白），"亲爱的 @xxx ，你发布的博文很受超话用户欢迎"
+  这类模板评论归一化后几乎相同；
+- 以字符 n-gram 为特征，整批评论的 MinHash 签名在 NumPy 中一次性算出（按排列并行取最小值）；
+- 签名切成 bands 段，任一段完全相同即为候选，再以签名相似度确认，命中则归入该簇；
+- 每个簇的第一条评论为代表（canonical），后续评论只记录其 canonicalId，
+  情感分析只需对代表评论打分，再把结果广播给同簇评论。
+"""
+import os
+import re
+import threading
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+# --- 配置区 ---
+DEDUP_CONFIG = {
+    'state_file': './dedup_state.npz',
+    'num_perm': 64,
+    'bands': 16,          # 16 段 × 4 行，约在 Jaccard ≈ 0.5 附近开始成为候选
+    'threshold': 0.7,     # 签名相似度达到该值才确认为同簇
+    'ngram': 3,
+    'seed': 1,
+}
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_NOISE_RE = re.compile(r'@[^\s，,：:]+|https?://\S+|\d+|\s+')
+
+
+def normalize_text(text):
+    """去除 @昵称、链接、数字与空白，并统一为小写。"""
+    return _NOISE_RE.sub('', (text or '').lower())
+
+
+def shingle_hashes(text, ngram=3):
+    """归一化文本的字符 n-gram 哈希（去重后的 uint64 数组）；短文本整体作为一个特征。"""
+    if len(text) <= ngram:
+        grams = {text}
+    else:
+        grams = {text[i:i + ngram] for i in range(len(text) - ngram + 1)}
+    return np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64) \
+            % _MERSENNE_PRIME
+        self.b = rng.randint(0, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64) \
+            % _MERSENNE_PRIME
+
+    def signatures(self, shingle_arrays, chunk_size=2000):
+        """批量计算签名，返回 (文档数, num_perm) 的 uint32 矩阵；按块计算以限制中间矩阵的内存。"""
+        if len(shingle_arrays) > chunk_size:
+            return np.vstack([self.signatures(shingle_arrays[i:i + chunk_size], chunk_size)
+                              for i in range(0, len(shingle_arrays), chunk_size)])
+        lengths = np.fromiter((s.size for s in shingle_arrays), dtype=np.int64, count=len(shingle_arrays))
+        if lengths.size == 0:
+            return np.zeros((0, self.num_perm), dtype=np.uint32)
+        values = np.concatenate(shingle_arrays)
+        # (a·x + b) mod p 的低 32 位；uint64 乘法溢出回绕不影响作为哈希族使用
+        hashed = ((values[:, None] * self.a[None, :] + self.b[None, :]) % _MERSENNE_PRIME) & _MAX_HASH
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        return np.minimum.reduceat(hashed, starts, axis=0).astype(np.uint32)
+
+
+class DedupIndex:
+    """
+    增量去重索引：只保存每个簇代表的签名与 LSH 分桶，新评论与已有簇比较后返回所属簇。
+    线程安全，可被多个入库线程共享。
+    """
+
+    def __init__(self, config=None):
+        self.config = dict(DEDUP_CONFIG, **(config or {}))
+        self.num_perm = self.config['num_perm']
+        self.bands = self.config['bands']
+        if self.num_perm % self.bands:
+            raise ValueError("num_perm 必须能被 bands 整除")
+        self.rows = self.num_perm // self.bands
+        self.hasher = MinHasher(self.num_perm, self.config['seed'])
+        self._lock = threading.Lock()
+        self._buckets = [{} for _ in range(self.bands)]   # 每段: 段内容 → 代表序号
+        self._exact = {}                                  # 归一化文本 → 代表序号
+        self.canonical_ids = []
+        self.cluster_sizes = []
+        self._signatures = np.zeros((0, self.num_perm), dtype=np.uint32)
+        self._pending = []
+        self._txn_lock = threading.RLock()
+        self._journal = None   # 事务内 assign() 的改动记录，用于回滚
+
+    def __len__(self):
+        return len(self.canonical_ids)
+
+    def _signature(self, i):
+        if i >= self._signatures.shape[0]:
+            self._signatures = np.vstack([self._signatures] + self._pending)
+            self._pending = []
+        return self._signatures[i]
+
+    def _band_keys(self, signature):
+        return [signature[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+
+    def _add_canonical(self, comment_id, normalized, signature, band_keys):
+        i = len(self.canonical_ids)
+        self.canonical_ids.append(comment_id)
+        self.cluster_sizes.append(1)
+        self._pending.append(signature[None, :])
+        self._exact[normalized] = i
+        for band, key in zip(self._buckets, band_keys):
+            band.setdefault(key, i)
+        if self._journal is not None:
+            self._journal.append(('canonical', i, normalized, band_keys))
+        return i
+
+    def _undo(self, journal):
+        for entry in reversed(journal):
+            if entry[0] == 'size':
+                self.cluster_sizes[entry[1]] -= 1
+                continue
+            _, i, normalized, band_keys = entry
+            # 事务串行执行，本事务新增的代表一定位于末尾
+            self.canonical_ids.pop()
+            self.cluster_sizes.pop()
+            if self._pending:
+                self._pending.pop()
+            else:
+                self._signatures = self._signatures[:i]
+            if self._exact.get(normalized) == i:
+                del self._exact[normalized]
+            for band, key in zip(self._buckets, band_keys):
+                if band.get(key) == i:
+                    del band[key]
+
+    @contextmanager
+    def transaction(self):
+        """
+        把 assign() 与调用方的数据库提交绑在一起：块内抛出异常时撤销本次新增的簇代表与簇计数，
+        避免索引里留下数据库中不存在的代表ID。事务之间串行执行，数据库提交应放在块内。
+        """
+        with self._txn_lock:
+            self._journal = []
+            try:
+                yield self
+            except BaseException:
+                with self._lock:
+                    self._undo(self._journal)
+                raise
+            finally:
+                self._journal = None
+
+    def assign(self, comments):
+        """
+        为一批 (commentId, content) 分配簇，返回等长的 [(commentId, canonicalId), ...]；
+        canonicalId == commentId 表示该评论是簇代表。
+        """
+        comments = [(str(cid), normalize_text(content)) for cid, content in comments]
+        if not comments:
+            return []
+        ngram = self.config['ngram']
+        signatures = self.hasher.signatures([shingle_hashes(text, ngram) for _, text in comments])
+        threshold = self.config['threshold']
+
+        result = []
+        with self._lock:
+            for (comment_id, normalized), signature in zip(comments, signatures):
+                i = self._exact.get(normalized)
+                if i is None:
+                    band_keys = self._band_keys(signature)
+                    candidates = {band[key] for band, key in zip(self._buckets, band_keys) if key in band}
+                    best, best_sim = None, threshold
+                    for c in candidates:
+                        sim = float(np.mean(self._signature(c) == signature))
+                        if sim >= best_sim:
+                            best, best_sim = c, sim
+                    if best is None:
+                        self._add_canonical(comment_id, normalized, signature, band_keys)
+                        result.append((comment_id, comment_id))
+                        continue
+                    i = best
+                self.cluster_sizes[i] += 1
+                if self._journal is not None:
+                    self._journal.append(('size', i))
+                result.append((comment_id, self.canonical_ids[i]))
+        return result
+
+    # --- 持久化 ---
+    def save(self, path=None):
+        path = path or self.config['state_file']
+        with self._lock:
+            if self._pending:
+                self._signature(len(self.canonical_ids) - 1)
+            tmp_path = f"{path}.tmp.npz"
+            np.savez_compressed(
+                tmp_path, signatures=self._signatures,
+                canonical_ids=np.array(self.canonical_ids, dtype=str),
+                cluster_sizes=np.array(self.cluster_sizes, dtype=np.int64),
+                normalized=np.array(list(self._exact.keys()), dtype=str),
+                normalized_index=np.array(list(self._exact.values()), dtype=np.int64))
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=None, config=None):
+        index = cls(config)
+        path = path or index.config['state_file']
+        if not os.path.exists(path):
+            return index
+        with np.load(path) as data:
+            if data['signatures'].shape[1] != index.num_perm:
+                print(f"去重状态 {path} 的签名长度与配置不一致，已忽略。")
+                return index
+            index._signatures = data['signatures'].astype(np.uint32)
+            index.canonical_ids = data['canonical_ids'].tolist()
+            index.cluster_sizes = data['cluster_sizes'].tolist()
+            index._exact = dict(zip(data['normalized'].tolist(), data['normalized_index'].tolist()))
+        for i, signature in enumerate(index._signatures):
+            for band, key in zip(index._buckets, index._band_keys(signature)):
+                band.setdefault(key, i)
+        return index
+
+
+def cluster_texts(texts, config=None):
+    """
+    对一组文本做一次性聚类（不持久化），返回每条文本所属代表的下标列表，
+    例如 [0, 1, 0, 3] 表示第 3 条与第 1 条近似重复，只需对下标 0、1、3 的文本打分。
+    """
+    index = DedupIndex(config)
+    assigned = index.assign((str(i), text) for i, text in enumerate(texts))
+    return [int(canonical) for _, canonical in assigned]
@@ -0,0 +1,523 @@
+"""
+后台任务管理：爬取 / 入库 / 情感打分任务在独立的工作进程中运行，Web 进程只读写任务表。
+
+- 任务表（SQLite，WAL 模式）持久化每个任务的状态、进度、吞吐量与错误信息，Web 与管理进程重启后都能看到；
+- Web 端通过 submit_job() 新建任务、send_command() 写入 pause / resume / stop 指令；
+- 管理进程（python job_manager.py serve）轮询任务表：按并发上限启动排队任务，
+  把指令通过 multiprocessing.Event 传给工作进程，并把工作进程经队列上报的进度写回任务表；
+- 工作进程里 spiderComments 的 SHOULD_STOP / SHOULD_PAUSE 钩子被替换为读取这些 Event，
+  因此暂停、终止与原有的命令行逻辑完全一致。
+
+命令行：
+    python job_manager.py serve
+    python job_manager.py submit crawl '{"max_workers": 3, "max_comments_per_article": 50}'
+    python job_manager.py list
+    python job_manager.py pause|resume|stop <任务ID>
+"""
+import json
+import multiprocessing
+import os
+import queue
+import sqlite3
+import sys
+import time
+import traceback
+
+# --- 配置区 ---
+JOB_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs.db')
+JOB_CONFIG = {
+    'max_running': 2,                                   # 同时运行的任务总数上限
+    'max_running_per_kind': {'crawl': 1, 'import': 1, 'score': 1},
+    'poll_interval': 0.5,                               # 管理进程轮询任务表的间隔（秒）
+    'progress_interval': 1.0,                           # 工作进程上报进度的最小间隔（秒）
+    'stop_grace_seconds': 30,                           # stop 后等待工作进程自行退出的时间，超时则强制结束
+    'score_settle_seconds': 2,                          # 打分只读取入库时间早于该秒数的评论，见 SCORE_BATCH_SQL
+}
+
+JOB_KINDS = ('crawl', 'import', 'score')
+COMMANDS = ('pause', 'resume', 'stop')
+ACTIVE_STATUSES = ('running', 'paused', 'stopping')
+FINAL_STATUSES = ('finished', 'stopped', 'failed')
+
+SPIDERS_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(os.path.dirname(SPIDERS_DIR), 'model')
+
+CREATE_JOBS_SQL = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    command TEXT,
+    progress TEXT NOT NULL DEFAULT '{}',
+    items INTEGER NOT NULL DEFAULT 0,
+    throughput REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    pid INTEGER,
+    created_by TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+)
+"""
+CREATE_META_SQL = "CREATE TABLE IF NOT EXISTS job_meta (key TEXT PRIMARY KEY, value TEXT)"
+_JOB_COLUMNS = ('id', 'kind', 'params', 'status', 'command', 'progress', 'items', 'throughput', 'error',
+                'pid', 'created_by', 'created_at', 'started_at', 'finished_at')
+
+
+class JobStore:
+    """任务表的读写；每次操作使用短连接，可在 Web 的多个线程 / 进程中同时使用。"""
+
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(CREATE_JOBS_SQL)
+            conn.execute(CREATE_META_SQL)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def _row_to_job(row):
+        job = dict(zip(_JOB_COLUMNS, row))
+        job['params'] = json.loads(job['params'] or '{}')
+        job['progress'] = json.loads(job['progress'] or '{}')
+        return job
+
+    def create(self, kind, params=None, created_by=None):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"未知的任务类型: {kind}")
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (kind, params, created_by, created_at) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(params or {}, ensure_ascii=False), created_by, time.time()))
+            return cursor.lastrowid
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list(self, status=None, limit=50):
+        sql = f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs"
+        params = []
+        if status:
+            statuses = [status] if isinstance(status, str) else list(status)
+            sql += f" WHERE status IN ({', '.join('?' * len(statuses))})"
+            params.extend(statuses)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            return [self._row_to_job(row) for row in conn.execute(sql, params).fetchall()]
+
+    def update(self, job_id, **fields):
+        if not fields:
+            return
+        for key in ('params', 'progress'):
+            if key in fields and not isinstance(fields[key], str):
+                fields[key] = json.dumps(fields[key], ensure_ascii=False)
+        assignments = ', '.join(f"{k} = ?" for k in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", list(fields.values()) + [job_id])
+
+    def set_command(self, job_id, command):
+        """写入指令；只对未结束的任务生效，返回是否写入成功。"""
+        if command not in COMMANDS:
+            raise ValueError(f"未知的任务指令: {command}")
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET command = ? WHERE id = ? AND status NOT IN ({', '.join('?' * len(FINAL_STATUSES))})",
+                (command, job_id) + FINAL_STATUSES)
+            return cursor.rowcount > 0
+
+    def take_commands(self):
+        """
+        取出并清空所有待处理指令，返回 [(任务ID, 指令, 状态)]。
+        只清除读到的 (任务ID, 指令)，读取之后新写入的指令留到下一轮处理。
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, command, status FROM jobs WHERE command IS NOT NULL").fetchall()
+            if rows:
+                conn.executemany("UPDATE jobs SET command = NULL WHERE id = ? AND command = ?",
+                                 [(job_id, command) for job_id, command, _ in rows])
+        return rows
+
+    def get_meta(self, key, default=None):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM job_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO job_meta (key, value) VALUES (?, ?)", (key, value))
+
+
+# ---------- Web 端接口 ----------
+
+def submit_job(kind, params=None, created_by=None, store=None):
+    return (store or JobStore()).create(kind, params, created_by)
+
+
+def send_command(job_id, command, store=None):
+    return (store or JobStore()).set_command(job_id, command)
+
+
+# ---------- 工作进程 ----------
+
+class JobControl:
+    """工作进程内的控制句柄：读取暂停 / 终止信号，节流上报进度。"""
+
+    def __init__(self, job_id, stop_event, pause_event, progress_queue):
+        self.job_id = job_id
+        self._stop = stop_event
+        self._pause = pause_event
+        self._queue = progress_queue
+        self._last_report = 0.0
+        self._progress = {}
+
+    def should_stop(self):
+        return self._stop.is_set()
+
+    def should_pause(self):
+        return self._pause.is_set() and not self._stop.is_set()
+
+    def wait_if_paused(self):
+        while self.should_pause():
+            time.sleep(0.3)
+
+    def report(self, force=False, **progress):
+        self._progress.update(progress)
+        now = time.time()
+        if force or now - self._last_report >= JOB_CONFIG['progress_interval']:
+            self._last_report = now
+            self._queue.put((self.job_id, 'progress', dict(self._progress)))
+
+
+def _run_crawl(params, control):
+    """评论爬取：复用 spiderComments 的线程池爬虫，注入暂停 / 终止钩子与进度回调。"""
+    try:
+        from . import spiderComments
+    except ImportError:
+        import spiderComments
+
+    spiderComments.SHOULD_STOP = control.should_stop
+    spiderComments.SHOULD_PAUSE = control.should_pause
+    spiderComments.PROGRESS_HOOK = lambda progress: control.report(items=progress.get('comments_written', 0),
+                                                                    **progress)
+    rate = params.pop('rate', None) or {}
+    spiderComments.configure_rate_limit(**rate)
+    spiderComments.start_scraping_with_threads(**params)
+
+
+def _run_import(params, control):
+    """CSV 入库：文章与评论分两个阶段，阶段之间检查暂停 / 终止。"""
+    try:
+        from . import main as weibo_main
+    except ImportError:
+        import main as weibo_main
+
+    data_manager = weibo_main.WeiboDataManager()
+    if not data_manager.connect_db():
+        raise RuntimeError("数据库连接失败")
+    try:
+        if not data_manager.create_tables():
+            raise RuntimeError("数据表创建失败")
+        stages = [('articles', data_manager.import_articles_from_csv, params.get('articles_csv')),
+                  ('comments', data_manager.import_comments_from_csv, params.get('comments_csv'))]
+        for i, (stage, importer, csv_file) in enumerate(stages):
+            control.wait_if_paused()
+            if control.should_stop():
+                return
+            control.report(force=True, stage=stage, stages_done=i, stages_total=len(stages))
+            ok = importer(csv_file) if csv_file else importer()
+            if not ok:
+                raise RuntimeError(f"{stage} 导入失败")
+        control.report(force=True, stage='done', stages_done=len(stages), stages_total=len(stages))
+        data_manager.export_map_data()
+    finally:
+        data_manager.close_db()
+
+
+# 行比较可直接走 idx_comments_import (import_time, commentId) 做范围扫描。
+# import_time 精确到秒，且导入与打分任务并发运行：同一秒内较晚提交的评论可能排在已推进的水位线之前，
+# 因此只读取已入库超过 score_settle_seconds 的评论；边界重读的评论由 record_points 跳过。
+SCORE_BATCH_SQL = (
+    "SELECT c.commentId, c.content, c.import_time, c.articleId, a.typename, c.provinceCode, "
+    "COALESCE(c.created_at, c.import_time) FROM comments c LEFT JOIN articles a ON a.id = c.articleId "
+    "WHERE (c.import_time, c.commentId) > (%s, %s) AND c.import_time < NOW() - INTERVAL %s SECOND "
+    "ORDER BY c.import_time, c.commentId LIMIT %s")
+
+
+def _run_score(params, control):
+    """
+    情感打分：流式读取上次打分之后入库的评论，近似重复评论只推理一次，结果累加到省级情感统计，
+    写入情感时序明细与分钟 / 小时 / 天汇总（sentiment_series），并更新全文检索索引的情感标签。
+    以 (import_time, commentId) 为水位线，每批提交后推进，终止或失败后下次从断点继续。
+    每批按水位线重新发起一次 LIMIT 查询，暂停期间不占用未读完的结果集（避免超过 net_write_timeout 断开）。
+    省级情感计数与情感明细在同一事务中写入，且只累加首次写入 sentiment_points 的评论，
+    因此水位线未及保存就中断、或用 since 重新打分时都不会重复计数。
+    """
+    try:
+        from . import main as weibo_main
+        from . import region
+        from . import search_index
+        from . import sentiment_series
+    except ImportError:
+        import main as weibo_main
+        import region
+        import search_index
+        import sentiment_series
+    import pymysql
+
+    index = None
+    if weibo_main.SEARCH_CONFIG['enabled']:
+        try:
+            # 须在切换到 model 目录之前按 spiders 目录解析相对路径
+            index = search_index.SearchIndex(os.path.abspath(weibo_main.SEARCH_CONFIG['path']))
+        except Exception as e:
+            print(f"全文检索索引打开失败，本次打分不更新索引情感: {e}")
+
+    os.chdir(MODEL_DIR)
+    sys.path.insert(0, MODEL_DIR)
+    import ensemble
+
+    batch_size = int(params.get('batch_size', 256))
+    settle_seconds = int(JOB_CONFIG['score_settle_seconds'])
+    store = JobStore()
+    if params.get('since'):
+        watermark = [params['since'], '']
+    else:
+        watermark = json.loads(store.get_meta('score_watermark', '["1970-01-01 00:00:00", ""]'))
+    device = ensemble.get_device()
+    tok, m_mac, m_rob = ensemble.load_models(ensemble.MAC_DIR, ensemble.MAC_DIR, ensemble.ROB_DIR, device)
+    id2label = {int(k): v for k, v in m_mac.config.id2label.items()}
+
+    def record_province_sentiment(cursor, points):
+        region.record_sentiment(cursor, [(point[3], point[5]) for point in points])
+
+    connection = pymysql.connect(**weibo_main.DB_CONFIG)
+    started = time.time()
+    scored = 0
+    try:
+        while True:
+            control.wait_if_paused()
+            if control.should_stop():
+                break
+            connection.ping(reconnect=True)
+            cursor = connection.cursor()
+            try:
+                cursor.execute(SCORE_BATCH_SQL, (watermark[0], watermark[1], settle_seconds, batch_size))
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+            if not rows:
+                break
+            texts = [row[1] or '' for row in rows]
+            _, probs = ensemble.predict_deduplicated(texts, tok, m_mac, m_rob, device,
+                                                     max_length=ensemble.MAX_LEN)
+            points = sentiment_series.points_from_probs(
+                [(row[0],) + tuple(row[3:]) for row in rows], probs, id2label)
+            sentiment_series.record_points(connection, points, on_insert=record_province_sentiment)
+            if index is not None:
+                try:
+                    index.set_sentiment('comment', [(point[0], point[5]) for point in points])
+                except Exception as e:
+                    print(f"更新全文检索索引情感失败: {e}")
+            watermark = [str(rows[-1][2]), rows[-1][0]]
+            store.set_meta('score_watermark', json.dumps(watermark))
+            scored += len(rows)
+            control.report(items=scored, watermark=watermark,
+                           rate=round(scored / max(time.time() - started, 1e-6), 1))
+    finally:
+        connection.close()
+        if index is not None:
+            index.close()
+
+
+_RUNNERS = {'crawl': _run_crawl, 'import': _run_import, 'score': _run_score}
+
+
+def _worker_main(job_id, kind, params, stop_event, pause_event, progress_queue):
+    os.chdir(SPIDERS_DIR)
+    if SPIDERS_DIR not in sys.path:
+        sys.path.insert(0, SPIDERS_DIR)
+    import profiling
+    profiling.start_run(f"job{job_id}-{kind}")
+    control = JobControl(job_id, stop_event, pause_event, progress_queue)
+    try:
+        with profiling.span(f"job.{kind}"):
+            _RUNNERS[kind](dict(params), control)
+    except BaseException:
+        control.report(force=True)
+        progress_queue.put((job_id, 'failed', traceback.format_exc(limit=20)))
+        return
+    finally:
+        profiling.finish_run()
+    control.report(force=True)
+    progress_queue.put((job_id, 'stopped' if control.should_stop() else 'finished', None))
+
+
+# ---------- 管理进程 ----------
+
+class _Worker:
+    __slots__ = ('process', 'stop_event', 'pause_event', 'result', 'stop_requested_at')
+
+    def __init__(self, process, stop_event, pause_event):
+        self.process = process
+        self.stop_event = stop_event
+        self.pause_event = pause_event
+        self.result = None
+        self.stop_requested_at = None
+
+
+class JobManager:
+    def __init__(self, store=None, config=None):
+        self.store = store or JobStore()
+        self.config = dict(JOB_CONFIG, **(config or {}))
+        self._ctx = multiprocessing.get_context('spawn')
+        self._progress = self._ctx.Queue()
+        self._workers = {}
+
+    def recover(self):
+        """上次管理进程退出时仍在运行的任务无法接管，标记为失败。"""
+        for job in self.store.list(status=ACTIVE_STATUSES, limit=1000):
+            self.store.update(job['id'], status='failed', error='管理进程重启，任务被中断', finished_at=time.time())
+
+    def _running_counts(self):
+        counts = {}
+        for job_id in self._workers:
+            job = self.store.get(job_id)
+            if job:
+                counts[job['kind']] = counts.get(job['kind'], 0) + 1
+        return counts
+
+    def _start_queued(self):
+        if len(self._workers) >= self.config['max_running']:
+            return
+        counts = self._running_counts()
+        for job in reversed(self.store.list(status='queued', limit=100)):  # 先提交的先运行
+            if len(self._workers) >= self.config['max_running']:
+                break
+            limit = self.config['max_running_per_kind'].get(job['kind'], 1)
+            if counts.get(job['kind'], 0) >= limit:
+                continue
+            stop_event, pause_event = self._ctx.Event(), self._ctx.Event()
+            process = self._ctx.Process(
+                target=_worker_main, name=f"job-{job['id']}-{job['kind']}",
+                args=(job['id'], job['kind'], job['params'], stop_event, pause_event, self._progress))
+            process.start()
+            self._workers[job['id']] = _Worker(process, stop_event, pause_event)
+            counts[job['kind']] = counts.get(job['kind'], 0) + 1
+            self.store.update(job['id'], status='running', pid=process.pid, started_at=time.time())
+            print(f"[任务 {job['id']}] {job['kind']} 已启动，进程 {process.pid}")
+
+    def _apply_commands(self):
+        for job_id, command, status in self.store.take_commands():
+            worker = self._workers.get(job_id)
+            if worker is None:
+                if command == 'stop' and status == 'queued':
+                    self.store.update(job_id, status='stopped', finished_at=time.time())
+                continue
+            if command == 'pause':
+                worker.pause_event.set()
+                self.store.update(job_id, status='paused')
+            elif command == 'resume':
+                worker.pause_event.clear()
+                self.store.update(job_id, status='running')
+            elif command == 'stop':
+                worker.stop_event.set()
+                worker.pause_event.clear()
+                worker.stop_requested_at = time.time()
+                self.store.update(job_id, status='stopping')
+            print(f"[任务 {job_id}] 收到指令: {command}")
+
+    def _drain_progress(self):
+        latest = {}
+        while True:
+            try:
+                job_id, kind, payload = self._progress.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                latest[job_id] = payload
+            elif job_id in self._workers:
+                self._workers[job_id].result = (kind, payload)
+        # 同一轮只写入每个任务的最新进度
+        for job_id, progress in latest.items():
+            job = self.store.get(job_id)
+            if job is None:
+                continue
+            items = int(progress.get('items') or 0)
+            elapsed = max(time.time() - (job['started_at'] or time.time()), 1e-6)
+            self.store.update(job_id, progress=progress, items=items, throughput=round(items / elapsed, 2))
+
+    def _reap(self):
+        for job_id, worker in list(self._workers.items()):
+            if worker.process.is_alive():
+                if worker.stop_requested_at and \
+                        time.time() - worker.stop_requested_at > self.config['stop_grace_seconds']:
+                    print(f"[任务 {job_id}] 未在限定时间内退出，强制结束")
+                    worker.process.terminate()
+                continue
+            worker.process.join()
+            self._drain_progress()
+            status, error = worker.result or (
+                ('stopped', None) if worker.stop_requested_at
+                else ('failed', f"工作进程异常退出，退出码 {worker.process.exitcode}"))
+            self.store.update(job_id, status=status, error=error, finished_at=time.time())
+            del self._workers[job_id]
+            print(f"[任务 {job_id}] 结束: {status}")
+
+    def run_once(self):
+        self._apply_commands()
+        self._drain_progress()
+        self._reap()
+        self._start_queued()
+
+    def serve(self):
+        self.recover()
+        print(f"任务管理进程已启动，任务表: {self.store.path}，并发上限: {self.config['max_running']}")
+        try:
+            while True:
+                self.run_once()
+                time.sleep(self.config['poll_interval'])
+        except KeyboardInterrupt:
+            print("\n正在停止所有任务...")
+            for worker in self._workers.values():
+                worker.stop_event.set()
+                worker.pause_event.clear()
+                worker.stop_requested_at = time.time()
+            deadline = time.time() + self.config['stop_grace_seconds']
+            while self._workers and time.time() < deadline:
+                self._reap()
+                time.sleep(self.config['poll_interval'])
+            for worker in self._workers.values():
+                worker.process.terminate()
+            self._reap()
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'serve'
+    store = JobStore()
+    if command == 'serve':
+        JobManager(store).serve()
+    elif command == 'submit':
+        params = json.loads(sys.argv[3]) if len(sys.argv) > 3 else {}
+        print(f"已提交任务 {store.create(sys.argv[2], params, created_by='cli')}")
+    elif command == 'list':
+        for job in store.list():
+            print(f"{job['id']:>5} {job['kind']:<7} {job['status']:<9} 已处理 {job['items']:>8}  "
+                  f"{job['throughput']:>8.2f}/秒  {job['error'] or ''}".rstrip())
+    elif command in COMMANDS:
+        ok = store.set_command(int(sys.argv[2]), command)
+        print('指令已发送' if ok else '任务不存在或已结束')
+    else:
+        print(__doc__)
+
+
+if __name__ == '__main__':
+    main()
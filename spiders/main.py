@@ -3,15 +3,33 @@ import os
 import csv
 import pymysql
 import time
+import threading
+from contextlib import nullcontext
 from datetime import datetime
 
 # 导入爬虫模块（兼容包内/脚本两种运行方式）
 try:
-    from . import spiderContent
+    from . import category_crawl
     from . import spiderComments
+    from . import metrics
+    from . import pipeline
+    from . import search_index
+    from . import dedup
+    from . import profiling
+    from . import region
+    from . import records
+    from . import sentiment_series
 except ImportError:
-    import spiderContent
+    import category_crawl
     import spiderComments
+    import metrics
+    import pipeline
+    import search_index
+    import dedup
+    import profiling
+    import region
+    import records
+    import sentiment_series
 
 # --- 数据库配置区 ---
 DB_CONFIG = {
@@ -22,27 +40,236 @@ DB_CONFIG = {
     'charset': 'utf8mb4'
 }
 
+# --- 指标导出配置（/metrics） ---
+METRICS_CONFIG = {
+    'enabled': True,
+    'host': '127.0.0.1',
+    'port': 9105,
+}
+
+# --- 全文检索索引（SQLite FTS5），入库时增量更新 ---
+SEARCH_CONFIG = {
+    'enabled': True,
+    'path': './search_index.db',
+}
+
+# --- 评论近似重复检测（MinHash/LSH），入库时为每条评论记录所属簇的代表评论 ---
+DEDUP_IMPORT_CONFIG = {
+    'enabled': True,
+    'skip_duplicates': False,  # True 时非代表评论只记录簇关系，不再写入 comments 表
+}
+
+# --- 流水线配置：各阶段独立的并发数与有界队列 ---
+PIPELINE_CONFIG = {
+    'enabled': True,  # False 时退回逐步顺序执行
+    'articles_csv': './articleData_sample.csv',
+    'pages_per_type': 3,
+    'article_import': {'workers': 1, 'queue_size': 200, 'batch_size': 50},
+    'comment_crawl': {'workers': 3, 'queue_size': 500, 'max_comments_per_article': 50},
+    'comment_import': {'workers': 1, 'queue_size': 2000, 'batch_size': 200, 'flush_interval': 2.0},
+}
+
+IMPORT_ROWS = metrics.REGISTRY.counter(
+    'weibo_import_rows_total', '成功导入数据库的行数', ['table'])
+IMPORT_DUPLICATES = metrics.REGISTRY.counter(
+    'weibo_import_duplicates_total', '导入时因重复被跳过的行数', ['table'])
+IMPORT_SECONDS = metrics.REGISTRY.histogram(
+    'weibo_import_seconds', '单次CSV导入耗时（秒）', ['table'])
+IMPORT_ROWS_PER_SECOND = metrics.REGISTRY.gauge(
+    'weibo_import_rows_per_second', '最近一次导入的吞吐（行/秒）', ['table'])
+NEAR_DUPLICATES = metrics.REGISTRY.counter(
+    'weibo_comment_near_duplicates_total', '入库时识别出的近似重复评论数')
+
+_dedup_index = None
+_dedup_lock = threading.Lock()
+
+
+def _shared_dedup_index():
+    """进程内共享的去重索引（流水线各入库线程共用同一份簇信息）"""
+    global _dedup_index
+    with _dedup_lock:
+        if _dedup_index is None:
+            _dedup_index = dedup.DedupIndex.load()
+        return _dedup_index
+
+
+def _record_import(table, inserted, duplicates, started):
+    elapsed = time.perf_counter() - started
+    IMPORT_ROWS.inc(inserted, table=table)
+    IMPORT_DUPLICATES.inc(duplicates, table=table)
+    IMPORT_SECONDS.observe(elapsed, table=table)
+    IMPORT_ROWS_PER_SECOND.set(inserted / elapsed if elapsed > 0 else 0.0, table=table)
+
+
+ARTICLE_INSERT_SQL = """
+INSERT INTO articles (id, typename, content, created_at, likeNum, 
+                    commentsLen, reposts_count, region, contentLen, 
+                    detailUrl, authorName, authorDetail, authorAvatar, isVip,
+                    provinceCode)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+COMMENT_INSERT_SQL = """
+INSERT INTO comments (commentId, articleId, created_at, like_counts, 
+                    region, content, authorName, authorGender, 
+                    authorAddress, authorAvatar, provinceCode)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+# (表, 索引名, 列)：供表格接口的键集分页与过滤使用
+TABLE_INDEXES = [
+    ('comments', 'idx_comments_created', 'created_at, commentId'),
+    ('comments', 'idx_comments_likes', 'like_counts, commentId'),
+    ('comments', 'idx_comments_article', 'articleId, commentId'),
+    # 情感打分任务按 (import_time, commentId) 水位线分批读取
+    ('comments', 'idx_comments_import', 'import_time, commentId'),
+    ('articles', 'idx_articles_created', 'created_at, id'),
+    ('articles', 'idx_articles_likes', 'likeNum, id'),
+    ('articles', 'idx_articles_comments', 'commentsLen, id'),
+    ('articles', 'idx_articles_reposts', 'reposts_count, id'),
+    ('articles', 'idx_articles_type', 'typename, id'),
+]
+
+CLUSTER_INSERT_SQL = """
+INSERT IGNORE INTO comment_clusters (commentId, canonicalId)
+VALUES (%s, %s)
+"""
+
+
+def _valid_datetime(value):
+    """校验日期时间字符串，无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+    return value
+
+
+def article_row_to_record(row, strings=None):
+    """将文章CSV行转换为 articles 表插入元组（分类、地区等经 intern 去重，作者列经本批的 StringPool 去重）"""
+    intern = records.intern_str
+    share = strings.share if strings is not None else (lambda value: value)
+    return (
+        row[0],  # id
+        intern(row[1]),  # typename
+        row[2],  # content
+        _valid_datetime(row[3]),  # created_at
+        int(row[4]) if row[4].isdigit() else 0,  # likeNum
+        int(row[5]) if row[5].isdigit() else 0,  # commentsLen
+        int(row[6]) if row[6].isdigit() else 0,  # reposts_count
+        intern(row[7]),  # region
+        int(row[8]) if row[8].isdigit() else 0,  # contentLen
+        row[9],  # detailUrl
+        share(row[10]),  # authorName
+        share(row[11]),  # authorDetail
+        share(row[12]),  # authorAvatar
+        intern(row[13]),  # isVip
+        region.normalize_region(row[7])  # provinceCode
+    )
+
+
+def comment_row_to_record(row, strings=None):
+    """将评论CSV行转换为 comments 表插入元组（文章ID、地区、性别经 intern 去重，作者列经本批的 StringPool 去重）"""
+    intern = records.intern_str
+    share = strings.share if strings is not None else (lambda value: value)
+    like_counts = str(row[3])
+    return (
+        row[1],  # commentId
+        intern(row[0]),  # articleId
+        _valid_datetime(row[2]),  # created_at
+        int(like_counts) if like_counts.isdigit() else 0,  # like_counts
+        intern(row[4]),  # region
+        row[5],  # content
+        share(row[6]),  # authorName
+        intern(row[7]),  # authorGender
+        share(row[8]),  # authorAddress
+        share(row[9]),  # authorAvatar
+        region.comment_province(row[4], row[8])  # provinceCode
+    )
+
 
 class WeiboDataManager:
     def __init__(self):
         self.connection = None
+        self.search_index = None
+        self.dedup_index = None
 
     def connect_db(self):
         """连接数据库"""
         try:
             self.connection = pymysql.connect(**DB_CONFIG)
             print("数据库连接成功！")
-            return True
         except Exception as e:
             print(f"数据库连接失败: {e}")
             return False
+        if SEARCH_CONFIG['enabled']:
+            try:
+                self.search_index = search_index.SearchIndex(SEARCH_CONFIG['path'])
+            except Exception as e:
+                print(f"全文检索索引打开失败，本次导入不更新索引: {e}")
+        if DEDUP_IMPORT_CONFIG['enabled']:
+            self.dedup_index = _shared_dedup_index()
+        return True
 
     def close_db(self):
         """关闭数据库连接"""
+        if self.dedup_index is not None:
+            self.dedup_index.save()
+            self.dedup_index = None
+        if self.search_index:
+            self.search_index.close()
+            self.search_index = None
         if self.connection:
             self.connection.close()
             print("数据库连接已关闭。")
 
+    def _update_search_index(self, kind, records):
+        """将刚提交的记录写入全文检索索引；索引失败不影响数据库导入结果"""
+        if not self.search_index or not records:
+            return
+        to_doc = search_index.article_record_to_doc if kind == 'article' else search_index.comment_record_to_doc
+        try:
+            with profiling.span('search_index'):
+                self.search_index.add_documents(kind, [to_doc(record) for record in records])
+        except Exception as e:
+            print(f"更新全文检索索引失败: {e}")
+
+    def _assign_clusters(self, cursor, records):
+        """
+        为待入库评论分配近似重复簇并写入 comment_clusters（与评论同一事务提交）。
+        返回需要写入 comments 表的记录。
+        """
+        if self.dedup_index is None or not records:
+            return records
+        with profiling.span('dedup.assign'):
+            assigned = self.dedup_index.assign((record[0], record[5]) for record in records)
+        cursor.executemany(CLUSTER_INSERT_SQL, assigned)
+        duplicates = sum(1 for comment_id, canonical_id in assigned if comment_id != canonical_id)
+        NEAR_DUPLICATES.inc(duplicates)
+        if duplicates:
+            print(f"识别出 {duplicates} 条近似重复评论。")
+        if not DEDUP_IMPORT_CONFIG['skip_duplicates']:
+            return records
+        return [record for record, (comment_id, canonical_id) in zip(records, assigned)
+                if comment_id == canonical_id]
+
+    def _insert_comments(self, cursor, records):
+        """
+        分配近似重复簇并写入评论，簇关系与评论在同一事务中提交；返回实际写入 comments 表的记录。
+        即使 skip_duplicates 过滤掉了整批评论，簇关系也照常提交；提交失败时去重索引一并回滚。
+        """
+        with (self.dedup_index.transaction() if self.dedup_index is not None else nullcontext()):
+            records = self._assign_clusters(cursor, records)
+            if records:
+                with profiling.span('mysql.executemany'):
+                    cursor.executemany(COMMENT_INSERT_SQL, records)
+                    region.record_comments(cursor, records)
+            with profiling.span('mysql.commit'):
+                self.connection.commit()
+        return records
+
     def create_tables(self):
         """创建必要的数据表"""
         try:
@@ -65,6 +292,7 @@ class WeiboDataManager:
                 authorDetail VARCHAR(500),
                 authorAvatar VARCHAR(500),
                 isVip VARCHAR(10),
+                provinceCode INT,
                 import_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
             """
@@ -82,13 +310,32 @@ class WeiboDataManager:
                 authorGender VARCHAR(10),
                 authorAddress VARCHAR(100),
                 authorAvatar VARCHAR(500),
+                provinceCode INT,
                 import_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (articleId) REFERENCES articles(id) ON DELETE CASCADE
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
             """
 
+            # 评论近似重复簇：canonicalId 为簇代表评论，代表评论的 canonicalId 等于自身
+            create_clusters_table = """
+            CREATE TABLE IF NOT EXISTS comment_clusters (
+                commentId VARCHAR(50) PRIMARY KEY,
+                canonicalId VARCHAR(50) NOT NULL,
+                INDEX idx_canonical (canonicalId)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+
             cursor.execute(create_articles_table)
             cursor.execute(create_comments_table)
+            cursor.execute(create_clusters_table)
+            region.create_tables(cursor)
+            sentiment_series.create_tables(cursor)
+            # 旧版本建的表没有 provinceCode 列，补上
+            for table in ('articles', 'comments'):
+                self._ensure_column(cursor, table, 'provinceCode', 'INT')
+            # 表格接口按 (排序列, 主键) 做键集分页，需要对应的复合索引
+            for table, index_name, columns in TABLE_INDEXES:
+                self._ensure_index(cursor, table, index_name, columns)
             self.connection.commit()
             print("数据表创建/检查完成。")
 
@@ -99,12 +346,30 @@ class WeiboDataManager:
             cursor.close()
         return True
 
+    def _ensure_column(self, cursor, table, column, definition):
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s", (table, column))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            print(f"已为 {table} 表添加 {column} 列。")
+
+    def _ensure_index(self, cursor, table, index_name, columns):
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s", (table, index_name))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+            print(f"已为 {table} 表创建索引 {index_name}。")
+
+    @profiling.timed('import.articles_csv', profile=True)
     def import_articles_from_csv(self, csv_file='./articleData_sample.csv'):
         """从CSV导入文章数据，检查重复"""
         if not os.path.exists(csv_file):
             print(f"文章CSV文件 {csv_file} 不存在。")
             return False
 
+        started = time.perf_counter()
         try:
             cursor = self.connection.cursor()
 
@@ -119,6 +384,7 @@ class WeiboDataManager:
                 headers = next(reader)  # 跳过表头
 
                 new_articles = []
+                strings = records.StringPool()
                 duplicate_count = 0
 
                 for row in reader:
@@ -132,59 +398,26 @@ class WeiboDataManager:
 
                     # 处理数据类型转换
                     try:
-                        # 转换数字类型
-                        like_num = int(row[4]) if row[4].isdigit() else 0
-                        comments_len = int(row[5]) if row[5].isdigit() else 0
-                        reposts_count = int(row[6]) if row[6].isdigit() else 0
-                        content_len = int(row[8]) if row[8].isdigit() else 0
-
-                        # 转换日期时间
-                        created_at = row[3] if row[3] else None
-                        if created_at and created_at != '':
-                            try:
-                                # 尝试解析日期时间
-                                datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
-                            except ValueError:
-                                created_at = None
-
-                        article_data = (
-                            row[0],  # id
-                            row[1],  # typename
-                            row[2],  # content
-                            created_at,  # created_at
-                            like_num,  # likeNum
-                            comments_len,  # commentsLen
-                            reposts_count,  # reposts_count
-                            row[7],  # region
-                            content_len,  # contentLen
-                            row[9],  # detailUrl
-                            row[10],  # authorName
-                            row[11],  # authorDetail
-                            row[12],  # authorAvatar
-                            row[13]  # isVip
-                        )
-                        new_articles.append(article_data)
-
+                        new_articles.append(article_row_to_record(row, strings))
                     except (ValueError, IndexError) as e:
                         print(f"处理文章数据时出错: {e}, 跳过行: {row}")
                         continue
 
                 if new_articles:
                     # 批量插入新文章
-                    insert_sql = """
-                    INSERT INTO articles (id, typename, content, created_at, likeNum, 
-                                        commentsLen, reposts_count, region, contentLen, 
-                                        detailUrl, authorName, authorDetail, authorAvatar, isVip)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    cursor.executemany(insert_sql, new_articles)
-                    self.connection.commit()
+                    with profiling.span('mysql.executemany'):
+                        cursor.executemany(ARTICLE_INSERT_SQL, new_articles)
+                        region.record_articles(cursor, new_articles)
+                    with profiling.span('mysql.commit'):
+                        self.connection.commit()
+                    self._update_search_index('article', new_articles)
 
                     print(f"成功导入 {len(new_articles)} 篇新文章。")
                     if duplicate_count > 0:
                         print(f"跳过 {duplicate_count} 篇重复文章。")
                 else:
                     print("没有新文章需要导入。")
+                _record_import('articles', len(new_articles), duplicate_count, started)
 
         except Exception as e:
             print(f"导入文章数据失败: {e}")
@@ -195,12 +428,14 @@ class WeiboDataManager:
 
         return True
 
+    @profiling.timed('import.comments_csv', profile=True)
     def import_comments_from_csv(self, csv_file='./commentsData.csv'):
         """从CSV导入评论数据，检查重复"""
         if not os.path.exists(csv_file):
             print(f"评论CSV文件 {csv_file} 不存在。")
             return False
 
+        started = time.perf_counter()
         try:
             cursor = self.connection.cursor()
 
@@ -219,6 +454,7 @@ class WeiboDataManager:
                 headers = next(reader)  # 跳过表头
 
                 new_comments = []
+                strings = records.StringPool()
                 duplicate_count = 0
                 invalid_article_count = 0
 
@@ -240,45 +476,14 @@ class WeiboDataManager:
                         continue
 
                     try:
-                        # 处理数据类型转换
-                        like_counts = int(row[3]) if row[3].isdigit() else 0
-
-                        # 转换日期时间
-                        created_at = row[2] if row[2] else None
-                        if created_at and created_at != '':
-                            try:
-                                datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
-                            except ValueError:
-                                created_at = None
-
-                        comment_data = (
-                            comment_id,  # commentId
-                            article_id,  # articleId
-                            created_at,  # created_at
-                            like_counts,  # like_counts
-                            row[4],  # region
-                            row[5],  # content
-                            row[6],  # authorName
-                            row[7],  # authorGender
-                            row[8],  # authorAddress
-                            row[9]  # authorAvatar
-                        )
-                        new_comments.append(comment_data)
-
+                        new_comments.append(comment_row_to_record(row, strings))
                     except (ValueError, IndexError) as e:
                         print(f"处理评论数据时出错: {e}, 跳过行: {row}")
                         continue
 
+                new_comments = self._insert_comments(cursor, new_comments)
                 if new_comments:
-                    # 批量插入新评论
-                    insert_sql = """
-                    INSERT INTO comments (commentId, articleId, created_at, like_counts, 
-                                        region, content, authorName, authorGender, 
-                                        authorAddress, authorAvatar)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    cursor.executemany(insert_sql, new_comments)
-                    self.connection.commit()
+                    self._update_search_index('comment', new_comments)
 
                     print(f"成功导入 {len(new_comments)} 条新评论。")
                     if duplicate_count > 0:
@@ -287,6 +492,7 @@ class WeiboDataManager:
                         print(f"跳过 {invalid_article_count} 条无效文章ID的评论。")
                 else:
                     print("没有新评论需要导入。")
+                _record_import('comments', len(new_comments), duplicate_count, started)
 
         except Exception as e:
             print(f"导入评论数据失败: {e}")
@@ -297,6 +503,102 @@ class WeiboDataManager:
 
         return True
 
+    def _existing_ids(self, cursor, sql_prefix, ids):
+        """按批次查询已存在的主键，避免流式导入时全表拉取ID"""
+        ids = list(set(ids))
+        if not ids:
+            return set()
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f"{sql_prefix} ({placeholders})", ids)
+        return set(row[0] for row in cursor.fetchall())
+
+    @profiling.timed('import.article_rows', profile=True)
+    def import_article_rows(self, rows):
+        """
+        导入一批CSV格式的文章行（供流水线流式调用）。
+        返回 (新增数, 重复数)，失败时返回 None。
+        """
+        started = time.perf_counter()
+        try:
+            cursor = self.connection.cursor()
+            existing_ids = self._existing_ids(
+                cursor, "SELECT id FROM articles WHERE id IN", [row[0] for row in rows if row])
+
+            new_articles = []
+            strings = records.StringPool()
+            duplicate_count = 0
+            for row in rows:
+                if not row:
+                    continue
+                if row[0] in existing_ids:
+                    duplicate_count += 1
+                    continue
+                try:
+                    new_articles.append(article_row_to_record(row, strings))
+                    existing_ids.add(row[0])  # 同一批次内去重
+                except (ValueError, IndexError) as e:
+                    print(f"处理文章数据时出错: {e}, 跳过行: {row}")
+
+            if new_articles:
+                with profiling.span('mysql.executemany'):
+                    cursor.executemany(ARTICLE_INSERT_SQL, new_articles)
+                    region.record_articles(cursor, new_articles)
+                with profiling.span('mysql.commit'):
+                    self.connection.commit()
+                self._update_search_index('article', new_articles)
+            _record_import('articles', len(new_articles), duplicate_count, started)
+            return len(new_articles), duplicate_count
+        except Exception as e:
+            print(f"导入文章数据失败: {e}")
+            self.connection.rollback()
+            return None
+        finally:
+            cursor.close()
+
+    @profiling.timed('import.comment_rows', profile=True)
+    def import_comment_rows(self, rows):
+        """
+        导入一批CSV格式的评论行（供流水线流式调用）。
+        返回 (新增数, 重复数, 无效文章数)，失败时返回 None。
+        """
+        started = time.perf_counter()
+        try:
+            cursor = self.connection.cursor()
+            rows = [row for row in rows if row]
+            existing_comment_ids = self._existing_ids(
+                cursor, "SELECT commentId FROM comments WHERE commentId IN", [row[1] for row in rows])
+            valid_article_ids = self._existing_ids(
+                cursor, "SELECT id FROM articles WHERE id IN", [row[0] for row in rows])
+
+            new_comments = []
+            strings = records.StringPool()
+            duplicate_count = 0
+            invalid_article_count = 0
+            for row in rows:
+                if row[1] in existing_comment_ids:
+                    duplicate_count += 1
+                    continue
+                if row[0] not in valid_article_ids:
+                    invalid_article_count += 1
+                    continue
+                try:
+                    new_comments.append(comment_row_to_record(row, strings))
+                    existing_comment_ids.add(row[1])
+                except (ValueError, IndexError) as e:
+                    print(f"处理评论数据时出错: {e}, 跳过行: {row}")
+
+            new_comments = self._insert_comments(cursor, new_comments)
+            if new_comments:
+                self._update_search_index('comment', new_comments)
+            _record_import('comments', len(new_comments), duplicate_count, started)
+            return len(new_comments), duplicate_count, invalid_article_count
+        except Exception as e:
+            print(f"导入评论数据失败: {e}")
+            self.connection.rollback()
+            return None
+        finally:
+            cursor.close()
+
     def get_statistics(self):
         """获取数据库统计信息"""
         try:
@@ -326,12 +628,40 @@ class WeiboDataManager:
         finally:
             cursor.close()
 
+    def export_map_data(self, path=region.ACTIVITY_JSON):
+        """导出地图使用的省级聚合数据"""
+        try:
+            data = region.export_province_activity(self.connection, path)
+            print(f"省级地图数据已导出到 {path}（{len(data)} 个省份）。")
+        except Exception as e:
+            print(f"导出省级地图数据失败: {e}")
+
+
+def _connected_data_manager():
+    """为流水线入库阶段的每个工作线程创建独立的数据库连接"""
+    manager = WeiboDataManager()
+    if not manager.connect_db():
+        raise RuntimeError("数据库连接失败")
+    return manager
+
+
+def run_pipeline():
+    """以重叠执行的流水线方式完成爬取与入库"""
+    print("=== 流水线模式：文章爬取、文章入库、评论爬取、评论入库并行进行 ===")
+    options = {k: v for k, v in PIPELINE_CONFIG.items() if k != 'enabled'}
+    weibo_pipeline = pipeline.WeiboPipeline(_connected_data_manager, **options)
+    return weibo_pipeline.run()
+
 
 def main():
-    """主函数：协调整个爬虫和数据导入流程"""
+    """主函数：协调整个爬虫和数据导入流程（--profile[=sample,cprofile] 开启剖析）"""
+    profiling.start_run('weibo_main', sys.argv)
     print("=== 微博数据爬取和导入系统 ===")
     print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 
+    if METRICS_CONFIG['enabled']:
+        metrics.start_metrics_server(port=METRICS_CONFIG['port'], host=METRICS_CONFIG['host'])
+
     # 初始化数据管理器
     data_manager = WeiboDataManager()
 
@@ -347,9 +677,16 @@ def main():
         return
 
     try:
+        if PIPELINE_CONFIG['enabled']:
+            run_pipeline()
+            print("=== 数据统计信息 ===")
+            data_manager.get_statistics()
+            data_manager.export_map_data()
+            return
+
         # 第一步：爬取文章内容
         print("=== 第一步：开始爬取文章内容 ===")
-        spiderContent.start(pageNum_per_type=3)  # 每个分类爬取3页
+        category_crawl.start(pageNum_per_type=3)  # 每个分类爬取3页
         print("文章内容爬取完成。\n")
 
         # 第二步：导入文章到数据库
@@ -375,6 +712,7 @@ def main():
         # 第五步：显示统计信息
         print("=== 第五步：数据统计信息 ===")
         data_manager.get_statistics()
+        data_manager.export_map_data()
 
     except KeyboardInterrupt:
         print("\n\n程序被用户中断。")
@@ -383,6 +721,7 @@ def main():
     finally:
         # 清理资源
         data_manager.close_db()
+        profiling.finish_run()
         print(f"\n程序结束时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("=== 程序执行完毕 ===")
 
@@ -4,6 +4,15 @@ import logging
 from datetime import datetime
 from typing import Dict, List, Optional
 
+try:
+    from . import metrics
+except ImportError:
+    import metrics
+
+TABLE_ROWS = metrics.REGISTRY.gauge('mysql_table_rows', '各数据表当前行数', ['table'])
+PENDING_ARTICLES = metrics.REGISTRY.gauge(
+    'mysql_articles_pending_comments', '尚未爬取评论的文章数（commentsLen > 0）')
+
 
 class MySQLMonitor:
     """MySQL数据库监测类"""
@@ -55,7 +64,9 @@ class MySQLMonitor:
                 sql = f"SELECT COUNT(*) FROM `{table_name}`"
                 cursor.execute(sql)
                 result = cursor.fetchone()
-                return result[0] if result else 0
+                count = result[0] if result else 0
+                TABLE_ROWS.set(count, table=table_name)
+                return count
         except Exception as e:
             self.logger.error(f"查询表 {table_name} 失败: {e}")
             return None
@@ -73,7 +84,9 @@ class MySQLMonitor:
                 """
                 cursor.execute(query)
                 result = cursor.fetchone()
-                return result[0] if result else 0
+                count = result[0] if result else 0
+                PENDING_ARTICLES.set(count)
+                return count
         except Exception as e:
             self.logger.error(f"查询无评论文章数失败: {e}")
             return None
@@ -147,8 +160,11 @@ class MySQLMonitor:
         self._display_report(table_counts, "指定表监测报告")
         return table_counts
 
-    def continuous_monitor(self, interval: int = 60, tables: Optional[List[str]] = None):
-        """持续监测数据库"""
+    def continuous_monitor(self, interval: int = 60, tables: Optional[List[str]] = None,
+                           metrics_port: Optional[int] = 9106):
+        """持续监测数据库；metrics_port 不为 None 时同时通过 /metrics 暴露表行数"""
+        if metrics_port is not None:
+            metrics.start_metrics_server(port=metrics_port)
         self.logger.info(f"开始持续监测，间隔 {interval} 秒...")
         try:
             while True:
@@ -0,0 +1,98 @@
+"""
+批量多进程解析池：把 CPU 密集的解析工作（JSON 解码、HTML 清洗、时间解析）移出抓取线程。
+
+抓取线程调用 submit(item) 立即得到 Future；调度线程把短时间内到达的条目攒成一批，
+整批交给进程池中的 worker_fn 处理，从而摊薄进程间通信开销。
+worker_fn 必须是模块级函数（可被 pickle），接收条目列表并返回等长的结果列表。
+子进程中 profiling 记录的区段随每批结果一并传回，合并进父进程的剖析报告。
+"""
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+
+try:
+    from . import profiling
+except ImportError:
+    import profiling
+
+
+def _run_batch(worker_fn, items):
+    """在子进程中执行 worker_fn，返回 (结果列表, 本批区段统计)。"""
+    results = worker_fn(items)
+    return results, profiling.take_stats()
+
+
+class ParsePool:
+
+    def __init__(self, worker_fn, processes=None, batch_size=8, flush_interval=0.05):
+        self.worker_fn = worker_fn
+        self.processes = processes or max(1, (os.cpu_count() or 2) - 1)
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self._executor = ProcessPoolExecutor(max_workers=self.processes)
+        self._cond = threading.Condition()
+        self._pending = []
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='parse-dispatcher', daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, item):
+        """提交一个待解析条目，返回其结果的 Future。"""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("解析池已关闭")
+            self._pending.append((item, future))
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        return future
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._pending) >= self.batch_size,
+                                    timeout=self.flush_interval)
+                batch, self._pending = self._pending, []
+                closed = self._closed
+            if batch:
+                self._submit_batch(batch)
+            elif closed:
+                return
+
+    def _submit_batch(self, batch):
+        items = [item for item, _ in batch]
+        futures = [future for _, future in batch]
+        try:
+            batch_future = self._executor.submit(partial(_run_batch, self.worker_fn), items)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        def _fan_out(done):
+            try:
+                results, stats = done.result()
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                return
+            profiling.merge_stats(*stats)
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+        batch_future.add_done_callback(_fan_out)
+
+    def close(self):
+        """处理完已提交的条目后关闭调度线程与进程池。"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
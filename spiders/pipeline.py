@@ -0,0 +1,330 @@
+"""
+端到端流水线编排：文章爬取 → 文章入库 → 评论爬取 → 评论入库 各阶段重叠执行。
+
+每个阶段拥有独立的并发数和有界队列，上游产出的数据立即流入下游：
+文章一旦入库就进入评论爬取队列，评论每抓到一页就进入入库队列。
+整轮耗时因此趋近于最慢阶段，而不是各阶段耗时之和。
+"""
+import csv
+import os
+import queue
+import threading
+import time
+
+try:
+    from . import category_crawl
+    from . import spiderComments
+    from . import metrics
+    from . import crawl_scheduler
+    from . import profiling
+    from . import records
+except ImportError:
+    import category_crawl
+    import spiderComments
+    import metrics
+    import crawl_scheduler
+    import profiling
+    import records
+
+_DONE = object()
+
+STAGE_UTILISATION = metrics.REGISTRY.gauge(
+    'weibo_pipeline_stage_utilisation', '流水线各阶段工作线程忙碌占比（0-1）', ['stage'])
+STAGE_QUEUE_DEPTH = metrics.REGISTRY.gauge(
+    'weibo_pipeline_queue_depth', '流水线各阶段输入队列当前长度', ['stage'])
+STAGE_ITEMS = metrics.REGISTRY.counter(
+    'weibo_pipeline_stage_items_total', '流水线各阶段已处理的条目数', ['stage'])
+
+
+class Stage:
+    """
+    流水线中的一个阶段：若干工作线程从有界输入队列取数据，
+    按 batch_size 攒批（或等待 flush_interval 超时）后交给 handler 处理。
+    handler(context, items, emit) 中调用 emit(item) 把结果送往下游阶段。
+    setup() 为每个工作线程创建独立上下文（如数据库连接），teardown(context) 负责清理。
+    """
+
+    def __init__(self, name, handler, workers=1, queue_size=100, batch_size=1,
+                 flush_interval=1.0, setup=None, teardown=None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.setup = setup
+        self.teardown = teardown
+        self.queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.downstream = None
+
+        self._lock = threading.Lock()
+        self._threads = []
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.items_in = 0
+        self.items_out = 0
+        self.queue_peak = 0
+        self.items_dropped = 0
+        self.errors = []
+        self.started_at = None
+        self.finished_at = None
+
+    def put(self, item):
+        """向本阶段投递数据；队列满时阻塞，从而对上游形成反压。"""
+        self.queue.put(item)
+        depth = self.queue.qsize()
+        STAGE_QUEUE_DEPTH.set(depth, stage=self.name)
+        with self._lock:
+            self.queue_peak = max(self.queue_peak, depth)
+
+    def _emit(self, item):
+        if self.downstream is None:
+            return
+        start = time.perf_counter()
+        self.downstream.put(item)
+        with self._lock:
+            self.blocked_seconds += time.perf_counter() - start
+            self.items_out += 1
+
+    def _next_batch(self):
+        """取下一批数据；返回 (批次, 是否已收到结束标记)。"""
+        item = self.queue.get()
+        if item is _DONE:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + (self.flush_interval or 0)
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _drain(self):
+        """setup 失败时仍需取走输入直到结束标记，否则上游 put()/close() 会在满队列上永久阻塞。"""
+        dropped = 0
+        while True:
+            batch, done = self._next_batch()
+            dropped += len(batch)
+            if done:
+                break
+        if dropped:
+            print(f"[流水线:{self.name}] 工作线程未能初始化，丢弃 {dropped} 条数据。")
+        with self._lock:
+            self.items_dropped += dropped
+
+    def _worker(self):
+        context = None
+        try:
+            try:
+                context = self.setup() if self.setup else None
+            except Exception as e:
+                print(f"[流水线:{self.name}] 工作线程初始化失败: {e}")
+                with self._lock:
+                    self.errors.append(e)
+                self._drain()
+                return
+            while True:
+                batch, done = self._next_batch()
+                if batch:
+                    start = time.perf_counter()
+                    try:
+                        with profiling.span(f"stage.{self.name}"):
+                            self.handler(context, batch, self._emit)
+                    except Exception as e:
+                        print(f"[流水线:{self.name}] 处理 {len(batch)} 条数据时出错: {e}")
+                    with self._lock:
+                        self.busy_seconds += time.perf_counter() - start
+                        self.items_in += len(batch)
+                    STAGE_ITEMS.inc(len(batch), stage=self.name)
+                    STAGE_QUEUE_DEPTH.set(self.queue.qsize(), stage=self.name)
+                if done:
+                    break
+        finally:
+            if self.teardown and context is not None:
+                self.teardown(context)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def close(self):
+        """通知所有工作线程：上游已无新数据。"""
+        for _ in range(self.workers):
+            self.queue.put(_DONE)
+
+    def join(self):
+        for t in self._threads:
+            t.join()
+        self.finished_at = time.perf_counter()
+
+    def utilisation(self, wall_seconds):
+        """忙碌时间占（并发数 × 墙钟时间）的比例，不含向下游阻塞等待的时间。"""
+        capacity = self.workers * wall_seconds
+        return (self.busy_seconds - self.blocked_seconds) / capacity if capacity > 0 else 0.0
+
+
+class WeiboPipeline:
+    """
+    将爬取与入库串成重叠执行的四段流水线：
+    文章爬取（category_crawl，后台线程）→ 文章入库 → 评论爬取 → 评论入库。
+    data_manager_factory 需返回已连接数据库的 WeiboDataManager，每个入库工作线程各持有一个连接。
+    """
+
+    def __init__(self, data_manager_factory, articles_csv='./articleData_sample.csv',
+                 pages_per_type=3, poll_interval=2.0,
+                 article_import=None, comment_crawl=None, comment_import=None):
+        self.data_manager_factory = data_manager_factory
+        self.articles_csv = articles_csv
+        self.pages_per_type = pages_per_type
+        self.poll_interval = poll_interval
+        article_import = dict({'workers': 1, 'queue_size': 200, 'batch_size': 50}, **(article_import or {}))
+        comment_crawl = dict({'workers': 3, 'queue_size': 500, 'max_comments_per_article': 50},
+                             **(comment_crawl or {}))
+        comment_import = dict({'workers': 1, 'queue_size': 2000, 'batch_size': 200, 'flush_interval': 2.0},
+                              **(comment_import or {}))
+
+        self.max_comments_per_article = comment_crawl.pop('max_comments_per_article')
+        self.state_store = crawl_scheduler.CrawlStateStore()
+        self.parse_pool = None
+        self._csv_lock = threading.Lock()
+        self._source_seconds = 0.0
+        self._articles_seen = 0
+
+        self.article_import = Stage(
+            'article_import', self._import_articles, setup=self._open_db, teardown=self._close_db,
+            **article_import)
+        self.comment_crawl = Stage('comment_crawl', self._crawl_comments, **comment_crawl)
+        self.comment_import = Stage(
+            'comment_import', self._import_comments, setup=self._open_db, teardown=self._close_db,
+            **comment_import)
+        self.article_import.downstream = self.comment_crawl
+        self.comment_crawl.downstream = self.comment_import
+        self.stages = [self.article_import, self.comment_crawl, self.comment_import]
+
+    # --- 各阶段处理函数 ---
+    def _open_db(self):
+        return self.data_manager_factory()
+
+    def _close_db(self, data_manager):
+        if data_manager is not None:
+            data_manager.close_db()
+
+    def _import_articles(self, data_manager, rows, emit):
+        result = data_manager.import_article_rows(rows)
+        if result is None:
+            return
+        inserted, duplicates = result
+        print(f"[流水线] 文章入库: 新增 {inserted} 篇，重复 {duplicates} 篇。")
+        # 新旧文章都可能有新评论；按热度与过期程度排序并分配预算后交给评论爬取阶段
+        headers = ['id', 'typename', 'content', 'created_at', 'likeNum', 'commentsLen', 'reposts_count']
+        articles = [crawl_scheduler.article_stats_from_row(dict(zip(headers, row))) for row in rows]
+        for task in crawl_scheduler.plan_crawl(articles, self.state_store,
+                                               base_budget=self.max_comments_per_article):
+            emit(task)
+
+    def _crawl_comments(self, _context, tasks, emit):
+        sleep_range = (spiderComments.RATE_CONFIG['min_delay'], spiderComments.RATE_CONFIG['max_delay'])
+        for task in tasks:
+            if spiderComments.SHOULD_STOP():
+                return
+            comments, resume = spiderComments.scrape_comments_for_article(
+                task.article_id, task.budget, sleep_range,
+                on_page=lambda page: [emit(row) for row in page],
+                since_id=self.state_store.watermark(task.article_id),
+                pool=self.parse_pool,
+                resume=self.state_store.resume_point(task.article_id))
+            self.state_store.record_crawl(task.article_id, len(comments))
+            self.state_store.advance_watermark(task.article_id, comments, resume=resume)
+            if comments:
+                # 保留与顺序流程一致的评论CSV产物
+                with self._csv_lock:
+                    spiderComments.write_rows_to_csv(spiderComments.COMMENTS_CSV_OUTPUT, comments)
+
+    def _import_comments(self, data_manager, rows, emit):
+        result = data_manager.import_comment_rows(rows)
+        if result is None:
+            return
+        inserted, duplicates, invalid = result
+        print(f"[流水线] 评论入库: 新增 {inserted} 条，重复 {duplicates} 条，无效文章 {invalid} 条。")
+
+    # --- 文章来源：后台运行文章爬虫并增量读取其CSV输出 ---
+    def _read_new_article_rows(self, seen_ids, final):
+        if not os.path.exists(self.articles_csv):
+            return []
+        with open(self.articles_csv, 'r', encoding='utf-8') as f:
+            rows = list(csv.reader(f))[1:]
+        if not final and rows:
+            rows = rows[:-1]  # 最后一行可能仍在写入，等下一轮再读
+        new_rows = []
+        strings = records.StringPool()
+        for row in rows:
+            if len(row) < 14 or row[0] in seen_ids:
+                continue
+            seen_ids.add(row[0])
+            new_rows.append(records.article_row(row[:14], strings))
+        return new_rows
+
+    def _run_article_source(self):
+        start = time.perf_counter()
+        crawler = threading.Thread(
+            target=category_crawl.start,
+            kwargs={'pageNum_per_type': self.pages_per_type, 'output_csv': self.articles_csv},
+            name='article_crawl', daemon=True)
+        crawler.start()
+
+        seen_ids = set()
+        while True:
+            finished = not crawler.is_alive() or spiderComments.SHOULD_STOP()
+            for row in self._read_new_article_rows(seen_ids, final=finished):
+                self.article_import.put(row)
+                self._articles_seen += 1
+            if finished:
+                break
+            time.sleep(self.poll_interval)
+        self._source_seconds = time.perf_counter() - start
+
+    def run(self):
+        """运行整条流水线直至所有阶段排空，并打印各阶段利用率报告。"""
+        spiderComments.init_csv(spiderComments.COMMENTS_CSV_OUTPUT, spiderComments.COMMENTS_CSV_HEADERS)
+        self.parse_pool = spiderComments.create_parse_pool()
+        started = time.perf_counter()
+        for stage in self.stages:
+            stage.start()
+
+        try:
+            self._run_article_source()
+        finally:
+            # 按上下游顺序逐段关闭：上游排空后才通知下游结束
+            for stage in self.stages:
+                stage.close()
+                stage.join()
+            if self.parse_pool is not None:
+                self.parse_pool.close()
+            self.state_store.save()
+
+        wall = time.perf_counter() - started
+        self.report(wall)
+        return wall
+
+    def report(self, wall):
+        print(f"\n=== 流水线阶段报告（总耗时 {wall:.1f} 秒） ===")
+        print(f"{'阶段':<16}{'并发':>6}{'输入':>8}{'输出':>8}{'利用率':>10}{'下游阻塞':>10}{'队列峰值':>10}")
+        print(f"{'article_crawl':<16}{category_crawl.CONTENT_CONFIG['workers']:>6}{'-':>8}{self._articles_seen:>8}"
+              f"{(self._source_seconds / wall if wall else 0):>10.1%}{'-':>10}{'-':>10}")
+        for stage in self.stages:
+            util = stage.utilisation(wall)
+            blocked = stage.blocked_seconds / (stage.workers * wall) if wall else 0.0
+            STAGE_UTILISATION.set(round(util, 4), stage=stage.name)
+            print(f"{stage.name:<16}{stage.workers:>6}{stage.items_in:>8}{stage.items_out:>8}"
+                  f"{util:>10.1%}{blocked:>10.1%}{stage.queue_peak:>10}")
+            if stage.items_dropped:
+                print(f"  └ {stage.name} 有 {len(stage.errors)} 个工作线程初始化失败，丢弃 {stage.items_dropped} 条数据")
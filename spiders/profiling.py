@@ -0,0 +1,393 @@
+"""
+运行剖析与热点路径埋点：回答"这次慢在网络、HTML 清洗、时间解析、MySQL 写入还是 BERT 推理"。
+
+- span(name) / @timed(name)：记录墙钟与 CPU 耗时，按名称聚合，并写入 metrics 的 profile_span_seconds 直方图；
+  嵌套的 span 按线程维护调用栈，同时累计每条 span 路径的自身耗时（spans.folded，区段级火焰图）。
+  每次进出约 4 微秒（含直方图），默认开启，只包在毫秒级以上的调用或慢路径外（如 clean_html 只计 BeautifulSoup 分支）；
+- 可选剖析模式，由环境变量 WEIBO_PROFILE 或命令行 --profile[=模式] 开启，逗号分隔：
+  - sample：后台线程按固定间隔抓取处于 span 内的线程调用栈，按最外层 span（阶段）输出 <阶段>.folded；
+  - cprofile：对 @timed(..., profile=True) 的调用按 WEIBO_PROFILE_RATE 抽样启用 cProfile，合并为 <名称>.pstats；
+  - pyinstrument：同上，改用 pyinstrument（需已安装），输出 <名称>.html；
+  单独的 --profile 等同于 sample,cprofile；
+- 子进程（如评论解析进程池）中的 span 由 take_stats() 取出增量、随结果传回，父进程用 merge_stats() 并入报告；
+  这些区段计入 report 与 spans.folded，但不进入父进程的 profile_span_seconds 直方图；
+- start_run() / finish_run()：一次运行的起止，结束时在 WEIBO_PROFILE_DIR 下写入 report.json、report.txt 与上述文件。
+  .folded 为折叠栈格式，可用 flamegraph.pl 或 https://www.speedscope.app 打开。
+"""
+import atexit
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+
+try:
+    from . import metrics
+except ImportError:
+    import metrics
+
+# --- 配置区（可用环境变量覆盖） ---
+PROFILE_CONFIG = {
+    'modes': os.environ.get('WEIBO_PROFILE', ''),
+    'sample_interval': float(os.environ.get('WEIBO_PROFILE_INTERVAL', 0.01)),  # 栈采样间隔（秒）
+    'profile_rate': float(os.environ.get('WEIBO_PROFILE_RATE', 0.05)),         # 抽样剖析的调用比例
+    'report_dir': os.environ.get('WEIBO_PROFILE_DIR', './profiles'),
+    'report': os.environ.get('WEIBO_PROFILE_REPORT', '1') != '0',             # 结束时是否写报告
+    'max_stack_depth': 64,
+    'top_functions': 25,       # report.txt 中每个 pstats 列出的函数数
+}
+MODES = ('sample', 'cprofile', 'pyinstrument')
+
+SPAN_SECONDS = metrics.REGISTRY.histogram(
+    'profile_span_seconds', '埋点区段耗时（秒）', ['span'])
+
+_local = threading.local()
+_thread_stacks = {}     # 线程ID -> 该线程的 span 栈，供栈采样线程读取
+_lock = threading.Lock()
+_stats = {}             # span 名称 -> [次数, 墙钟合计, CPU 合计, 最大值]
+_span_paths = {}        # 'a;b;c' -> 自身耗时合计（秒）
+_stage_stacks = {}      # 阶段 -> {折叠栈: 采样次数}
+_profiles = {}          # span 名称 -> pstats.Stats
+_sessions = {}          # span 名称 -> pyinstrument Session
+_run = {'name': None, 'started': None, 'wall_started': None, 'modes': set(), 'sampler': None, 'finished': True}
+
+
+def _parse_modes(value):
+    modes = set()
+    for mode in (value or '').replace(' ', '').split(','):
+        if mode in ('1', 'on', 'true', 'all'):
+            modes.update(('sample', 'cprofile'))
+        elif mode in MODES:
+            modes.add(mode)
+    return modes
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+        _thread_stacks[threading.get_ident()] = stack
+    return stack
+
+
+class _Span:
+    __slots__ = ('name', 'path', 'started', 'cpu_started', 'child')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = _stack()
+        self.path = f"{stack[-1].path};{self.name}" if stack else self.name
+        stack.append(self)
+        self.child = 0.0
+        self.cpu_started = time.thread_time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        cpu = time.thread_time() - self.cpu_started
+        stack = _local.stack
+        stack.pop()
+        if stack:
+            stack[-1].child += elapsed
+        with _lock:
+            entry = _stats.get(self.name)
+            if entry is None:
+                entry = _stats[self.name] = [0, 0.0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] += cpu
+            if elapsed > entry[3]:
+                entry[3] = elapsed
+            _span_paths[self.path] = _span_paths.get(self.path, 0.0) + max(elapsed - self.child, 0.0)
+        SPAN_SECONDS.observe(elapsed, span=self.name)
+        return False
+
+
+def span(name):
+    """计时上下文管理器：with profiling.span('mysql.executemany'): ..."""
+    return _Span(name)
+
+
+def _profiled_call(name, func, args, kwargs):
+    """在当前线程对一次调用启用 cProfile / pyinstrument，结果按名称合并。"""
+    _local.profiling = True
+    try:
+        if 'pyinstrument' in _run['modes']:
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                Profiler = None
+            if Profiler is not None:
+                profiler = Profiler(async_mode='disabled')
+                profiler.start()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    profiler.stop()
+                    _merge_session(name, profiler.last_session)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with _lock:
+                if name in _profiles:
+                    _profiles[name].add(profiler)
+                else:
+                    _profiles[name] = pstats.Stats(profiler)
+    finally:
+        _local.profiling = False
+
+
+def _merge_session(name, session):
+    from pyinstrument.session import Session
+    with _lock:
+        previous = _sessions.get(name)
+        _sessions[name] = session if previous is None else Session.combine(previous, session)
+
+
+def timed(name=None, profile=False):
+    """
+    计时装饰器，名称默认为函数的限定名。
+    profile=True 时，该函数的调用会在开启 cprofile / pyinstrument 模式后按比例抽样剖析。
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(span_name):
+                if profile and _run['modes'] & {'cprofile', 'pyinstrument'} \
+                        and not getattr(_local, 'profiling', False) \
+                        and random.random() < PROFILE_CONFIG['profile_rate']:
+                    return _profiled_call(span_name, func, args, kwargs)
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---------- 栈采样 ----------
+
+class _StackSampler(threading.Thread):
+    """只采样处于 span 内的线程；按最外层 span 归入阶段，输出从根到叶的折叠栈。"""
+
+    def __init__(self, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=1.0)
+
+    def run(self):
+        max_depth = PROFILE_CONFIG['max_stack_depth']
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, stack in list(_thread_stacks.items()):
+                if not stack or ident == self.ident:
+                    continue
+                frame = frames.get(ident)
+                try:
+                    stage = stack[0].name
+                except IndexError:
+                    continue
+                names = []
+                while frame is not None and len(names) < max_depth:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if not names:
+                    continue
+                key = ';'.join(reversed(names))
+                with _lock:
+                    counts = _stage_stacks.setdefault(stage, {})
+                    counts[key] = counts.get(key, 0) + 1
+
+
+# ---------- 跨进程汇总 ----------
+
+def take_stats():
+    """取出并清空本进程累计的区段统计，返回 (按名称的统计, 按路径的自身耗时)；供子进程把增量交回父进程。"""
+    with _lock:
+        stats = {name: list(entry) for name, entry in _stats.items()}
+        paths = dict(_span_paths)
+        _stats.clear()
+        _span_paths.clear()
+    return stats, paths
+
+
+def merge_stats(stats, paths):
+    """把其他进程 take_stats() 的结果并入本进程的统计。"""
+    with _lock:
+        for name, (count, total, cpu, longest) in stats.items():
+            entry = _stats.get(name)
+            if entry is None:
+                _stats[name] = [count, total, cpu, longest]
+                continue
+            entry[0] += count
+            entry[1] += total
+            entry[2] += cpu
+            if longest > entry[3]:
+                entry[3] = longest
+        for path, seconds in paths.items():
+            _span_paths[path] = _span_paths.get(path, 0.0) + seconds
+
+
+def _after_fork_in_child():
+    # fork 出的子进程继承了父进程的统计与可能被其他线程持有的锁；子进程只上报自己的增量，不写报告
+    global _lock
+    _lock = threading.Lock()
+    _local.__dict__.clear()
+    _thread_stacks.clear()
+    _stats.clear()
+    _span_paths.clear()
+    _stage_stacks.clear()
+    _profiles.clear()
+    _sessions.clear()
+    _run.update(name=None, started=None, wall_started=None, modes=set(), sampler=None, finished=True)
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+# ---------- 运行与报告 ----------
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _span_paths.clear()
+        _stage_stacks.clear()
+        _profiles.clear()
+        _sessions.clear()
+
+
+def start_run(name, argv=None):
+    """
+    开始一次运行：清空统计，解析 --profile[=模式]（会从 argv 中移除），按模式启动栈采样。
+    进程退出时若未调用 finish_run() 会自动写报告。
+    """
+    modes = _parse_modes(PROFILE_CONFIG['modes'])
+    if argv is not None:
+        for arg in list(argv[1:]):
+            if arg == '--profile' or arg.startswith('--profile='):
+                modes |= _parse_modes(arg.partition('=')[2] or 'on')
+                argv.remove(arg)
+    if _run['sampler'] is not None:
+        _run['sampler'].stop()
+    reset()
+    _run.update(name=name, started=time.perf_counter(), wall_started=time.time(), modes=modes, sampler=None,
+                finished=False)
+    if 'sample' in modes:
+        _run['sampler'] = _StackSampler(PROFILE_CONFIG['sample_interval'])
+        _run['sampler'].start()
+    if modes:
+        print(f"[剖析] 已开启: {', '.join(sorted(modes))}")
+    return modes
+
+
+def summary():
+    """各 span 的聚合结果，按总耗时降序。"""
+    wall = time.perf_counter() - _run['started'] if _run['started'] else 0.0
+    with _lock:
+        items = [(name, list(entry)) for name, entry in _stats.items()]
+    spans = {}
+    for name, (count, total, cpu, longest) in sorted(items, key=lambda item: -item[1][1]):
+        spans[name] = {'count': count, 'total_seconds': round(total, 6), 'cpu_seconds': round(cpu, 6),
+                       'mean_ms': round(total / count * 1000, 3), 'max_ms': round(longest * 1000, 3),
+                       'share_of_run': round(total / wall, 4) if wall else None}
+    return {'run': _run['name'], 'started_at': _run['wall_started'], 'wall_seconds': round(wall, 3),
+            'modes': sorted(_run['modes']), 'spans': spans}
+
+
+def _write_folded(path, counts):
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, value in sorted(counts.items()):
+            f.write(f"{stack} {value}\n")
+
+
+def write_report(directory=None):
+    """把本次运行的结果写入一个新目录，返回目录路径。"""
+    data = summary()
+    stamp = datetime.fromtimestamp(_run['wall_started'] or time.time()).strftime('%Y%m%d-%H%M%S')
+    directory = directory or os.path.join(PROFILE_CONFIG['report_dir'], f"{_run['name'] or 'run'}-{stamp}-{os.getpid()}")
+    os.makedirs(directory, exist_ok=True)
+
+    with _lock:
+        span_paths = dict(_span_paths)
+        stage_stacks = {stage: dict(counts) for stage, counts in _stage_stacks.items()}
+        profiles = dict(_profiles)
+        sessions = dict(_sessions)
+
+    # 折叠栈的权重须为整数：区段级用微秒，栈采样用采样次数
+    _write_folded(os.path.join(directory, 'spans.folded'),
+                  {path: int(seconds * 1e6) for path, seconds in span_paths.items() if seconds > 0})
+    for stage, counts in stage_stacks.items():
+        _write_folded(os.path.join(directory, f"{_safe_name(stage)}.folded"), counts)
+
+    lines = [f"运行 {data['run']}：总耗时 {data['wall_seconds']:.2f} 秒，剖析模式 {','.join(data['modes']) or '无'}", '',
+             '占比 = 区段总耗时 / 运行总耗时，多线程并发的区段可超过 100%。',
+             f"{'区段':<36}{'次数':>10}{'总计(s)':>12}{'CPU(s)':>10}{'平均(ms)':>12}{'最大(ms)':>12}{'占比':>8}"]
+    for name, item in data['spans'].items():
+        share = f"{item['share_of_run']:.1%}" if item['share_of_run'] is not None else '-'
+        lines.append(f"{name:<36}{item['count']:>10}{item['total_seconds']:>12.3f}{item['cpu_seconds']:>10.3f}"
+                     f"{item['mean_ms']:>12.2f}{item['max_ms']:>12.2f}{share:>8}")
+    if stage_stacks:
+        lines += ['', '栈采样（次数）：' + '，'.join(f"{stage} {sum(c.values())}" for stage, c in stage_stacks.items())]
+
+    for name, stats in profiles.items():
+        stats.dump_stats(os.path.join(directory, f"{_safe_name(name)}.pstats"))
+        buffer = io.StringIO()
+        stats.stream = buffer
+        stats.sort_stats('cumulative').print_stats(PROFILE_CONFIG['top_functions'])
+        lines += ['', f"=== cProfile: {name}（抽样合并） ===", buffer.getvalue().strip()]
+    if sessions:
+        from pyinstrument.renderers import HTMLRenderer
+        for name, session in sessions.items():
+            with open(os.path.join(directory, f"{_safe_name(name)}.html"), 'w', encoding='utf-8') as f:
+                f.write(HTMLRenderer().render(session))
+
+    data['files'] = sorted(os.listdir(directory) + ['report.json', 'report.txt'])
+    tmp_path = os.path.join(directory, 'report.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(directory, 'report.json'))
+    with open(os.path.join(directory, 'report.txt'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return directory
+
+
+def _safe_name(name):
+    return ''.join(c if c.isalnum() or c in '._-' else '_' for c in name)
+
+
+def finish_run():
+    """结束本次运行：停止栈采样并写报告（PROFILE_CONFIG['report'] 为 False 时只返回汇总）。"""
+    if _run['finished']:
+        return None
+    _run['finished'] = True
+    if _run['sampler'] is not None:
+        _run['sampler'].stop()
+        _run['sampler'] = None
+    if not PROFILE_CONFIG['report']:
+        return None
+    try:
+        directory = write_report()
+    except OSError as e:
+        print(f"[剖析] 写入报告失败: {e}")
+        return None
+    print(f"[剖析] 性能报告已写入 {directory}")
+    return directory
+
+
+atexit.register(finish_run)
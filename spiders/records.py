@@ -0,0 +1,186 @@
+"""
+爬取数据的紧凑行表示：评论 / 文章在爬虫、流水线队列与入库之间传递时使用。
+
+- CommentRow / ArticleRow 为 namedtuple，列与 CSV 一一对应，支持下标访问，可直接交给 csv.writer，
+  与原先的 list 行兼容；元组按实际长度分配，没有 list 的过量分配；
+- 取值集合很小的列（文章ID、地区、性别、分类、是否认证）经 sys.intern 去重；
+- 作者列（昵称、所在地、简介链接、头像 URL）随用户数增长，驻留后会在进程内常驻，
+  改用每批一个的 StringPool 去重：同一批内同一用户的多条评论共享一个字符串对象，批次结束即可回收；
+- 解析进程池返回的结果经 pickle 传回后字符串会被重新创建，intern_comments() 在接收端重新去重。
+
+内存基准（在 spiders 目录执行）：
+    python records.py [评论数]
+"""
+import csv
+import io
+import json
+import random
+import sys
+import tracemalloc
+from collections import namedtuple
+
+COMMENT_FIELDS = ('articleId', 'commentId', 'created_at', 'like_counts', 'region', 'content',
+                  'authorName', 'authorGender', 'authorAddress', 'authorAvatar')
+ARTICLE_FIELDS = ('id', 'typename', 'content', 'created_at', 'likeNum', 'commentsLen', 'reposts_count',
+                  'region', 'contentLen', 'detailUrl', 'authorName', 'authorDetail', 'authorAvatar', 'isVip')
+
+CommentRow = namedtuple('CommentRow', COMMENT_FIELDS)
+ArticleRow = namedtuple('ArticleRow', ARTICLE_FIELDS)
+
+# 需要去重的列（下标）：评论ID、正文、时间几乎不重复，去重只会增加开销
+# sys.intern：取值集合小且有界的列
+_COMMENT_INTERNED = tuple(COMMENT_FIELDS.index(f) for f in ('articleId', 'region', 'authorGender'))
+_ARTICLE_INTERNED = tuple(ARTICLE_FIELDS.index(f) for f in ('typename', 'region', 'isVip'))
+# StringPool：随用户数增长的作者列
+_COMMENT_SHARED = tuple(COMMENT_FIELDS.index(f) for f in ('authorName', 'authorAddress', 'authorAvatar'))
+_ARTICLE_SHARED = tuple(ARTICLE_FIELDS.index(f) for f in ('authorName', 'authorDetail', 'authorAvatar'))
+
+STRING_POOL_SIZE = 50000
+
+
+class StringPool:
+    """一批数据内的字符串去重表；条目数达到 max_size 时清空重来，内存占用有界。"""
+    __slots__ = ('max_size', '_strings')
+
+    def __init__(self, max_size=STRING_POOL_SIZE):
+        self.max_size = max_size
+        self._strings = {}
+
+    def share(self, value):
+        if type(value) is not str:
+            return value
+        shared = self._strings.get(value)
+        if shared is None:
+            if len(self._strings) >= self.max_size:
+                self._strings.clear()
+            self._strings[value] = shared = value
+        return shared
+
+
+def intern_str(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _interned(values, positions, shared, strings):
+    values = list(values)
+    for i in positions:
+        values[i] = intern_str(values[i])
+    if strings is not None:
+        for i in shared:
+            values[i] = strings.share(values[i])
+    return values
+
+
+def comment_row(values, strings=None):
+    """strings: 本批共用的 StringPool；不传时作者列不去重。"""
+    return CommentRow._make(_interned(values, _COMMENT_INTERNED, _COMMENT_SHARED, strings))
+
+
+def article_row(values, strings=None):
+    return ArticleRow._make(_interned(values, _ARTICLE_INTERNED, _ARTICLE_SHARED, strings))
+
+
+def intern_comments(rows):
+    strings = StringPool()
+    return [comment_row(row, strings) for row in rows]
+
+
+# ---------- 内存基准 ----------
+
+_PROVINCES = ['广东', '北京', '上海', '浙江', '江苏', '山东', '四川', '河南', '湖北', '福建', '湖南', '安徽',
+              '河北', '陕西', '辽宁', '重庆', '天津', '江西', '广西', '云南', '山西', '黑龙江', '吉林', '贵州']
+
+
+def _sample_pages(count, page_size=20, seed=7):
+    """生成与 buildComments 接口结构一致的 JSON 页：文章约 200 条评论一篇，用户分布长尾。"""
+    rng = random.Random(seed)
+    users = [{'screen_name': f"用户{i:06d}", 'gender': rng.choice('mfn'),
+              'location': f"{rng.choice(_PROVINCES)} {rng.choice(['', '广州', '杭州', '成都', '其他'])}".strip(),
+              'profile_image_url': f"https://tvax{i % 4}.sinaimg.cn/crop.0.0.512.512.50/{i:016x}.jpg?KID=imgbed,tva"}
+             for i in range(max(1, count // 4))]
+    weights = [1.0 / (rank + 1) for rank in range(len(users))]
+    pages = []
+    for start in range(0, count, page_size):
+        article_id = str(5190000000000000 + start // 200)
+        data = []
+        for i in range(start, min(start + page_size, count)):
+            data.append({'idstr': str(5200000000000000 + i),
+                         'created_at': f"Fri Aug 01 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d} +0800 2025",
+                         'like_counts': rng.randint(0, 50),
+                         'source': f"来自{rng.choice(_PROVINCES)}",
+                         'text': ''.join(rng.choice('这个真的太好了支持一下哈哈哈不错有道理同意') for _ in range(rng.randint(6, 40))),
+                         'user': rng.choices(users, weights)[0]})
+        pages.append((json.dumps({'data': data, 'max_id': 0}, ensure_ascii=False).encode('utf-8'), article_id))
+    return pages
+
+
+def _measure(build, reset=None):
+    if reset is not None:
+        reset()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rows = build()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return rows, retained
+
+
+def main():
+    try:
+        from . import spiderComments
+    except ImportError:
+        import spiderComments
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    pages = _sample_pages(count)
+
+    def legacy_parse():
+        # 改造前的行：每条评论一个 list，字符串为 JSON 解码出的独立拷贝
+        rows = []
+        for raw, article_id in pages:
+            for comment in json.loads(raw)['data']:
+                user = comment.get('user', {})
+                rows.append([article_id, comment.get('idstr', ''),
+                             spiderComments.parse_weibo_time(comment.get('created_at', '')),
+                             comment.get('like_counts', 0), comment.get('source', '').replace('来自', ''),
+                             spiderComments.clean_html(comment.get('text', '')), user.get('screen_name', ''),
+                             {'m': '男', 'f': '女', 'n': '未知'}.get(user.get('gender'), '未知'),
+                             user.get('location', ''), user.get('profile_image_url', '')])
+        return rows
+
+    def compact_parse():
+        rows = []
+        for raw, article_id in pages:
+            rows.extend(spiderComments._parse_comments_core(json.loads(raw), article_id)[0])
+        return rows
+
+    # 两次测量都从空的时间解析缓存开始，缓存占用计入各自的结果
+    reset = spiderComments.parse_weibo_time.cache_clear
+    legacy_rows, legacy_bytes = _measure(legacy_parse, reset)
+    compact_rows, compact_bytes = _measure(compact_parse, reset)
+    assert [list(r) for r in compact_rows] == legacy_rows
+
+    # 入库侧：从 CSV 读回的行 → 插入元组
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(legacy_rows)
+    del legacy_rows, compact_rows
+
+    def legacy_import():
+        return [tuple(row) for row in csv.reader(io.StringIO(buffer.getvalue()))]
+
+    def compact_import():
+        strings = StringPool()
+        return [comment_row(row, strings) for row in csv.reader(io.StringIO(buffer.getvalue()))]
+
+    _, legacy_import_bytes = _measure(legacy_import)
+    _, compact_import_bytes = _measure(compact_import)
+
+    print(f"{count} 条评论的常驻内存（字节/条）：")
+    print(f"  爬虫解析  list 行 {legacy_bytes / count:8.1f}  ->  CommentRow {compact_bytes / count:8.1f}"
+          f"  （减少 {1 - compact_bytes / legacy_bytes:.0%}）")
+    print(f"  CSV 读回  tuple 行 {legacy_import_bytes / count:7.1f}  ->  CommentRow {compact_import_bytes / count:8.1f}"
+          f"  （减少 {1 - compact_import_bytes / legacy_import_bytes:.0%}）")
+
+
+if __name__ == '__main__':
+    main()
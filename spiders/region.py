@@ -0,0 +1,248 @@
+"""
+地区归一化与省级地图聚合。
+
+- normalize_region() 把 "发布于 山东"、"来自广东"、"广东 深圳"、"深圳" 等自由文本映射为省级行政区划代码
+  （与 static/data/china_geo.json 的 adcode 一致）；名称、简称与主要城市构成一棵预编译的字符前缀树，
+  每个位置做一次最长匹配，无需逐个名称做子串查找；
+- 入库时按省份增量累加文章数、评论数、活跃用户数（province_stats / province_users 表），
+  情感分析结果通过 record_sentiment() 累加到同一张表；
+- export_province_activity() 把 34 行聚合结果写成地图直接读取的小型 JSON，不再由前端或接口按原始行分组。
+"""
+import json
+import os
+from functools import lru_cache
+
+# --- 配置区 ---
+ACTIVITY_JSON = '../static/data/province_activity.json'
+HEAT_WEIGHTS = {'articles': 10, 'comments': 5, 'users': 2}  # 与地图副标题中的活跃度规则一致
+SENTIMENT_LABELS = ('positive', 'neutral', 'negative')
+
+# (代码, 规范名称, 地图显示名, 别名/主要城市)
+PROVINCES = [
+    (110000, '北京市', '北京', ['北京']),
+    (120000, '天津市', '天津', ['天津']),
+    (130000, '河北省', '河北', ['河北', '石家庄', '唐山', '保定', '邯郸', '秦皇岛', '廊坊', '沧州', '张家口', '承德', '邢台', '衡水']),
+    (140000, '山西省', '山西', ['山西', '太原', '大同', '运城', '临汾', '长治', '晋中', '晋城', '忻州', '吕梁', '阳泉', '朔州']),
+    (150000, '内蒙古自治区', '内蒙古', ['内蒙古', '内蒙', '呼和浩特', '包头', '鄂尔多斯', '赤峰', '通辽', '呼伦贝尔']),
+    (210000, '辽宁省', '辽宁', ['辽宁', '沈阳', '大连', '鞍山', '抚顺', '本溪', '丹东', '锦州', '营口', '阜新', '辽阳', '盘锦', '铁岭', '葫芦岛']),
+    (220000, '吉林省', '吉林', ['吉林', '长春', '四平', '延边', '通化', '白山', '松原', '白城', '辽源']),
+    (230000, '黑龙江省', '黑龙江', ['黑龙江', '哈尔滨', '齐齐哈尔', '牡丹江', '佳木斯', '大庆', '绥化', '鸡西', '鹤岗', '双鸭山', '黑河']),
+    (310000, '上海市', '上海', ['上海']),
+    (320000, '江苏省', '江苏', ['江苏', '南京', '苏州', '无锡', '常州', '徐州', '南通', '扬州', '镇江', '盐城', '淮安', '连云港', '泰州', '宿迁']),
+    (330000, '浙江省', '浙江', ['浙江', '杭州', '宁波', '温州', '绍兴', '嘉兴', '湖州', '金华', '台州', '衢州', '丽水', '舟山', '义乌']),
+    (340000, '安徽省', '安徽', ['安徽', '合肥', '芜湖', '蚌埠', '淮南', '马鞍山', '淮北', '铜陵', '安庆', '黄山', '阜阳', '宿州', '滁州', '六安', '宣城', '池州', '亳州']),
+    (350000, '福建省', '福建', ['福建', '福州', '厦门', '泉州', '漳州', '莆田', '三明', '南平', '龙岩', '宁德']),
+    (360000, '江西省', '江西', ['江西', '南昌', '九江', '赣州', '景德镇', '萍乡', '新余', '鹰潭', '吉安', '宜春', '抚州', '上饶']),
+    (370000, '山东省', '山东', ['山东', '济南', '青岛', '烟台', '潍坊', '淄博', '临沂', '济宁', '威海', '日照', '泰安', '德州', '聊城', '滨州', '菏泽', '枣庄', '东营']),
+    (410000, '河南省', '河南', ['河南', '郑州', '洛阳', '开封', '新乡', '南阳', '安阳', '许昌', '平顶山', '焦作', '商丘', '信阳', '周口', '驻马店', '濮阳', '漯河', '三门峡', '鹤壁']),
+    (420000, '湖北省', '湖北', ['湖北', '武汉', '宜昌', '襄阳', '荆州', '十堰', '黄石', '孝感', '黄冈', '咸宁', '荆门', '鄂州', '随州', '恩施']),
+    (430000, '湖南省', '湖南', ['湖南', '长沙', '株洲', '湘潭', '衡阳', '岳阳', '常德', '邵阳', '益阳', '郴州', '永州', '怀化', '娄底', '张家界', '湘西']),
+    (440000, '广东省', '广东', ['广东', '广州', '深圳', '东莞', '佛山', '珠海', '汕头', '惠州', '中山', '江门', '湛江', '茂名', '肇庆', '梅州', '汕尾', '河源', '阳江', '清远', '潮州', '揭阳', '云浮', '韶关']),
+    (450000, '广西壮族自治区', '广西', ['广西', '南宁', '柳州', '桂林', '梧州', '北海', '玉林', '百色', '钦州', '贵港', '河池', '来宾', '贺州', '防城港', '崇左']),
+    (460000, '海南省', '海南', ['海南', '海口', '三亚', '儋州']),
+    (500000, '重庆市', '重庆', ['重庆']),
+    (510000, '四川省', '四川', ['四川', '成都', '绵阳', '德阳', '宜宾', '南充', '泸州', '达州', '乐山', '自贡', '内江', '眉山', '遂宁', '广安', '攀枝花', '雅安', '巴中', '资阳', '凉山', '阿坝', '甘孜']),
+    (520000, '贵州省', '贵州', ['贵州', '贵阳', '遵义', '六盘水', '安顺', '毕节', '铜仁', '黔东南', '黔南', '黔西南']),
+    (530000, '云南省', '云南', ['云南', '昆明', '曲靖', '玉溪', '大理', '丽江', '红河', '西双版纳', '楚雄', '保山', '昭通', '普洱', '临沧', '文山', '德宏', '迪庆', '怒江']),
+    (540000, '西藏自治区', '西藏', ['西藏', '拉萨', '日喀则', '林芝', '昌都', '山南', '那曲', '阿里']),
+    (610000, '陕西省', '陕西', ['陕西', '西安', '宝鸡', '咸阳', '渭南', '延安', '汉中', '榆林', '安康', '商洛', '铜川']),
+    (620000, '甘肃省', '甘肃', ['甘肃', '兰州', '天水', '酒泉', '张掖', '武威', '白银', '平凉', '庆阳', '定西', '陇南', '嘉峪关', '金昌', '临夏', '甘南']),
+    (630000, '青海省', '青海', ['青海', '西宁', '海东', '格尔木', '玉树']),
+    (640000, '宁夏回族自治区', '宁夏', ['宁夏', '银川', '石嘴山', '吴忠', '固原', '中卫']),
+    (650000, '新疆维吾尔自治区', '新疆', ['新疆', '乌鲁木齐', '克拉玛依', '吐鲁番', '哈密', '喀什', '和田', '阿克苏', '伊犁', '昌吉', '库尔勒', '石河子']),
+    (710000, '台湾省', '台湾', ['台湾', '中国台湾', '台北', '高雄', '台中', '台南', '新北', '桃园']),
+    (810000, '香港特别行政区', '香港', ['香港', '中国香港']),
+    (820000, '澳门特别行政区', '澳门', ['澳门', '中国澳门']),
+]
+
+PROVINCE_NAMES = {code: full for code, full, _, _ in PROVINCES}
+DISPLAY_NAMES = {code: display for code, _, display, _ in PROVINCES}
+
+# "海外 美国"、"其他" 等显式标记为非国内地区，直接返回 None
+_FOREIGN_MARKERS = ('海外', '其他', '国外')
+_END = object()
+
+
+def _build_trie():
+    trie = {}
+    for code, full, display, aliases in PROVINCES:
+        for name in {full, display, *aliases}:
+            node = trie
+            for ch in name:
+                node = node.setdefault(ch, {})
+            node[_END] = code
+    return trie
+
+
+_TRIE = _build_trie()
+
+
+@lru_cache(maxsize=10000)
+def normalize_region(text):
+    """
+    自由文本地区 → 省级代码（int），无法识别或为海外地区时返回 None。
+    从左到右扫描，取第一个位置上的最长匹配，因此 "广东 深圳" 与 "深圳" 都归入广东。
+    """
+    text = (text or '').strip()
+    if not text or text.startswith(_FOREIGN_MARKERS):
+        return None
+    for start in range(len(text)):
+        node = _TRIE
+        match = None
+        for ch in text[start:]:
+            node = node.get(ch)
+            if node is None:
+                break
+            if _END in node:
+                match = node[_END]
+        if match is not None:
+            return match
+    return None
+
+
+def comment_province(region, author_address):
+    """评论优先使用发布地（IP属地），缺失时退回用户资料中的所在地。"""
+    return normalize_region(region) or normalize_region(author_address)
+
+
+# --- 增量聚合（MySQL） ---
+CREATE_STATS_SQL = """
+CREATE TABLE IF NOT EXISTS province_stats (
+    provinceCode INT PRIMARY KEY,
+    articles INT DEFAULT 0,
+    comments INT DEFAULT 0,
+    users INT DEFAULT 0,
+    positive INT DEFAULT 0,
+    neutral INT DEFAULT 0,
+    negative INT DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+CREATE_USERS_SQL = """
+CREATE TABLE IF NOT EXISTS province_users (
+    provinceCode INT,
+    authorName VARCHAR(100),
+    PRIMARY KEY (provinceCode, authorName)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+_INCREMENT_SQL = """
+INSERT INTO province_stats (provinceCode, {column}) VALUES (%s, %s)
+ON DUPLICATE KEY UPDATE {column} = {column} + VALUES({column})
+"""
+
+
+def create_tables(cursor):
+    cursor.execute(CREATE_STATS_SQL)
+    cursor.execute(CREATE_USERS_SQL)
+
+
+def _increment(cursor, column, counts):
+    if counts:
+        cursor.executemany(_INCREMENT_SQL.format(column=column), sorted(counts.items()))
+
+
+def _count_by_province(codes):
+    counts = {}
+    for code in codes:
+        if code is not None:
+            counts[code] = counts.get(code, 0) + 1
+    return counts
+
+
+_INSERT_USERS_SQL = "INSERT IGNORE INTO province_users (provinceCode, authorName) VALUES (%s, %s)"
+
+
+def _record_users(cursor, pairs):
+    """
+    登记 (省份, 用户名)，只有首次出现的用户才计入该省活跃用户数。
+    每个省份一条多行 INSERT IGNORE（executemany 会合并为多值插入），影响行数即该省新增用户数。
+    """
+    by_province = {}
+    for code, author in set(pairs):
+        if code is None or not author:
+            continue
+        by_province.setdefault(code, set()).add(author[:100])
+    new_users = {}
+    for code, authors in by_province.items():
+        inserted = cursor.executemany(_INSERT_USERS_SQL, [(code, author) for author in sorted(authors)])
+        if inserted:
+            new_users[code] = inserted
+    _increment(cursor, 'users', new_users)
+
+
+def record_articles(cursor, records):
+    """
+    累加一批新入库文章的省级计数；records 为 articles 表插入元组（末列为 provinceCode）。
+    需在文章写入的同一事务中调用，由调用方提交。
+    """
+    _increment(cursor, 'articles', _count_by_province(r[-1] for r in records))
+    _record_users(cursor, [(r[-1], r[10]) for r in records])
+
+
+def record_comments(cursor, records):
+    """累加一批新入库评论的省级计数；records 为 comments 表插入元组（末列为 provinceCode）。"""
+    _increment(cursor, 'comments', _count_by_province(r[-1] for r in records))
+    _record_users(cursor, [(r[-1], r[6]) for r in records])
+
+
+def record_sentiment(cursor, labelled):
+    """累加情感结果，labelled 为 (provinceCode, 'positive'/'neutral'/'negative') 序列。"""
+    for label in SENTIMENT_LABELS:
+        _increment(cursor, label, _count_by_province(code for code, l in labelled if l == label))
+
+
+def record_comment_sentiment(connection, labels):
+    """按评论ID写入情感结果：labels 为 (commentId, label) 序列，省份从 comments.provinceCode 读取。"""
+    labels = dict(labels)
+    if not labels:
+        return
+    cursor = connection.cursor()
+    try:
+        placeholders = ', '.join(['%s'] * len(labels))
+        cursor.execute(f"SELECT commentId, provinceCode FROM comments WHERE commentId IN ({placeholders})",
+                       list(labels))
+        record_sentiment(cursor, [(code, labels[cid]) for cid, code in cursor.fetchall()])
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def heat_index(stats):
+    return sum(stats.get(k, 0) * w for k, w in HEAT_WEIGHTS.items())
+
+
+def export_province_activity(connection, path=ACTIVITY_JSON):
+    """
+    导出地图使用的省级聚合 JSON：{显示名: {heatIndex, articleCount, commentCount, userCount, sentiment}}，
+    通过临时文件原子替换，前端读取时不会读到半截文件。
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT provinceCode, articles, comments, users, positive, neutral, negative "
+                       "FROM province_stats")
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    data = {}
+    for code, articles, comments, users, positive, neutral, negative in rows:
+        if code not in DISPLAY_NAMES:
+            continue
+        stats = {'articles': articles, 'comments': comments, 'users': users}
+        data[DISPLAY_NAMES[code]] = {
+            'adcode': code,
+            'heatIndex': heat_index(stats),
+            'articleCount': articles,
+            'commentCount': comments,
+            'userCount': users,
+            'sentiment': {'positive': positive, 'neutral': neutral, 'negative': negative},
+        }
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return data
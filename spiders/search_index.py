@@ -0,0 +1,348 @@
+"""
+文章 / 评论全文检索索引（SQLite FTS5 + jieba 分词）。
+
+- 正文先用 jieba 切词并以空格连接，再写入 FTS5（unicode61 分词器按空格切分），
+  因此中文词语、短语（"剧情 反转"）与布尔查询（AND / OR / NOT / 括号）都能直接使用；
+- FTS5 表为无内容表（content=''），只存倒排索引；元数据（分类、地区、日期、情感）存于普通表并建索引，
+  检索时按 rowid 关联过滤，结果按 bm25 排序；
+- WeiboDataManager 每次入库提交后调用 add_documents() 增量更新，已索引的ID会被跳过。
+"""
+import csv
+import os
+import random
+import re
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from functools import lru_cache
+
+# --- 配置区 ---
+INDEX_PATH = './search_index.db'
+ARTICLES_CSV = './article.csv'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    rowid INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,              -- 'article' / 'comment'
+    doc_id TEXT NOT NULL,
+    article_id TEXT,
+    typename TEXT,
+    region TEXT,
+    created_at TEXT,                 -- 'YYYY-MM-DD HH:MM:SS'
+    sentiment TEXT,
+    UNIQUE (kind, doc_id)
+);
+CREATE INDEX IF NOT EXISTS idx_docs_typename ON docs (typename);
+CREATE INDEX IF NOT EXISTS idx_docs_region ON docs (region);
+CREATE INDEX IF NOT EXISTS idx_docs_created_at ON docs (created_at);
+CREATE INDEX IF NOT EXISTS idx_docs_sentiment ON docs (sentiment);
+CREATE INDEX IF NOT EXISTS idx_docs_article ON docs (article_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(body, content='', tokenize='unicode61');
+"""
+
+_OPERATORS = {'AND', 'OR', 'NOT'}
+_QUERY_TOKEN_RE = re.compile(r'"[^"]*"|\(|\)|[^\s()"]+')
+_REGION_PREFIX = '发布于 '
+
+_jieba = None
+
+
+def _load_jieba():
+    global _jieba
+    if _jieba is None:
+        import jieba
+        jieba.setLogLevel(60)
+        jieba.initialize()
+        _jieba = jieba
+    return _jieba
+
+
+@lru_cache(maxsize=50000)
+def tokenize(text):
+    """jieba 切词并以空格连接，供建索引与查询共用（保证短语匹配时词边界一致）。"""
+    words = (w.strip() for w in _load_jieba().lcut(text or ''))
+    return ' '.join(w for w in words if w and not w.isspace())
+
+
+def _phrase(text):
+    tokens = tokenize(text).replace('"', ' ').split()
+    return f'"{" ".join(tokens)}"' if tokens else None
+
+
+def build_match_query(query):
+    """
+    把用户查询转换为 FTS5 MATCH 表达式：
+    普通词与 "引号短语" 都会按 jieba 切词后作为短语匹配；AND / OR / NOT 与括号原样保留，
+    相邻的词之间默认为 AND。
+    """
+    parts = []
+    for token in _QUERY_TOKEN_RE.findall(query or ''):
+        if token in _OPERATORS or token in ('(', ')'):
+            parts.append(token)
+            continue
+        phrase = _phrase(token.strip('"'))
+        if phrase:
+            parts.append(phrase)
+    # 去掉开头/结尾悬空的运算符
+    while parts and parts[0] in _OPERATORS:
+        parts.pop(0)
+    while parts and parts[-1] in _OPERATORS:
+        parts.pop()
+    return ' '.join(parts)
+
+
+def normalize_region(region):
+    region = (region or '').strip()
+    return region[len(_REGION_PREFIX):] if region.startswith(_REGION_PREFIX) else region
+
+
+class SearchIndex:
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    # --- 写入 ---
+    def add_documents(self, kind, docs):
+        """
+        增量写入文档。docs 为字典可迭代对象，字段：id, content，可选 article_id, typename, region, created_at。
+        评论未提供 typename 时从已索引的所属文章继承。已存在的 (kind, id) 会被跳过，返回新增数。
+        """
+        docs = [d for d in docs if d.get('id')]
+        if not docs:
+            return 0
+        bodies = [tokenize(d.get('content') or '') for d in docs]
+        added = 0
+        with self._lock:
+            cursor = self.connection.cursor()
+            try:
+                for doc, body in zip(docs, bodies):
+                    typename = doc.get('typename')
+                    if not typename and kind == 'comment' and doc.get('article_id'):
+                        row = cursor.execute(
+                            "SELECT typename FROM docs WHERE kind = 'article' AND doc_id = ?",
+                            (str(doc['article_id']),)).fetchone()
+                        typename = row[0] if row else None
+                    cursor.execute(
+                        "INSERT OR IGNORE INTO docs (kind, doc_id, article_id, typename, region, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (kind, str(doc['id']), str(doc.get('article_id') or ''),
+                         typename, normalize_region(doc.get('region')), doc.get('created_at')))
+                    if cursor.rowcount == 0:
+                        continue
+                    cursor.execute("INSERT INTO docs_fts (rowid, body) VALUES (?, ?)", (cursor.lastrowid, body))
+                    added += 1
+                self.connection.commit()
+            except Exception:
+                self.connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        return added
+
+    def set_sentiment(self, kind, labels):
+        """写入情感标签，labels 为 {doc_id: 'positive'/'negative'/...} 或 (doc_id, label) 序列。"""
+        items = labels.items() if isinstance(labels, dict) else labels
+        with self._lock:
+            self.connection.executemany(
+                "UPDATE docs SET sentiment = ? WHERE kind = ? AND doc_id = ?",
+                [(label, kind, str(doc_id)) for doc_id, label in items])
+            self.connection.commit()
+
+    def optimize(self):
+        """合并 FTS5 段，批量建库后调用可降低查询延迟。"""
+        with self._lock:
+            self.connection.execute("INSERT INTO docs_fts (docs_fts) VALUES ('optimize')")
+            self.connection.commit()
+
+    def count(self, kind=None):
+        if kind is None:
+            return self.connection.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        return self.connection.execute("SELECT COUNT(*) FROM docs WHERE kind = ?", (kind,)).fetchone()[0]
+
+    # --- 查询 ---
+    def search(self, query, kind=None, typename=None, region=None, start=None, end=None,
+               sentiment=None, article_id=None, limit=20, offset=0):
+        """
+        全文检索，返回按 bm25 相关度排序的结果字典列表
+        （kind, id, article_id, typename, region, created_at, sentiment, score；score 越小越相关）。
+        start / end 为 'YYYY-MM-DD' 或完整时间字符串。
+        """
+        match = build_match_query(query)
+        if not match:
+            return []
+        conditions = ["docs_fts MATCH ?"]
+        params = [match]
+        for column, value in (('d.kind', kind), ('d.typename', typename), ('d.region', normalize_region(region)),
+                              ('d.sentiment', sentiment), ('d.article_id', article_id)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(str(value))
+        if start:
+            conditions.append("d.created_at >= ?")
+            params.append(str(start))
+        if end:
+            conditions.append("d.created_at <= ?")
+            params.append(f"{end} 23:59:59" if len(str(end)) == 10 else str(end))
+        params.extend([int(limit), int(offset)])
+
+        sql = (
+            "SELECT d.kind, d.doc_id, d.article_id, d.typename, d.region, d.created_at, d.sentiment, "
+            "bm25(docs_fts) AS score "
+            "FROM docs_fts JOIN docs d ON d.rowid = docs_fts.rowid "
+            f"WHERE {' AND '.join(conditions)} ORDER BY score LIMIT ? OFFSET ?"
+        )
+        try:
+            rows = self.connection.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            print(f"检索语句无效: {query!r} ({e})")
+            return []
+        keys = ('kind', 'id', 'article_id', 'typename', 'region', 'created_at', 'sentiment', 'score')
+        return [dict(zip(keys, row)) for row in rows]
+
+
+# --- 与入库记录的对接 ---
+def article_record_to_doc(record):
+    """articles 表插入元组（见 main.article_row_to_record）→ 索引文档"""
+    return {'id': record[0], 'article_id': record[0], 'typename': record[1], 'content': record[2],
+            'created_at': record[3], 'region': record[7]}
+
+
+def comment_record_to_doc(record):
+    """comments 表插入元组（见 main.comment_row_to_record）→ 索引文档"""
+    return {'id': record[0], 'article_id': record[1], 'created_at': record[2], 'region': record[4],
+            'content': record[5]}
+
+
+def build_from_database(index, connection, batch_size=5000):
+    """从 MySQL 全量建立（或补齐）索引；已索引的数据会被跳过。"""
+    totals = {}
+    for kind, sql, to_doc in (
+            ('article', "SELECT id, typename, content, created_at, region FROM articles",
+             lambda r: {'id': r[0], 'article_id': r[0], 'typename': r[1], 'content': r[2],
+                        'created_at': str(r[3]) if r[3] else None, 'region': r[4]}),
+            ('comment', "SELECT commentId, articleId, content, created_at, region FROM comments",
+             lambda r: {'id': r[0], 'article_id': r[1], 'content': r[2],
+                        'created_at': str(r[3]) if r[3] else None, 'region': r[4]})):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(sql)
+            totals[kind] = 0
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                totals[kind] += index.add_documents(kind, [to_doc(r) for r in rows])
+        finally:
+            cursor.close()
+    index.optimize()
+    return totals
+
+
+# --- 延迟基准测试 ---
+def benchmark(index, queries, repeat=20, **filters):
+    """逐条查询重复执行 repeat 次，返回 {查询: (p50毫秒, p95毫秒, 结果数)}。"""
+    results = {}
+    for query in queries:
+        timings = []
+        hits = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            hits = len(index.search(query, **filters))
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        results[query] = (statistics.median(timings), p95, hits)
+    return results
+
+
+def _synthetic_corpus(source_csv, n_docs, seed=42):
+    """用真实文章文本的句子片段随机拼接出 n_docs 条评论，用于规模化延迟测试。"""
+    fragments = []
+    if os.path.exists(source_csv):
+        with open(source_csv, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                fragments.extend(s for s in re.split(r'[，。！？\s]+', row.get('content') or '') if len(s) >= 2)
+    if not fragments:
+        fragments = ['剧情反转', '演员演技', '今天天气很好', '支持一下', '太好笑了', '心疼', '期待更新']
+    rng = random.Random(seed)
+    typenames = ['热门', '社会', '娱乐', '体育', '科技']
+    regions = ['北京', '上海', '广东', '四川', '浙江', '江苏']
+    sentiments = ['positive', 'negative', 'neutral']
+    for i in range(n_docs):
+        yield {
+            'id': str(10 ** 15 + i), 'article_id': str(rng.randrange(1000)),
+            'typename': rng.choice(typenames), 'region': rng.choice(regions),
+            'created_at': f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00",
+            'content': '，'.join(rng.choice(fragments) for _ in range(rng.randint(1, 4))),
+            'sentiment': rng.choice(sentiments),
+        }
+
+
+def run_benchmark(n_docs=200000, source_csv=ARTICLES_CSV, path=None):
+    """建立 n_docs 条合成评论的索引并打印各类查询的延迟；未指定 path 时使用临时目录，结束后删除。"""
+    temp_dir = None
+    if path is None:
+        temp_dir = tempfile.mkdtemp(prefix='weibo_search_')
+        path = os.path.join(temp_dir, 'bench.db')
+    index = SearchIndex(path)
+    try:
+        _run_benchmark(index, n_docs, source_csv, path)
+    finally:
+        index.close()
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _run_benchmark(index, n_docs, source_csv, path):
+    started = time.perf_counter()
+    batch = []
+    for doc in _synthetic_corpus(source_csv, n_docs):
+        batch.append(doc)
+        if len(batch) >= 10000:
+            index.add_documents('comment', batch)
+            index.set_sentiment('comment', [(d['id'], d['sentiment']) for d in batch])
+            batch = []
+    if batch:
+        index.add_documents('comment', batch)
+        index.set_sentiment('comment', [(d['id'], d['sentiment']) for d in batch])
+    index.optimize()
+    print(f"建立 {index.count()} 条文档索引耗时 {time.perf_counter() - started:.1f} 秒，文件 {path}")
+
+    queries = ['致敬', '"一周一次"', '天气 OR 下雨', '演员 NOT 演技', '(中国 OR 国家) AND 发展']
+    for label, filters in (('无过滤', {}), ('分类+地区', {'typename': '娱乐', 'region': '北京'}),
+                           ('日期+情感', {'start': '2025-06-01', 'end': '2025-06-30', 'sentiment': 'negative'})):
+        print(f"\n--- {label} ---")
+        print(f"{'查询':<28}{'p50(ms)':>10}{'p95(ms)':>10}{'结果数':>8}")
+        for query, (p50, p95, hits) in benchmark(index, queries, **filters).items():
+            print(f"{query:<28}{p50:>10.2f}{p95:>10.2f}{hits:>8}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        run_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 200000)
+        return
+    if len(sys.argv) < 2:
+        print("用法: python search_index.py <查询> | bench [文档数]")
+        return
+    index = SearchIndex()
+    for hit in index.search(' '.join(sys.argv[1:])):
+        print(f"[{hit['kind']}] {hit['id']}  {hit['typename'] or '-'}  {hit['region'] or '-'}  "
+              f"{hit['created_at'] or '-'}  {hit['score']:.3f}")
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+"""
+评论情感时序存储与预聚合。
+
+- sentiment_points 保存逐条评论的情感结果（标签、得分、置信度、评论时间及所属分类 / 省份 / 文章），
+  以评论ID为主键，重复写入会被忽略；
+- sentiment_rollups 在写入时同步累加分钟 / 小时 / 天三级汇总：各标签计数、得分之和（用于均值）与置信度直方图，
+  维度为 all / typename / region / article；主键 (resolution, dimension, dim_value, bucket) 即范围查询的索引，
+  趋势查询只读取汇总表，几个月的数据也只扫描几百行；
+- 分钟、小时汇总按保留期清理（prune），天级汇总永久保留；rebuild() 可从明细表重新生成全部汇总。
+
+命令行（在 spiders 目录执行）：
+    python sentiment_series.py trend typename 热门 30
+    python sentiment_series.py prune
+    python sentiment_series.py rebuild
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+# --- 配置区 ---
+SERIES_CONFIG = {
+    # 各级汇总的桶宽（秒）与保留天数（None 表示永久保留）
+    'resolutions': {'minute': 60, 'hour': 3600, 'day': 86400},
+    'retention_days': {'minute': 7, 'hour': 180, 'day': None},
+    'max_points': 720,         # 未指定粒度时，选择桶数不超过此值的最细粒度
+    'confidence_bins': 10,     # 置信度直方图在 [0, 1] 上等宽分桶
+    'batch_size': 1000,        # rebuild() 每批读取的明细行数
+}
+SENTIMENT_LABELS = ('positive', 'neutral', 'negative')
+DIMENSIONS = ('all', 'typename', 'region', 'article')
+
+_BINS = SERIES_CONFIG['confidence_bins']
+_CONF_COLUMNS = [f"conf_{i}" for i in range(_BINS)]
+_METRIC_COLUMNS = list(SENTIMENT_LABELS) + ['score_sum'] + _CONF_COLUMNS
+
+CREATE_POINTS_SQL = """
+CREATE TABLE IF NOT EXISTS sentiment_points (
+    commentId VARCHAR(50) PRIMARY KEY,
+    articleId VARCHAR(50),
+    typename VARCHAR(100),
+    provinceCode INT,
+    ts DATETIME NOT NULL,
+    label VARCHAR(10) NOT NULL,
+    score FLOAT,
+    confidence FLOAT,
+    INDEX idx_ts (ts)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+CREATE_ROLLUPS_SQL = f"""
+CREATE TABLE IF NOT EXISTS sentiment_rollups (
+    resolution ENUM('minute', 'hour', 'day') NOT NULL,
+    dimension ENUM('all', 'typename', 'region', 'article') NOT NULL,
+    dim_value VARCHAR(100) NOT NULL DEFAULT '',
+    bucket DATETIME NOT NULL,
+    positive INT NOT NULL DEFAULT 0,
+    neutral INT NOT NULL DEFAULT 0,
+    negative INT NOT NULL DEFAULT 0,
+    score_sum DOUBLE NOT NULL DEFAULT 0,
+    {', '.join(f'{c} INT NOT NULL DEFAULT 0' for c in _CONF_COLUMNS)},
+    PRIMARY KEY (resolution, dimension, dim_value, bucket)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+"""
+
+_UPSERT_SQL = (
+    f"INSERT INTO sentiment_rollups (resolution, dimension, dim_value, bucket, {', '.join(_METRIC_COLUMNS)}) "
+    f"VALUES ({', '.join(['%s'] * (4 + len(_METRIC_COLUMNS)))}) "
+    f"ON DUPLICATE KEY UPDATE {', '.join(f'{c} = {c} + VALUES({c})' for c in _METRIC_COLUMNS)}"
+)
+
+
+def create_tables(cursor):
+    cursor.execute(CREATE_POINTS_SQL)
+    cursor.execute(CREATE_ROLLUPS_SQL)
+
+
+# ---------- 写入 ----------
+
+def bucket_start(ts, resolution):
+    if resolution == 'minute':
+        return ts.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"未知的汇总粒度: {resolution}")
+
+
+def _confidence_bin(confidence):
+    return min(int(max(confidence or 0.0, 0.0) * _BINS), _BINS - 1)
+
+
+def _dimension_keys(point):
+    _, article_id, typename, province_code = point[:4]
+    yield 'all', ''
+    if typename:
+        yield 'typename', typename[:100]
+    if province_code is not None:
+        yield 'region', str(province_code)
+    if article_id:
+        yield 'article', article_id
+
+
+def _aggregate(points, rollups=None):
+    """把明细累加到 {(粒度, 维度, 维度值, 桶): 指标列表}，指标顺序与 _METRIC_COLUMNS 一致。"""
+    rollups = {} if rollups is None else rollups
+    width = len(_METRIC_COLUMNS)
+    for point in points:
+        ts, label, score, confidence = point[4:8]
+        if label not in SENTIMENT_LABELS:
+            continue
+        label_index = SENTIMENT_LABELS.index(label)
+        conf_index = 4 + _confidence_bin(confidence)
+        buckets = [(resolution, bucket_start(ts, resolution)) for resolution in SERIES_CONFIG['resolutions']]
+        for dimension, value in _dimension_keys(point):
+            for resolution, bucket in buckets:
+                key = (resolution, dimension, value, bucket)
+                metrics = rollups.get(key)
+                if metrics is None:
+                    metrics = rollups[key] = [0] * width
+                metrics[label_index] += 1
+                metrics[3] += score or 0.0
+                metrics[conf_index] += 1
+    return rollups
+
+
+def _flush_rollups(cursor, rollups):
+    if rollups:
+        cursor.executemany(_UPSERT_SQL, [key + tuple(metrics) for key, metrics in sorted(rollups.items())])
+
+
+def record_points(connection, points, on_insert=None):
+    """
+    写入一批情感明细并累加汇总，在同一事务中提交；已写入过的评论被忽略，重复打分不会重复计数。
+    points: (commentId, articleId, typename, provinceCode, ts, label, score, confidence) 序列，
+    ts 为 datetime，score 在 [-1, 1]（正面概率减负面概率），confidence 为预测标签的概率。
+    on_insert(cursor, points) 可选，在同一事务中以本次新写入的明细调用，用于同步累加其他统计。
+    返回新写入的条数。
+    """
+    points = list({p[0]: p for p in points if p[4] is not None}.values())
+    if not points:
+        return 0
+    cursor = connection.cursor()
+    try:
+        placeholders = ', '.join(['%s'] * len(points))
+        cursor.execute(f"SELECT commentId FROM sentiment_points WHERE commentId IN ({placeholders})",
+                       [p[0] for p in points])
+        existing = {row[0] for row in cursor.fetchall()}
+        points = [p for p in points if p[0] not in existing]
+        if points:
+            cursor.executemany(
+                "INSERT INTO sentiment_points (commentId, articleId, typename, provinceCode, ts, label, score, "
+                "confidence) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", points)
+            _flush_rollups(cursor, _aggregate(points))
+            if on_insert is not None:
+                on_insert(cursor, points)
+        connection.commit()
+        return len(points)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def points_from_probs(rows, probs, id2label):
+    """
+    把模型输出转成 record_points() 的明细。
+    rows: (commentId, articleId, typename, provinceCode, ts) 序列；probs: 与 rows 对齐的概率矩阵。
+    """
+    index = {label: i for i, label in id2label.items()}
+    points = []
+    for row, p in zip(rows, probs):
+        best = int(p.argmax())
+        score = float(p[index['positive']] - p[index['negative']])
+        points.append(tuple(row) + (id2label[best], round(score, 4), round(float(p[best]), 4)))
+    return points
+
+
+def prune(connection, now=None):
+    """删除超过保留期的分钟 / 小时汇总，返回删除的行数。"""
+    now = now or datetime.now()
+    deleted = 0
+    cursor = connection.cursor()
+    try:
+        for resolution, days in SERIES_CONFIG['retention_days'].items():
+            if days is None:
+                continue
+            cutoff = bucket_start(now - timedelta(days=days), resolution)
+            deleted += cursor.execute("DELETE FROM sentiment_rollups WHERE resolution = %s AND bucket < %s",
+                                      (resolution, cutoff))
+        connection.commit()
+    finally:
+        cursor.close()
+    return deleted
+
+
+def rebuild(connection, stream_connection, now=None):
+    """
+    从明细表重新生成全部汇总（汇总与明细不一致或调整保留期后使用）。
+    stream_connection 使用无缓冲游标（SSCursor）逐批读取明细，内存占用与明细行数无关。
+    """
+    cursor = connection.cursor()
+    reader = stream_connection.cursor()
+    rows = 0
+    try:
+        cursor.execute("DELETE FROM sentiment_rollups")
+        reader.execute("SELECT commentId, articleId, typename, provinceCode, ts, label, score, confidence "
+                       "FROM sentiment_points ORDER BY ts")
+        while True:
+            batch = reader.fetchmany(SERIES_CONFIG['batch_size'])
+            if not batch:
+                break
+            _flush_rollups(cursor, _aggregate(batch))
+            rows += len(batch)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        reader.close()
+        cursor.close()
+    prune(connection, now)
+    return rows
+
+
+# ---------- 查询 ----------
+
+def choose_resolution(start, end, now=None, max_points=None):
+    """选择桶数不超过 max_points、且起点仍在保留期内的最细粒度。"""
+    now = now or datetime.now()
+    max_points = max_points or SERIES_CONFIG['max_points']
+    span = (end - start).total_seconds()
+    for resolution, width in SERIES_CONFIG['resolutions'].items():
+        days = SERIES_CONFIG['retention_days'][resolution]
+        if days is not None and start < now - timedelta(days=days):
+            continue
+        if span / width <= max_points:
+            return resolution
+    return 'day'
+
+
+def trend_query(dimension, value, start, end, resolution):
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"未知的维度: {dimension}")
+    if resolution not in SERIES_CONFIG['resolutions']:
+        raise ValueError(f"未知的汇总粒度: {resolution}")
+    sql = (f"SELECT bucket, {', '.join(_METRIC_COLUMNS)} FROM sentiment_rollups "
+           "WHERE resolution = %s AND dimension = %s AND dim_value = %s AND bucket >= %s AND bucket < %s "
+           "ORDER BY bucket")
+    return sql, [resolution, dimension, '' if dimension == 'all' else str(value),
+                 bucket_start(start, resolution), end]
+
+
+def _point(bucket, metrics):
+    counts = {label: int(metrics[i]) for i, label in enumerate(SENTIMENT_LABELS)}
+    total = sum(counts.values())
+    return dict(counts, bucket=bucket.strftime('%Y-%m-%d %H:%M:%S'), total=total,
+                mean_score=round(metrics[3] / total, 4) if total else None,
+                confidence=[int(c) for c in metrics[4:]])
+
+
+def shape_trend(rows, resolution, start, end, fill=True):
+    """
+    把汇总行整理为 {'resolution', 'points', 'summary'}；fill 为 True 时补齐没有数据的桶（计数为 0），
+    图表的横轴保持等距。
+    """
+    by_bucket = {row[0]: row[1:] for row in rows}
+    empty = [0] * len(_METRIC_COLUMNS)
+    if fill:
+        step = timedelta(seconds=SERIES_CONFIG['resolutions'][resolution])
+        buckets, bucket = [], bucket_start(start, resolution)
+        while bucket < end:
+            buckets.append(bucket)
+            bucket += step
+    else:
+        buckets = sorted(by_bucket)
+    points = [_point(bucket, by_bucket.get(bucket, empty)) for bucket in buckets]
+
+    totals = [sum(column) for column in zip(*by_bucket.values())] if by_bucket else empty
+    summary = _point(bucket_start(start, resolution), totals)
+    del summary['bucket']
+    return {'resolution': resolution, 'points': points, 'summary': summary}
+
+
+def trend(fetch, dimension, value, start, end, resolution=None, fill=True):
+    """
+    查询 [start, end) 内某个维度值的情感趋势，只读取汇总表。
+    fetch(sql, params) 执行查询并返回行列表，Web 端传入 utils.query，脚本中可传入游标的封装。
+    """
+    resolution = resolution or choose_resolution(start, end)
+    sql, params = trend_query(dimension, value, start, end, resolution)
+    return shape_trend(fetch(sql, params), resolution, start, end, fill)
+
+
+DISTRIBUTION_SQL = (
+    "SELECT COALESCE(SUM(positive), 0), COALESCE(SUM(neutral), 0), COALESCE(SUM(negative), 0) "
+    "FROM sentiment_rollups WHERE resolution = 'day' AND dimension = 'all' AND dim_value = ''")
+
+
+def distribution(fetch):
+    """
+    全部已打分评论的情感构成 {'counts': {标签: 数量}, 'total': 总数}。
+    读取永久保留的天级 all 汇总，与首页饼图、实时推送使用同一口径。
+    """
+    rows = fetch(DISTRIBUTION_SQL, [])
+    values = rows[0] if rows else (0,) * len(SENTIMENT_LABELS)
+    counts = {label: int(value or 0) for label, value in zip(SENTIMENT_LABELS, values)}
+    return {'counts': counts, 'total': sum(counts.values())}
+
+
+def main():
+    import pymysql
+    import pymysql.cursors
+    try:
+        from .main import DB_CONFIG
+    except ImportError:
+        from main import DB_CONFIG
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'trend'
+    connection = pymysql.connect(**DB_CONFIG)
+    try:
+        cursor = connection.cursor()
+        create_tables(cursor)
+        connection.commit()
+        if command == 'trend':
+            dimension = sys.argv[2] if len(sys.argv) > 2 else 'all'
+            value = sys.argv[3] if len(sys.argv) > 3 else ''
+            days = int(sys.argv[4]) if len(sys.argv) > 4 else 30
+            end = datetime.now()
+
+            def fetch(sql, params):
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+
+            started = time.perf_counter()
+            result = trend(fetch, dimension, value, end - timedelta(days=days), end)
+            elapsed = (time.perf_counter() - started) * 1000
+            for point in result['points']:
+                if point['total']:
+                    print(point['bucket'], point['positive'], point['neutral'], point['negative'], point['mean_score'])
+            print(f"粒度 {result['resolution']}，{len(result['points'])} 个桶，合计 {result['summary']}，"
+                  f"查询耗时 {elapsed:.1f} ms")
+        elif command == 'prune':
+            print(f"已删除 {prune(connection)} 行过期汇总。")
+        elif command == 'rebuild':
+            started = time.time()
+            stream_connection = pymysql.connect(cursorclass=pymysql.cursors.SSCursor, **DB_CONFIG)
+            try:
+                rows = rebuild(connection, stream_connection)
+            finally:
+                stream_connection.close()
+            print(f"已从 {rows} 条明细重建汇总，耗时: {time.time() - started:.2f} 秒。")
+        else:
+            print(__doc__)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,19 +3,32 @@ from threading import Lock
 import time
 import requests
 import csv
+import json
 import os
 import random
+import sys
 from datetime import datetime
+from functools import lru_cache
 from bs4 import BeautifulSoup
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+try:
+    from . import metrics
+    from . import crawl_scheduler
+    from . import parse_pool
+    from . import profiling
+    from . import records
+except ImportError:
+    import metrics
+    import crawl_scheduler
+    import parse_pool
+    import profiling
+    import records
+
 # --- 配置区 ---
 ARTICLES_CSV_INPUT = './articleData_sample.csv'
 COMMENTS_CSV_OUTPUT = './commentsData.csv'
-COMMENTS_CSV_HEADERS = [
-    'articleId', 'commentId', 'created_at', 'like_counts', 'region', 'content',
-    'authorName', 'authorGender', 'authorAddress', 'authorAvatar'
-]
+COMMENTS_CSV_HEADERS = list(records.COMMENT_FIELDS)
 
 # 全局速率限制（跨线程）
 RATE_CONFIG = {
@@ -26,6 +39,38 @@ RATE_CONFIG = {
 _RATE_LOCK = Lock()
 _NEXT_TS = 0.0
 
+# 爬取进度：节流后原子写入 JSON 文件，Web 端（views/stream）读取后推送给浏览器
+PROGRESS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crawl_progress.json')
+PROGRESS_MIN_INTERVAL = 1.0  # 秒
+_PROGRESS = {}
+_PROGRESS_LOCK = Lock()
+_PROGRESS_WRITTEN_AT = 0.0
+# 可由外部注入的进度回调（如 job_manager 的工作进程），与写文件同频调用，参数为完整进度字典
+PROGRESS_HOOK = None
+
+# 解析进程池配置：processes 为 0 时在抓取线程内解析（旧行为），None 表示 CPU 核数 - 1
+PARSE_CONFIG = {
+    'processes': None,
+    'batch_pages': 8,        # 每批交给子进程的页数上限
+    'flush_interval': 0.05,  # 未攒满一批时最多等待的秒数
+}
+
+# --- 运行指标 ---
+HTTP_LATENCY = metrics.REGISTRY.histogram(
+    'weibo_http_request_seconds', '微博接口请求耗时（秒）', ['endpoint'])
+HTTP_REQUESTS = metrics.REGISTRY.counter(
+    'weibo_http_requests_total', '微博接口请求次数（按状态码）', ['endpoint', 'status'])
+HTTP_BYTES = metrics.REGISTRY.counter(
+    'weibo_http_response_bytes_total', '微博接口响应字节数', ['endpoint'])
+THROTTLE_WAIT = metrics.REGISTRY.histogram(
+    'weibo_throttle_wait_seconds', '全局节流等待时间（秒）')
+COMMENTS_PER_PAGE = metrics.REGISTRY.histogram(
+    'weibo_comments_per_page', '每页解析出的有效评论数', buckets=(0, 1, 2, 5, 10, 15, 20, 30, 50))
+COMMENTS_PARSED = metrics.REGISTRY.counter(
+    'weibo_comments_parsed_total', '解析出的有效评论总数')
+COMMENTS_FILTERED = metrics.REGISTRY.counter(
+    'weibo_comments_filtered_total', '解析时被过滤的评论数', ['reason'])
+
 def configure_rate_limit(rpm=None, min_delay=None, max_delay=None):
     global RATE_CONFIG
     if rpm is not None:
@@ -45,9 +90,30 @@ def _global_throttle():
         now = time.monotonic()
         wait = max(0.0, _NEXT_TS - now)
         _NEXT_TS = max(now, _NEXT_TS) + interval
+    THROTTLE_WAIT.observe(wait)
     if wait > 0:
         time.sleep(wait)
 
+def report_progress(force=False, **fields):
+    """更新爬取进度；两次写文件至少间隔 PROGRESS_MIN_INTERVAL 秒，状态变化时 force=True 立即写入。"""
+    global _PROGRESS_WRITTEN_AT
+    with _PROGRESS_LOCK:
+        _PROGRESS.update(fields)
+        now = time.time()
+        if not force and now - _PROGRESS_WRITTEN_AT < PROGRESS_MIN_INTERVAL:
+            return
+        _PROGRESS['updated_at'] = now
+        _PROGRESS_WRITTEN_AT = now
+        tmp_path = f"{PROGRESS_FILE}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(_PROGRESS, f, ensure_ascii=False)
+            os.replace(tmp_path, PROGRESS_FILE)
+        except OSError as e:
+            print(f"[进度] 写入进度文件失败: {e}")
+        if PROGRESS_HOOK is not None:
+            PROGRESS_HOOK(dict(_PROGRESS))
+
 def SHOULD_STOP():
     """可由外部注入的停止检查函数，默认不停止。"""
     return False
@@ -63,12 +129,14 @@ def WAIT_IF_PAUSED():
     if SHOULD_PAUSE():
         if not _PAUSE_REPORTED:
             print("[任务] 已暂停，等待恢复...")
+            report_progress(force=True, state='paused')
             _PAUSE_REPORTED = True
         while SHOULD_PAUSE():
             if SHOULD_STOP():
                 return
             time.sleep(0.3)
         print("[任务] 已恢复，继续抓取。")
+        report_progress(force=True, state='running')
         _PAUSE_REPORTED = False
 
 def init_csv(filename, headers):
@@ -96,28 +164,81 @@ def get_weibo_headers():
     return headers
 
 
-def get_data(url, params, headers):
-    try:
-        # 全局节流，跨线程串行化请求速率
+def _fetch(url, params, headers):
+    """带全局节流与指标统计的 GET 请求，失败返回 None。"""
+    endpoint = url.rsplit('/', 1)[-1]
+    # 全局节流，跨线程串行化请求速率（等待时间单独统计，不计入请求耗时）
+    with profiling.span('throttle'):
         _global_throttle()
-        response = requests.get(url, headers=headers, params=params, timeout=20)
+    start = time.perf_counter()
+    try:
+        with profiling.span(f"http.{endpoint}"):
+            response = requests.get(url, headers=headers, params=params, timeout=20)
+        HTTP_BYTES.inc(len(response.content), endpoint=endpoint)
+        HTTP_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
         response.raise_for_status()
-        return response.json()
+        return response
     except requests.exceptions.RequestException as e:
+        if getattr(e, 'response', None) is None:
+            HTTP_REQUESTS.inc(endpoint=endpoint, status='error')
         print(f"网络请求错误: {e}")
         return None
+    finally:
+        HTTP_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+
+
+@profiling.timed('get_data')
+def get_data(url, params, headers):
+    response = _fetch(url, params, headers)
+    if response is None:
+        return None
+    try:
+        return response.json()
+    except ValueError as e:
+        print(f"响应解析错误: {e}")
+        return None
+
+
+def get_raw(url, params, headers):
+    """只取原始响应体，JSON 解码交给解析进程。"""
+    response = _fetch(url, params, headers)
+    return response.content if response is not None else None
+
+
+_MONTHS = {'Jan': '01', 'Feb': '02', 'Mar': '03', 'Apr': '04', 'May': '05', 'Jun': '06',
+           'Jul': '07', 'Aug': '08', 'Sep': '09', 'Oct': '10', 'Nov': '11', 'Dec': '12'}
+
+
+def _is_digits(value):
+    return value.isascii() and value.isdigit()
 
 
+def _is_clock(value):
+    # 'HH:MM:SS'
+    return len(value) == 8 and value[2] == value[5] == ':' and _is_digits(value[:2] + value[3:5] + value[6:])
+
+
+@lru_cache(maxsize=65536)
 def parse_weibo_time(time_str):
+    # 快速路径：'Fri Aug 01 19:03:48 +0800 2025' 按固定位置切分，避免逐条 strptime
+    parts = time_str.split() if isinstance(time_str, str) else ()
+    if len(parts) == 6 and parts[1] in _MONTHS and _is_digits(parts[2]) and _is_digits(parts[5]) \
+            and _is_clock(parts[3]) and len(parts[4]) == 5 and parts[4][0] in '+-' and _is_digits(parts[4][1:]):
+        return f"{parts[5]}-{_MONTHS[parts[1]]}-{int(parts[2]):02d} {parts[3]}"
     try:
-        return datetime.strptime(time_str, '%a %b %d %H:%M:%S %z %Y').strftime('%Y-%m-%d %H:%M:%S')
+        with profiling.span('strptime'):
+            return datetime.strptime(time_str, '%a %b %d %H:%M:%S %z %Y').strftime('%Y-%m-%d %H:%M:%S')
     except (ValueError, TypeError):
         return time_str
 
 
 def clean_html(raw_html):
     if not raw_html: return ""
-    return BeautifulSoup(raw_html, 'lxml').get_text(separator=' ', strip=True)
+    # 大部分评论是纯文本，无需构建 DOM
+    if '<' not in raw_html and '&' not in raw_html:
+        return raw_html.strip()
+    with profiling.span('clean_html'):
+        return BeautifulSoup(raw_html, 'lxml').get_text(separator=' ', strip=True)
 
 
 def get_article_ids_from_csv(filename):
@@ -138,30 +259,41 @@ def get_article_ids_from_csv(filename):
     return article_ids
 
 
-def parse_comments(response_data, article_id):
-    """解析评论，同时过滤楼中楼回复和空评论。"""
+_GENDER_MAP = {'m': '男', 'f': '女', 'n': '未知'}
+
+
+def _parse_comments_core(response_data, article_id, strings=None):
+    """
+    解析评论并返回 (评论行, next_max_id, {过滤原因: 数量})；不触碰指标，可在子进程中运行。
+    评论行为 records.CommentRow，重复的文章ID、地区、用户信息等字符串已去重；
+    strings 为多页共用的 records.StringPool，不传时每页新建一个。
+    """
+    filtered = {'reply': 0, 'empty': 0}
     if not response_data or not isinstance(response_data, dict):
-        return [], 0
+        return [], 0, filtered
 
     raw_comments = response_data.get('data', [])
     if not raw_comments:
-        return [], 0
+        return [], 0, filtered
 
+    if strings is None:
+        strings = records.StringPool()
     cleaned_comments = []
     for comment in raw_comments:
         if comment.get('reply_comment'):
+            filtered['reply'] += 1
             continue
 
         # 过滤空评论
         content_cleaned = clean_html(comment.get('text', ''))
         if not content_cleaned:  # 如果清理后的文本是空字符串，则跳过
+            filtered['empty'] += 1
             continue
 
         user = comment.get('user', {})
-        gender_map = {'m': '男', 'f': '女', 'n': '未知'}
-        gender = gender_map.get(user.get('gender'), '未知')
+        gender = _GENDER_MAP.get(user.get('gender'), '未知')
 
-        cleaned_comments.append([
+        cleaned_comments.append(records.comment_row((
             article_id,
             comment.get('idstr', ''),
             parse_weibo_time(comment.get('created_at', '')),
@@ -172,16 +304,77 @@ def parse_comments(response_data, article_id):
             gender,
             user.get('location', ''),
             user.get('profile_image_url', '')
-        ])
+        ), strings))
 
     next_max_id = response_data.get('max_id', 0)
-    return cleaned_comments, next_max_id
+    return cleaned_comments, next_max_id, filtered
+
+
+def _record_parse_metrics(comments, filtered):
+    for reason, count in filtered.items():
+        if count:
+            COMMENTS_FILTERED.inc(count, reason=reason)
+    COMMENTS_PER_PAGE.observe(len(comments))
+    COMMENTS_PARSED.inc(len(comments))
+
+
+@profiling.timed('parse_comments', profile=True)
+def parse_comments(response_data, article_id):
+    """解析评论，同时过滤楼中楼回复和空评论。"""
+    comments, next_max_id, filtered = _parse_comments_core(response_data, article_id)
+    _record_parse_metrics(comments, filtered)
+    return comments, next_max_id
+
+
+def parse_raw_pages(pages):
+    """
+    解析进程的批处理入口：pages 为 [(原始响应体, 文章ID), ...]，
+    返回等长的 [(评论行, next_max_id, 过滤统计), ...]；解码失败的页返回 None。
+    """
+    results = []
+    strings = records.StringPool()
+    for raw, article_id in pages:
+        with profiling.span('parse_comments'):
+            try:
+                with profiling.span('json_decode'):
+                    response_data = json.loads(raw)
+            except (ValueError, TypeError):
+                results.append(None)
+                continue
+            results.append(_parse_comments_core(response_data, article_id, strings))
+    return results
+
+
+def create_parse_pool(processes=None):
+    """按 PARSE_CONFIG 创建解析进程池；processes 为 0 时返回 None（在抓取线程内解析）。"""
+    processes = PARSE_CONFIG['processes'] if processes is None else processes
+    if processes == 0:
+        return None
+    return parse_pool.ParsePool(parse_raw_pages, processes=processes,
+                                batch_size=PARSE_CONFIG['batch_pages'],
+                                flush_interval=PARSE_CONFIG['flush_interval'])
+
+
+def _comment_id_value(comment_id):
+    try:
+        return int(comment_id)
+    except (TypeError, ValueError):
+        return 0
 
 
-def scrape_comments_for_article(article_id, max_comments_per_article=120, sleep_range=(3, 5)):
+@profiling.timed('crawl.article')
+def scrape_comments_for_article(article_id, max_comments_per_article=120, sleep_range=(3, 5), on_page=None,
+                                since_id=None, pool=None, resume=None):
     """
     这个函数负责完成单个文章的所有评论爬取任务。
     它将被每个线程独立调用。
+    on_page: 可选回调，每成功获取一页评论即以该页评论列表调用一次（用于流水线流式导入）。
+    since_id: 增量模式的水位线（该文章已见过的最新 commentId），只保留更新的评论，
+              并在翻页追上水位线后立即停止。
+    pool: 可选的 ParsePool（见 create_parse_pool）；提供时本线程只负责网络请求，解码与清洗交给解析进程。
+    resume: 上一轮未完成时留下的续爬位置 (max_id, below_id)：从该 max_id 翻页，跳过 commentId >= below_id 的评论。
+    返回 (评论列表, 续爬位置)。翻页追上水位线或到达评论末尾时续爬位置为 None；
+    因预算用尽、请求失败或终止信号提前结束时返回本轮停下的位置，水位线不应据此推进。
     """
     comments_url = 'https://weibo.com/ajax/statuses/buildComments'
     # 为降低风险，让每个线程都获取一次独立的headers，虽然内容一样
@@ -189,7 +382,8 @@ def scrape_comments_for_article(article_id, max_comments_per_article=120, sleep_
 
     print(f"[文章 {article_id}] 线程任务开始...")
 
-    max_id = 0
+    max_id, below_id = resume or (0, None)
+    complete = False
     page_count = 1
     total_comments_for_article = 0
     all_comments_for_this_article = []
@@ -206,28 +400,73 @@ def scrape_comments_for_article(article_id, max_comments_per_article=120, sleep_
             'flow': 1
         }
 
-        response_data = get_data(comments_url, params, headers)
-        if response_data is None:
-            print(f"[文章 {article_id}] 获取第 {page_count} 页评论数据失败。")
-            break
-
-        comments_to_write, next_max_id = parse_comments(response_data, article_id)
+        if pool is None:
+            response_data = get_data(comments_url, params, headers)
+            if response_data is None:
+                print(f"[文章 {article_id}] 获取第 {page_count} 页评论数据失败。")
+                break
+            comments_to_write, next_max_id = parse_comments(response_data, article_id)
+        else:
+            raw = get_raw(comments_url, params, headers)
+            if raw is None:
+                parsed = None
+            else:
+                # 等待时间含进程间传输；解析进程内的 parse_comments / clean_html / strptime 区段随结果合并
+                with profiling.span('parse_pool.wait'):
+                    parsed = pool.submit((raw, article_id)).result()
+            if parsed is None:
+                print(f"[文章 {article_id}] 获取第 {page_count} 页评论数据失败。")
+                break
+            comments_to_write, next_max_id, filtered = parsed
+            # 经 pickle 传回的字符串是新对象，重新去重
+            comments_to_write = records.intern_comments(comments_to_write)
+            _record_parse_metrics(comments_to_write, filtered)
         if not comments_to_write:
             print(f"[文章 {article_id}] 在第 {page_count} 页已无更多评论。")
+            complete = True
             break
 
+        reached_watermark = False
+        if since_id is not None:
+            # flow=1 按时间倒序返回：本页最旧一条已见过，说明后续分页全是旧评论（置顶评论不影响该判断）
+            reached_watermark = _comment_id_value(comments_to_write[-1][1]) <= since_id
+            comments_to_write = [c for c in comments_to_write if _comment_id_value(c[1]) > since_id]
+            if not comments_to_write:
+                print(f"[文章 {article_id}] 第 {page_count} 页已追上水位线，没有新评论。")
+                complete = True
+                break
+        if below_id is not None:
+            # 续爬：本页较新的部分上一轮已取走
+            comments_to_write = [c for c in comments_to_write if _comment_id_value(c[1]) < below_id]
+
         remaining_needed = max_comments_per_article - total_comments_for_article
-        if len(comments_to_write) > remaining_needed:
+        truncated = len(comments_to_write) > remaining_needed
+        if truncated:
             comments_to_write = comments_to_write[:remaining_needed]
 
-        all_comments_for_this_article.extend(comments_to_write)
-        total_comments_for_article += len(comments_to_write)
+        if comments_to_write:
+            below_id = _comment_id_value(comments_to_write[-1][1])
+            all_comments_for_this_article.extend(comments_to_write)
+            total_comments_for_article += len(comments_to_write)
+            if on_page is not None:
+                on_page(comments_to_write)
 
         print(
             f"[文章 {article_id}] 第 {page_count} 页成功获取 {len(comments_to_write)} 条评论 (累计: {total_comments_for_article}/{max_comments_per_article})")
 
+        if truncated:
+            # 本页剩余评论留到下一轮：续爬位置仍指向本页
+            print(f"[文章 {article_id}] 预算用尽，下一轮从第 {page_count} 页续爬。")
+            break
+
+        if reached_watermark:
+            print(f"[文章 {article_id}] 已追上水位线，增量爬取结束。")
+            complete = True
+            break
+
         if next_max_id == 0:
             print(f"[文章 {article_id}] API表示已无更多评论。")
+            complete = True
             break
         max_id = next_max_id
         page_count += 1
@@ -250,35 +489,65 @@ def scrape_comments_for_article(article_id, max_comments_per_article=120, sleep_
     else:
         print(f"[文章 {article_id}] 线程任务完成，共找到 {total_comments_for_article} 条评论准备写入。")
 
-    return all_comments_for_this_article
+    return all_comments_for_this_article, None if complete else (max_id, below_id)
 
 
-def start_scraping_with_threads(max_workers=3, max_comments_per_article=100):
-    """使用线程池并发爬取评论的主函数。"""
+def start_scraping_with_threads(max_workers=3, max_comments_per_article=100, prioritize=True, total_budget=None,
+                                incremental=True, parse_processes=None):
+    """
+    使用线程池并发爬取评论的主函数。
+    prioritize=True 时按热度与过期程度排序提交任务、跳过零评论文章，
+    并以 max_comments_per_article 为基础预算按比例分配每篇文章的评论数；
+    total_budget 为本轮评论总预算（默认 基础预算 × 文章数）。
+    incremental=True 时按每篇文章的水位线只抓取新评论，追上已知评论即停止翻页。
+    parse_processes: 解析进程数，默认取 PARSE_CONFIG；为 0 时在抓取线程内解析。
+    """
     init_csv(COMMENTS_CSV_OUTPUT, COMMENTS_CSV_HEADERS)
-    article_ids = get_article_ids_from_csv(ARTICLES_CSV_INPUT)
+    state_store = crawl_scheduler.CrawlStateStore() if (prioritize or incremental) else None
+    if prioritize:
+        articles = crawl_scheduler.load_article_stats(ARTICLES_CSV_INPUT)
+        tasks = crawl_scheduler.plan_crawl(articles, state_store, base_budget=max_comments_per_article,
+                                           total_budget=total_budget)
+        skipped = len(articles) - len(tasks)
+        print(f"[调度] {len(articles)} 篇文章中 {len(tasks)} 篇进入本轮爬取，跳过 {skipped} 篇（零评论或刚爬过）。")
+    else:
+        tasks = [crawl_scheduler.CrawlTask(article_id, 0, max_comments_per_article)
+                 for article_id in get_article_ids_from_csv(ARTICLES_CSV_INPUT)]
 
-    if not article_ids:
+    if not tasks:
         print("没有需要处理的文章ID，程序退出。")
+        report_progress(force=True, state='finished', total_articles=0, done_articles=0, comments_written=0)
         return
+    report_progress(force=True, state='running', started_at=time.time(), total_articles=len(tasks),
+                    done_articles=0, failed_articles=0, comments_written=0)
 
     # 使用全局配置的延时范围
     sleep_range = (RATE_CONFIG['min_delay'], RATE_CONFIG['max_delay'])
+    # 抓取线程只做网络I/O，解码、HTML清洗与时间解析交给多进程解析池
+    pool = create_parse_pool(parse_processes)
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         print(f"线程池已启动，最大并发数: {max_workers}, 延时范围: {sleep_range}秒")
+        if pool is not None:
+            print(f"解析进程池已启动，进程数: {pool.processes}")
 
         future_to_article = {}
-        for article_id in article_ids:
+        # 线程池按提交顺序取任务，因此高优先级文章先被爬取
+        for task in tasks:
             WAIT_IF_PAUSED()
             if SHOULD_STOP():
                 print("[任务] 检测到终止信号，停止提交新的文章评论任务。")
                 break
-            # 为每个任务传递延时参数
-            future = executor.submit(scrape_comments_for_article, article_id, max_comments_per_article, sleep_range)
-            future_to_article[future] = article_id
+            # 为每个任务传递预算、延时参数与水位线
+            since_id = state_store.watermark(task.article_id) if incremental else None
+            resume = state_store.resume_point(task.article_id) if incremental else None
+            future = executor.submit(scrape_comments_for_article, task.article_id, task.budget, sleep_range,
+                                     since_id=since_id, pool=pool, resume=resume)
+            future_to_article[future] = task.article_id
 
         total_comments_written = 0
+        done_articles = failed_articles = 0
+        stopped = False
         # as_completed 可以在任何一个任务完成时立即处理它的结果
         for future in as_completed(future_to_article):
             WAIT_IF_PAUSED()
@@ -286,12 +555,16 @@ def start_scraping_with_threads(max_workers=3, max_comments_per_article=100):
             try:
                 if SHOULD_STOP():
                     print("[任务] 终止信号到达，停止等待剩余任务并取消后续。")
+                    stopped = True
                     try:
                         executor.shutdown(wait=False, cancel_futures=True)
                     except Exception:
                         pass
                     break
-                result_comments = future.result()
+                result_comments, resume = future.result()
+                if state_store is not None:
+                    state_store.record_crawl(article_id, len(result_comments))
+                    state_store.advance_watermark(article_id, result_comments, resume=resume)
                 if result_comments:
                     # 【核心风控】将写入操作加锁，防止多线程同时写文件导致冲突
                     # 虽然 'a' 模式下风险较小，但加锁是更规范的做法
@@ -302,12 +575,24 @@ def start_scraping_with_threads(max_workers=3, max_comments_per_article=100):
                     written_count = len(result_comments)
                     total_comments_written += written_count
                     print(f"文章 {article_id} 的 {written_count} 条评论已成功写入文件。")
+                done_articles += 1
             except Exception as exc:
+                failed_articles += 1
                 print(f"文章 {article_id} 在处理时产生了一个错误: {exc}")
-
+            report_progress(done_articles=done_articles, failed_articles=failed_articles,
+                            comments_written=total_comments_written, last_article=article_id)
+
+    if pool is not None:
+        pool.close()
+    if state_store is not None:
+        state_store.save()
+    report_progress(force=True, state='stopped' if stopped or SHOULD_STOP() else 'finished',
+                    comments_written=total_comments_written, finished_at=time.time())
     print(f"\n所有任务已完成！总共写入 {total_comments_written} 条评论。")
 
 
 if __name__ == '__main__':
+    profiling.start_run('comments', sys.argv)
     # 在这里设置每篇文章最多爬取多少条评论,多少线程
     start_scraping_with_threads(max_workers=6, max_comments_per_article=120)
+    profiling.finish_run()
@@ -1,14 +1,6 @@
-from werkzeug.security import generate_password_hash
-from utils.query import query
-users = query(
-    "SELECT username, password FROM user",
-    [],
-    'select'
-)
-for username, password in users:
-    if not password.startswith("pbkdf2:"):
-        hashed = generate_password_hash(password, method='pbkdf2:sha256')
-        query(
-            "UPDATE user SET password = %s WHERE username = %s",
-            [hashed, username]
-        )
\ No newline at end of file
+from utils.password_hashing import migrate_plaintext_passwords
+
+if __name__ == '__main__':
+    # 明文密码在进程池中并行哈希，算法与参数见 utils/password_hashing.py
+    count = migrate_plaintext_passwords()
+    print(f"已迁移 {count} 个明文密码。")
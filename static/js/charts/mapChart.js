@@ -9,24 +9,56 @@ const provinceNameMap = {
     '新疆': '新疆', '中国台湾': '台湾', '中国香港': '香港', '中国澳门': '澳门', '南海诸岛': '南海诸岛'
 };
 
+// 入库时预先聚合好的省级数据（spiders/region.py 导出），不存在时退回实时接口
+const PROVINCE_DATA_URLS = ['/static/data/province_activity.json', '/page/api/china_province_activity'];
+
 async function fetchProvinceData() {
-    try {
-        const response = await fetch('/page/api/china_province_activity');
-        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-        const data = await response.json();
-        return Object.keys(data).map(provinceName => ({
-            name: provinceNameMap[provinceName] || provinceName,
-            value: data[provinceName].heatIndex || 0
-        }));
-    } catch (error) {
-        console.error('获取省份数据失败:', error);
-        return [];
+    for (const url of PROVINCE_DATA_URLS) {
+        try {
+            const response = await fetch(url);
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            const data = await response.json();
+            return Object.keys(data).map(provinceName => ({
+                name: provinceNameMap[provinceName] || provinceName,
+                value: data[provinceName].heatIndex || 0,
+                sentiment: data[provinceName].sentiment
+            }));
+        } catch (error) {
+            console.error(`获取省份数据失败 (${url}):`, error);
+        }
     }
+    return [];
+}
+
+function formatSentiment(sentiment) {
+    if (!sentiment) return '';
+    const total = (sentiment.positive || 0) + (sentiment.neutral || 0) + (sentiment.negative || 0);
+    if (!total) return '';
+    const pct = n => `${((n || 0) * 100 / total).toFixed(1)}%`;
+    return `<br/>正面 ${pct(sentiment.positive)} / 中性 ${pct(sentiment.neutral)} / 负面 ${pct(sentiment.negative)}`;
+}
+
+// 简化后的地图边界（utils/geo_assets.py 生成）：先用低精度版本首屏渲染，再换成中等精度
+async function loadChinaGeo(level) {
+    const manifest = await (await fetch('/geo/manifest.json')).json();
+    if (!manifest[level]) throw new Error(`缺少 ${level} 级别的地图数据`);
+    const response = await fetch(`/geo/${manifest[level].file}`);
+    if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+    echarts.registerMap('china', await response.json());
 }
 
 export async function renderMap() {
     const chartDom = document.getElementById('chart-map-column-04');
     if (!chartDom) return;
+    const hadMap = !!echarts.getMap('china');
+    if (!hadMap) {
+        try {
+            await loadChinaGeo('low');
+        } catch (error) {
+            console.error('加载地图边界失败:', error);
+            return;
+        }
+    }
     const mapChart = echarts.init(chartDom);
     const provinceData = await fetchProvinceData();
     provinceData.sort((a, b) => b.value - a.value);
@@ -39,7 +71,7 @@ export async function renderMap() {
         roam: true,
         tooltip: {
             trigger: 'item',
-            formatter: params => (params.data && params.data.value !== undefined) ? `<strong>${params.data.name}</strong><br/>活跃度: ${params.data.value}` : `${params.name}<br/>暂无数据`,
+            formatter: params => (params.data && params.data.value !== undefined) ? `<strong>${params.data.name}</strong><br/>活跃度: ${params.data.value}${formatSentiment(params.data.sentiment)}` : `${params.name}<br/>暂无数据`,
             backgroundColor: 'rgba(255, 255, 255, 0.95)', borderColor: '#eaeaea',
             borderWidth: 1, textStyle: { color: '#333', fontSize: 14 }
         },
@@ -65,4 +97,10 @@ export async function renderMap() {
     };
     mapChart.setOption(option);
     window.addEventListener('resize', () => mapChart.resize());
+
+    if (!hadMap) {
+        loadChinaGeo('medium')
+            .then(() => mapChart.setOption(option, true))
+            .catch(error => console.warn('加载中等精度地图失败，继续使用低精度版本:', error));
+    }
 }
\ No newline at end of file
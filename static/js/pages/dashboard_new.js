@@ -13,6 +13,41 @@ async function fetchJSON(url) {
   return res.json();
 }
 
+// 接口与实时推送均可能返回 {counts: {...}, total}，也兼容直接的 {positive, neutral, negative}
+function sentimentSeriesData(data) {
+  const sentiment = (data && data.counts) || data || {};
+  return [
+    { name: '正面', value: sentiment.positive || 0 },
+    { name: '中性', value: sentiment.neutral || 0 },
+    { name: '负面', value: sentiment.negative || 0 },
+  ];
+}
+
+const CRAWL_STATES = { running: '爬取中', paused: '已暂停', stopped: '已终止', finished: '已完成' };
+
+// 订阅 /stream/dashboard（SSE），只接收变化的数据；所有标签页共享服务端的同一个数据生产者
+function subscribeDashboard(handlers) {
+  if (!window.EventSource) return null;
+  const source = new EventSource('/stream/dashboard');
+  const crawl = {};
+  const apply = (event, data) => {
+    if (event === 'crawl') {
+      Object.assign(crawl, data);
+      handlers.crawl && handlers.crawl(crawl);
+    } else if (handlers[event]) {
+      handlers[event](data);
+    }
+  };
+  source.addEventListener('snapshot', e => {
+    const state = JSON.parse(e.data);
+    Object.keys(state).forEach(event => apply(event, state[event]));
+  });
+  ['counts', 'sentiment', 'crawl'].forEach(event => {
+    source.addEventListener(event, e => apply(event, JSON.parse(e.data)));
+  });
+  return source;
+}
+
 const app = createApp({
   delimiters: ['[[', ']]'],
   setup() {
@@ -23,15 +58,11 @@ const app = createApp({
       // Sentiment
       try {
         const sentiment = await fetchJSON('/page/api/sentiment_distribution');
-        const chart = initEChart('chart-sentiment');
+        const chart = echarts.getInstanceByDom(document.getElementById('chart-sentiment')) || initEChart('chart-sentiment');
         if (chart) {
           chart.setOption({
             tooltip: {},
-            series: [{ type: 'pie', radius: ['35%', '65%'], data: [
-              { name: '正面', value: sentiment.positive || 0 },
-              { name: '中性', value: sentiment.neutral || 0 },
-              { name: '负面', value: sentiment.negative || 0 },
-            ] }]
+            series: [{ type: 'pie', radius: ['35%', '65%'], data: sentimentSeriesData(sentiment) }]
           });
         }
       } catch {}
@@ -115,8 +146,38 @@ const app = createApp({
       } catch {}
     }
 
+    function startLiveUpdates() {
+      const setText = (id, value) => {
+        const el = document.getElementById(id);
+        if (el && value !== undefined) el.innerText = value;
+      };
+      subscribeDashboard({
+        counts(data) {
+          setText('kpi-article', data.articles);
+          setText('kpi-comment', data.comments);
+        },
+        sentiment(data) {
+          const el = document.getElementById('chart-sentiment');
+          const chart = el && echarts.getInstanceByDom(el);
+          if (chart) chart.setOption({ series: [{ data: sentimentSeriesData(data) }] });
+        },
+        crawl(progress) {
+          const box = document.getElementById('crawl-progress');
+          if (!box) return;
+          box.style.display = '';
+          const total = progress.total_articles || 0;
+          const done = (progress.done_articles || 0) + (progress.failed_articles || 0);
+          setText('crawl-state', CRAWL_STATES[progress.state] || progress.state || '');
+          setText('crawl-count', `${done} / ${total} 篇文章，已写入 ${progress.comments_written || 0} 条评论`);
+          const bar = document.getElementById('crawl-bar');
+          if (bar) bar.style.width = total ? `${Math.round(done * 100 / total)}%` : '0%';
+        },
+      });
+    }
+
     onMounted(() => {
       renderCharts();
+      startLiveUpdates();
       updateUnreadCount();
       loadPopup();
       const btn = document.getElementById('update-data-btn');
@@ -0,0 +1,256 @@
+# geo_assets.py
+"""
+地图 GeoJSON 资源构建：static/data/china_geo.json → 多级简化 + 预压缩 + 内容哈希文件名。
+
+1. 坐标先量化到网格，使相邻省份的公共边界点完全一致；
+2. 把每个环在"拓扑节点"（相邻关系发生变化的点）处切成弧段，公共边界只保留一份弧段，
+   简化（Douglas-Peucker）后两侧省份共用同一结果，因此简化后不会出现缝隙或重叠；
+3. 每个级别输出一份 GeoJSON（坐标按级别保留小数位），文件名带内容哈希，
+   并预先生成 .gz（以及安装了 brotli 时的 .br），供 views/geo 按 Accept-Encoding 直接返回；
+4. manifest.json 记录各级别当前的文件名，前端先取 manifest 再取对应文件。
+"""
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SOURCE_FILE = '../static/data/china_geo.json'
+OUTPUT_DIR = '../static/data/geo'
+MANIFEST_NAME = 'manifest.json'
+QUANTIZE = 1e-4  # 量化网格（度）
+
+# 级别 → (简化容差（度）, 输出小数位)
+LEVELS = {
+    'low': (0.1, 2),       # 首屏 / 全国视图
+    'medium': (0.04, 3),   # 放大到省级
+    'high': (0.01, 4),     # 细节
+}
+
+
+def _quantize(point):
+    return (round(point[0] / QUANTIZE), round(point[1] / QUANTIZE))
+
+
+def _feature_polygons(feature):
+    geometry = feature['geometry']
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    return []
+
+
+def _open_ring(ring):
+    points = [_quantize(p) for p in ring]
+    # 去掉连续重复点与闭合点
+    cleaned = [p for i, p in enumerate(points) if i == 0 or p != points[i - 1]]
+    if len(cleaned) > 1 and cleaned[0] == cleaned[-1]:
+        cleaned.pop()
+    return cleaned
+
+
+def _find_junctions(rings):
+    """同一点在不同环中的前后邻点不一致时即为拓扑节点（公共边界的端点）。"""
+    neighbours = {}
+    for ring in rings:
+        n = len(ring)
+        for i, p in enumerate(ring):
+            pair = frozenset((ring[i - 1], ring[(i + 1) % n]))
+            neighbours.setdefault(p, set()).add(pair)
+    return {p for p, pairs in neighbours.items() if len(pairs) > 1}
+
+
+def _split_ring(ring, junctions):
+    """在拓扑节点处把环切成弧段；没有节点的环整体作为一个闭合弧段。"""
+    cuts = [i for i, p in enumerate(ring) if p in junctions]
+    if not cuts:
+        return [ring + [ring[0]]]
+    start = cuts[0]
+    rotated = ring[start:] + ring[:start]
+    cuts = [i - start for i in cuts]
+    arcs = []
+    for a, b in zip(cuts, cuts[1:] + [len(rotated)]):
+        arcs.append(rotated[a:b + 1] if b < len(rotated) else rotated[a:] + [rotated[0]])
+    return arcs
+
+
+def _perpendicular_distance(p, a, b):
+    (x, y), (x1, y1), (x2, y2) = p, a, b
+    dx, dy = x2 - x1, y2 - y1
+    if dx == 0 and dy == 0:
+        return ((x - x1) ** 2 + (y - y1) ** 2) ** 0.5
+    return abs(dy * x - dx * y + x2 * y1 - y2 * x1) / (dx * dx + dy * dy) ** 0.5
+
+
+def _douglas_peucker(points, tolerance):
+    if len(points) <= 2:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        best, index = 0.0, None
+        for i in range(first + 1, last):
+            d = _perpendicular_distance(points[i], points[first], points[last])
+            if d > best:
+                best, index = d, i
+        if index is not None and best > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def _simplify_arc(arc, tolerance):
+    if arc[0] == arc[-1] and len(arc) > 3:
+        # 闭合弧段：从中点切开分别简化，避免首尾重合导致退化
+        mid = len(arc) // 2
+        return _douglas_peucker(arc[:mid + 1], tolerance)[:-1] + _douglas_peucker(arc[mid:], tolerance)
+    return _douglas_peucker(arc, tolerance)
+
+
+class _ArcCache:
+    """弧段去重：正向与反向的同一弧段只简化一次。"""
+
+    def __init__(self, tolerance):
+        self.tolerance = tolerance
+        self._cache = {}
+
+    def simplify(self, arc):
+        key = tuple(arc)
+        reverse = tuple(reversed(arc))
+        if key in self._cache:
+            return self._cache[key]
+        if reverse in self._cache:
+            return list(reversed(self._cache[reverse]))
+        simplified = _simplify_arc(arc, self.tolerance)
+        self._cache[key] = simplified
+        return simplified
+
+
+def _ring_area(ring):
+    return abs(sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]))) / 2
+
+
+def simplify_geojson(geojson, tolerance, decimals):
+    """拓扑保持的简化；面积塌缩的小岛与洞被移除，但每个要素至少保留面积最大的多边形。"""
+    tol = tolerance / QUANTIZE
+    polygons = [[_open_ring(r) for r in polygon] for f in geojson['features'] for polygon in _feature_polygons(f)]
+    junctions = _find_junctions([r for polygon in polygons for r in polygon if len(r) >= 3])
+    arcs = _ArcCache(tol)
+
+    def _simplify_ring(ring):
+        if len(ring) < 3:
+            return None
+        points = []
+        for arc in _split_ring(ring, junctions):
+            simplified = arcs.simplify(arc)
+            points.extend(simplified if not points else simplified[1:])
+        if points and points[0] == points[-1]:
+            points.pop()
+        return points if len(points) >= 3 and _ring_area(points) > 0 else None
+
+    def _dequantize(ring):
+        coords = [[round(x * QUANTIZE, decimals), round(y * QUANTIZE, decimals)] for x, y in ring]
+        return coords + [coords[0]]
+
+    features = []
+    for feature in geojson['features']:
+        kept = []
+        largest = None
+        for polygon in _feature_polygons(feature):
+            rings = [_open_ring(r) for r in polygon]
+            if rings and len(rings[0]) >= 3 and (largest is None or _ring_area(rings[0]) > _ring_area(largest)):
+                largest = rings[0]
+            outer = _simplify_ring(rings[0]) if rings else None
+            if outer is None:
+                continue
+            holes = [h for h in (_simplify_ring(r) for r in rings[1:]) if h is not None]
+            kept.append([_dequantize(outer)] + [_dequantize(h) for h in holes])
+        if not kept and largest is not None:
+            kept.append([_dequantize(largest)])
+        geometry = ({'type': 'Polygon', 'coordinates': kept[0]} if len(kept) == 1
+                    else {'type': 'MultiPolygon', 'coordinates': kept})
+        features.append({'type': 'Feature', 'properties': feature.get('properties', {}), 'geometry': geometry})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+_NAME_SUFFIXES = ('维吾尔自治区', '壮族自治区', '回族自治区', '特别行政区', '自治区', '省', '市')
+
+
+def _short_name(name):
+    """'北京市' → '北京'、'广西壮族自治区' → '广西'，与 ECharts 内置 china 地图及省级数据的命名一致"""
+    for suffix in _NAME_SUFFIXES:
+        if name.endswith(suffix) and len(name) > len(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def _slim_properties(properties):
+    """前端只用到 name / adcode / center，其余属性不输出"""
+    slim = {k: properties[k] for k in ('adcode', 'name', 'center', 'centroid') if k in properties}
+    if 'name' in slim:
+        slim['name'] = _short_name(slim['name'])
+    return slim
+
+
+def _write_compressed(path, payload):
+    sizes = {'bytes': len(payload)}
+    with open(f"{path}.gz", 'wb') as f:
+        f.write(gzip.compress(payload, compresslevel=9, mtime=0))
+    sizes['gzip_bytes'] = os.path.getsize(f"{path}.gz")
+    if brotli is not None:
+        with open(f"{path}.br", 'wb') as f:
+            f.write(brotli.compress(payload, quality=11))
+        sizes['br_bytes'] = os.path.getsize(f"{path}.br")
+    return sizes
+
+
+def build_assets(source=SOURCE_FILE, output_dir=OUTPUT_DIR, levels=None):
+    """生成各级别资源与 manifest，返回 manifest 字典。"""
+    levels = levels or LEVELS
+    with open(source, 'r', encoding='utf-8') as f:
+        geojson = json.load(f)
+    for feature in geojson['features']:
+        feature['properties'] = _slim_properties(feature.get('properties', {}))
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = {}
+    for level, (tolerance, decimals) in levels.items():
+        simplified = simplify_geojson(geojson, tolerance, decimals)
+        payload = json.dumps(simplified, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha1(payload).hexdigest()[:10]
+        filename = f"china_geo.{level}.{digest}.json"
+        path = os.path.join(output_dir, filename)
+        with open(path, 'wb') as f:
+            f.write(payload)
+        manifest[level] = dict(file=filename, **_write_compressed(path, payload))
+
+        # 清理同级别的旧版本文件
+        for name in os.listdir(output_dir):
+            if name.startswith(f"china_geo.{level}.") and not name.startswith(filename):
+                os.remove(os.path.join(output_dir, name))
+
+    tmp_path = os.path.join(output_dir, f"{MANIFEST_NAME}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_NAME))
+    return manifest
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+    source = sys.argv[1] if len(sys.argv) > 1 else SOURCE_FILE
+    print(f"原始文件: {source}（{os.path.getsize(source) / 1024:.1f} KB）")
+    for level, info in build_assets(source).items():
+        br = f"，br {info['br_bytes'] / 1024:.1f} KB" if 'br_bytes' in info else ''
+        print(f"{level:<8}{info['file']:<36}{info['bytes'] / 1024:>8.1f} KB，gzip {info['gzip_bytes'] / 1024:.1f} KB{br}")
+    print(f"构建完成，耗时: {time.time() - start_time:.2f} 秒。")
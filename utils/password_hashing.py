@@ -0,0 +1,196 @@
+# password_hashing.py
+"""
+密码哈希：可配置算法与代价参数，并通过基准测试校准到目标耗时。
+
+- hash_password() / verify_password() 封装 werkzeug 的哈希格式（method$salt$hash），与已有数据兼容；
+- needs_rehash() 判断已存哈希的算法或参数是否与当前配置不同，登录成功后可透明地重新哈希；
+- 同时进行的哈希计算数受信号量限制（默认等于 CPU 核数），高并发登录时排队而不是互相争抢 CPU，
+  单次登录的耗时与 CPU 占用保持可预期；
+- calibrate() 在本机上测量，找出耗时最接近目标值的参数，结果写入 password_hashing.json；
+- bulk_rehash() 在进程池中批量把遗留的明文密码迁移为哈希（旧参数的哈希只能在登录时更新）。
+
+命令行（在项目根目录执行）：
+    python -m utils.password_hashing calibrate [目标毫秒] [pbkdf2|scrypt]
+    python -m utils.password_hashing migrate [进程数]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# --- 配置区 ---
+PASSWORD_CONFIG = {
+    'algorithm': 'pbkdf2',      # pbkdf2 | scrypt
+    'pbkdf2_hash': 'sha256',
+    'pbkdf2_iterations': 600000,
+    'scrypt_n': 32768,          # CPU/内存代价，必须为 2 的幂
+    'scrypt_r': 8,
+    'scrypt_p': 1,
+    'target_ms': 250,           # calibrate() 的默认目标耗时
+    'max_concurrent': os.cpu_count() or 1,
+}
+# calibrate() 的输出，存在时覆盖上面的默认参数
+CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'password_hashing.json')
+
+
+def _load_calibration():
+    if os.path.exists(CALIBRATION_FILE):
+        with open(CALIBRATION_FILE, 'r', encoding='utf-8') as f:
+            PASSWORD_CONFIG.update(json.load(f))
+
+
+_load_calibration()
+_hash_slots = threading.BoundedSemaphore(PASSWORD_CONFIG['max_concurrent'])
+
+
+def current_method(config=None):
+    """当前配置对应的 werkzeug 方法字符串，如 'pbkdf2:sha256:600000'、'scrypt:32768:8:1'。"""
+    config = config or PASSWORD_CONFIG
+    if config['algorithm'] == 'scrypt':
+        return f"scrypt:{config['scrypt_n']}:{config['scrypt_r']}:{config['scrypt_p']}"
+    if config['algorithm'] == 'pbkdf2':
+        return f"pbkdf2:{config['pbkdf2_hash']}:{config['pbkdf2_iterations']}"
+    raise ValueError(f"不支持的密码哈希算法: {config['algorithm']}")
+
+
+def _stored_method(pwhash):
+    return pwhash.split('$', 1)[0] if pwhash and pwhash.count('$') >= 2 else None
+
+
+def is_hashed(value):
+    """区分 werkzeug 格式的哈希与遗留的明文密码。"""
+    method = _stored_method(value)
+    return bool(method) and method.split(':', 1)[0] in ('pbkdf2', 'scrypt')
+
+
+def hash_password(password, method=None):
+    with _hash_slots:
+        return generate_password_hash(password, method=method or current_method())
+
+
+def verify_password(pwhash, password):
+    if not is_hashed(pwhash):
+        return False
+    with _hash_slots:
+        return check_password_hash(pwhash, password)
+
+
+def needs_rehash(pwhash):
+    return _stored_method(pwhash) != current_method()
+
+
+def verify_and_update(pwhash, password):
+    """
+    校验密码；校验通过且哈希参数已过时时返回新哈希，调用方负责写回数据库。
+    返回 (是否通过, 新哈希或 None)。
+    """
+    if not verify_password(pwhash, password):
+        return False, None
+    return True, (hash_password(password) if needs_rehash(pwhash) else None)
+
+
+# ---------- 校准 ----------
+
+def _time_method(method, rounds=3):
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        generate_password_hash('calibration-password', method=method)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def calibrate(target_ms=None, algorithm=None):
+    """
+    在本机上测量并返回耗时最接近 target_ms 的参数（dict，可直接 update 到 PASSWORD_CONFIG）。
+    pbkdf2 的耗时与迭代次数成正比，先测一个基准再按比例换算并复测；scrypt 按 2 的幂逐级增大 N。
+    """
+    target_ms = target_ms or PASSWORD_CONFIG['target_ms']
+    algorithm = algorithm or PASSWORD_CONFIG['algorithm']
+    config = dict(PASSWORD_CONFIG, algorithm=algorithm)
+    if algorithm == 'pbkdf2':
+        config['pbkdf2_iterations'] = 100000
+        elapsed = _time_method(current_method(config))
+        iterations = int(config['pbkdf2_iterations'] * target_ms / elapsed)
+        config['pbkdf2_iterations'] = max(100000, round(iterations, -4))
+        result = {'pbkdf2_hash': config['pbkdf2_hash'], 'pbkdf2_iterations': config['pbkdf2_iterations']}
+    elif algorithm == 'scrypt':
+        n, best = 1 << 14, None
+        while n <= 1 << 20:
+            config['scrypt_n'] = n
+            elapsed = _time_method(current_method(config), rounds=1)
+            if best is None or abs(elapsed - target_ms) < abs(best[1] - target_ms):
+                best = (n, elapsed)
+            if elapsed >= target_ms:
+                break
+            n <<= 1
+        config['scrypt_n'] = best[0]
+        result = {'scrypt_n': config['scrypt_n'], 'scrypt_r': config['scrypt_r'], 'scrypt_p': config['scrypt_p']}
+    else:
+        raise ValueError(f"不支持的密码哈希算法: {algorithm}")
+    result['algorithm'] = algorithm
+    result['measured_ms'] = round(_time_method(current_method(config)), 1)
+    return result
+
+
+def save_calibration(result):
+    tmp_path = f"{CALIBRATION_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({k: v for k, v in result.items() if k != 'measured_ms'}, f, indent=2)
+    os.replace(tmp_path, CALIBRATION_FILE)
+    PASSWORD_CONFIG.update(result)
+
+
+# ---------- 批量迁移 ----------
+
+def _rehash_chunk(items, method):
+    # 在子进程中执行；明文直接哈希，旧参数的哈希无法还原明文，只能等用户下次登录时再更新
+    return [(username, generate_password_hash(password, method=method)) for username, password in items]
+
+
+def bulk_rehash(rows, processes=None, chunk_size=64):
+    """
+    rows: [(username, 存储的密码)]。只处理仍为明文的密码，在进程池中并行哈希。
+    返回 [(username, 新哈希)]，由调用方写回数据库。
+    """
+    pending = [(u, p) for u, p in rows if p and not is_hashed(p)]
+    if not pending:
+        return []
+    method = current_method()
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for chunk_result in pool.map(_rehash_chunk, chunks, [method] * len(chunks)):
+            results.extend(chunk_result)
+    return results
+
+
+def migrate_plaintext_passwords(processes=None):
+    """把 user 表中的明文密码迁移为当前配置的哈希，返回更新的用户数。"""
+    from utils.query import query
+
+    users = query("SELECT username, password FROM user", [], 'select')
+    updated = bulk_rehash(users, processes)
+    for username, hashed in updated:
+        query("UPDATE user SET password = %s WHERE username = %s", [hashed, username])
+    return len(updated)
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'calibrate'
+    if command == 'calibrate':
+        target = float(sys.argv[2]) if len(sys.argv) > 2 else None
+        algorithm = sys.argv[3] if len(sys.argv) > 3 else None
+        result = calibrate(target, algorithm)
+        save_calibration(result)
+        print(f"校准完成: {current_method()}，单次耗时 {result['measured_ms']} ms，已写入 {CALIBRATION_FILE}")
+    elif command == 'migrate':
+        started = time.time()
+        count = migrate_plaintext_passwords(int(sys.argv[2]) if len(sys.argv) > 2 else None)
+        print(f"已迁移 {count} 个明文密码，耗时: {time.time() - started:.2f} 秒。")
+    else:
+        print(__doc__)
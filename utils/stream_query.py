@@ -0,0 +1,121 @@
+# stream_query.py
+"""
+流式数据访问：基于 pymysql 服务端游标（SSCursor），逐批从 MySQL 取数，不把整张表读进内存。
+
+- stream_rows()     逐行生成元组，支持任意 SQL；
+- iter_table()      按表名 + 列投影 + 条件生成行，只取需要的列；
+- iter_batches()    按批生成行列表，便于批量处理（如模型推理）；
+- iter_arrays()     按批生成 {列名: numpy 数组}；
+- iter_frames()     按批生成 pandas DataFrame；
+- iter_comments() / iter_articles()  行布局与 getAllCommentData / getAllArticleData 一致的流式替代。
+
+注意：服务端游标在数据读完（或生成器被关闭）之前会占用连接，因此每个生成器都使用独立连接，
+并在结束或提前退出（break / islice）时自动关闭。
+"""
+import itertools
+import os
+import sys
+
+import pymysql
+import pymysql.cursors
+
+DEFAULT_BATCH_SIZE = 5000
+
+COMMENT_COLUMNS = ['articleId', 'commentId', 'created_at', 'like_counts', 'region', 'content',
+                   'authorName', 'authorGender', 'authorAddress', 'authorAvatar']
+ARTICLE_COLUMNS = ['id', 'typename', 'content', 'created_at', 'likeNum', 'commentsLen', 'reposts_count',
+                   'region', 'contentLen', 'detailUrl', 'authorName', 'authorDetail', 'authorAvatar', 'isVip']
+
+
+def _db_config():
+    """与入库程序共用 spiders/main.py 中的数据库配置。"""
+    try:
+        from spiders.main import DB_CONFIG
+    except ImportError:
+        sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "spiders"))
+        from main import DB_CONFIG
+    return DB_CONFIG
+
+
+def _connect():
+    return pymysql.connect(cursorclass=pymysql.cursors.SSCursor, **_db_config())
+
+
+def stream_rows(sql, params=None, batch_size=DEFAULT_BATCH_SIZE, connection=None):
+    """
+    执行查询并逐行生成结果元组。
+    connection 为空时新建连接并在结束后关闭；传入已有连接时只关闭游标（连接上不能同时有其他未读完的查询）。
+    """
+    own_connection = connection is None
+    conn = _connect() if own_connection else connection
+    cursor = conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        # 提前退出时 close() 会读完并丢弃剩余结果，保证连接可以继续使用
+        cursor.close()
+        if own_connection:
+            conn.close()
+
+
+def _select_sql(table, columns, where=None, order_by=None, limit=None):
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if where:
+        sql += f" WHERE {where}"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    return sql
+
+
+def iter_table(table, columns, where=None, params=None, order_by=None, limit=None,
+               batch_size=DEFAULT_BATCH_SIZE, connection=None):
+    """只投影 columns 中的列，逐行生成元组；where 使用 %s 占位符，参数放在 params 中。"""
+    sql = _select_sql(table, columns, where, order_by, limit)
+    return stream_rows(sql, params, batch_size, connection)
+
+
+def iter_batches(rows, batch_size=DEFAULT_BATCH_SIZE):
+    """把行迭代器切成长度不超过 batch_size 的列表。"""
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_arrays(table, columns, where=None, params=None, batch_size=DEFAULT_BATCH_SIZE, dtypes=None):
+    """
+    按批生成 {列名: numpy 数组}；dtypes 可为部分列指定类型（如 {'like_counts': 'int64'}），
+    其余列为 object 数组。空值在数值列中需要自行在 where 中排除。
+    """
+    import numpy as np
+
+    dtypes = dtypes or {}
+    for batch in iter_batches(iter_table(table, columns, where, params, batch_size=batch_size), batch_size):
+        yield {c: np.array(values, dtype=dtypes.get(c, object)) for c, values in zip(columns, zip(*batch))}
+
+
+def iter_frames(table, columns, where=None, params=None, batch_size=DEFAULT_BATCH_SIZE):
+    """按批生成 pandas DataFrame，每块最多 batch_size 行。"""
+    import pandas as pd
+
+    for batch in iter_batches(iter_table(table, columns, where, params, batch_size=batch_size), batch_size):
+        yield pd.DataFrame.from_records(batch, columns=columns)
+
+
+def iter_comments(columns=None, where=None, params=None, limit=None, batch_size=DEFAULT_BATCH_SIZE):
+    """getAllCommentData 的流式版本；不指定 columns 时行布局与其一致（row[5] 为评论内容）。"""
+    return iter_table('comments', columns or COMMENT_COLUMNS, where, params, limit=limit, batch_size=batch_size)
+
+
+def iter_articles(columns=None, where=None, params=None, limit=None, batch_size=DEFAULT_BATCH_SIZE):
+    """getAllArticleData 的流式版本；不指定 columns 时行布局与其一致。"""
+    return iter_table('articles', columns or ARTICLE_COLUMNS, where, params, limit=limit, batch_size=batch_size)
@@ -1,7 +1,241 @@
 # update_cache.py
+"""
+首页数据缓存预计算：文章表、评论表各流式遍历一次，其余数据读取已有的聚合表。
+
+- 文章：逐行累加分类热度、作者影响力与互动量前几名，只保留文章ID → 分类的映射供评论统计使用；
+- 评论：一次遍历得到评论总数、性别分布、地区分布、点赞最多的评论、性别-分类兴趣与评论作者获赞，
+  常驻内存与地区数、分类数、评论作者数有关，与评论行数无关；
+- 情感构成读取 sentiment_rollups 天级汇总，省份活跃度读取 province_stats，词云读取分词服务的词元库。
+"""
+import heapq
 import json
+import os
+import sys
 import time
-from getHomePageData import _precompute_all_data, CACHE_FILE_PATH
+import zlib
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from getHomePageData import CACHE_FILE_PATH
+from stream_query import iter_articles, iter_comments, stream_rows
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+try:
+    from spiders import profiling, region, sentiment_series
+    from model import segment_service
+except ImportError:
+    sys.path.append(os.path.join(ROOT_DIR, "spiders"))
+    sys.path.append(os.path.join(ROOT_DIR, "model"))
+    import profiling
+    import region
+    import sentiment_series
+    import segment_service
+
+# --- 配置区 ---
+CACHE_CONFIG = {
+    'top_comments': 4,
+    'top_articles': 4,
+    'hot_trends': 4,
+    'key_propagators': 4,
+    'word_cloud_words': 500,
+    'segment_store': os.path.join(ROOT_DIR, 'model', 'segment_store.npz'),
+}
+# 性别兴趣图展示的分类（顺序即图表顺序）
+INTEREST_TYPENAMES = ['军事', '数码', '历史', '汽车', '科技', '动漫', '综艺', '电影', '音乐', '明星']
+GENDER_KEYS = {'男': 'male', '女': 'female'}
+# 首页热评的情感标签 → 表情；没有情感结果的评论显示为中性
+SENTIMENT_EMOJIS = {'positive': '😊', 'neutral': '😐', 'negative': '😠'}
+TAG_COLORS = ['#ff6b6b', '#4fc3f7', '#4db6ac', '#f782c2', '#ffb74d', '#9575cd']
+WORD_COLORS = ['#8B0000', '#CD5C5C', '#DC143C', '#A52A2A', '#B22222', '#4682B4', '#191970', '#1E90FF',
+               '#0000CD', '#4169E1', '#2F4F4F', '#696969', '#708090', '#8B4513', '#A0522D']
+
+ARTICLE_COLUMNS = ['id', 'typename', 'content', 'likeNum', 'commentsLen', 'reposts_count', 'authorName']
+
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _fetch(sql, params):
+    return list(stream_rows(sql, params))
+
+
+def _top_comment_rows(rows):
+    """
+    首页热评行布局（14 列）：评论表 10 列 + import_time、provinceCode + 情感标签、表情。
+    遍历时只取前 10 列，其余列只为前几名评论按主键补查一次。
+    """
+    if not rows:
+        return []
+    placeholders = ', '.join(['%s'] * len(rows))
+    extra = {comment_id: rest for comment_id, *rest in _fetch(
+        "SELECT c.commentId, c.import_time, c.provinceCode, s.label FROM comments c "
+        f"LEFT JOIN sentiment_points s ON s.commentId = c.commentId WHERE c.commentId IN ({placeholders})",
+        [row[1] for row in rows])}
+    result = []
+    for row in rows:
+        import_time, province_code, label = extra.get(row[1], (None, None, None))
+        label = label or 'neutral'
+        result.append([_jsonable(v) for v in row] +
+                      [_jsonable(import_time), province_code, label, SENTIMENT_EMOJIS.get(label, '😐')])
+    return result
+
+
+def _stream_article_stats(top_n=None):
+    """
+    一次流式遍历文章表。互动量 = 点赞 + 评论 + 转发；
+    返回 (统计项, 文章ID → 分类, 作者 → [点赞, 评论, 转发])。
+    """
+    top_n = top_n or CACHE_CONFIG['top_articles']
+    article_count = 0
+    typenames = {}
+    authors = defaultdict(lambda: [0, 0, 0])
+    trends = {}   # 分类 → [总互动量, 代表文章互动量, 代表文章正文]
+    top = []      # (互动量, 序号, 行) 小顶堆
+    for i, (article_id, typename, content, likes, comments, reposts, author) in enumerate(
+            iter_articles(columns=ARTICLE_COLUMNS)):
+        article_count += 1
+        likes, comments, reposts = likes or 0, comments or 0, reposts or 0
+        interaction = likes + comments + reposts
+        if typename:
+            typenames[article_id] = typename
+            trend = trends.setdefault(typename, [0, -1, ''])
+            trend[0] += interaction
+            if interaction > trend[1]:
+                trend[1:] = [interaction, content or '']
+        if author:
+            totals = authors[author]
+            totals[0] += likes
+            totals[1] += comments
+            totals[2] += reposts
+        item = (interaction, i, (typename, content, author))
+        if len(top) < top_n:
+            heapq.heappush(top, item)
+        elif item[0] > top[0][0]:
+            heapq.heapreplace(top, item)
+
+    stats = {
+        'article_count': article_count,
+        'top_articles_by_interaction': [
+            {'typename': typename, 'content': content, 'author': author, 'interaction_score': score,
+             'tag_color': TAG_COLORS[zlib.crc32((typename or '').encode('utf-8')) % len(TAG_COLORS)]}
+            for score, _, (typename, content, author) in sorted(top, reverse=True)],
+        'hot_trends': [
+            {'typename': typename, 'total_interaction': total, 'example_text': example}
+            for typename, (total, _, example) in sorted(trends.items(), key=lambda kv: -kv[1][0])
+        ][:CACHE_CONFIG['hot_trends']],
+    }
+    return stats, typenames, authors
+
+
+def _stream_comment_stats(typenames, top_n=None):
+    """
+    一次流式遍历评论表，计算首页中依赖全部评论的统计项：
+    评论总数、性别分布（只统计男 / 女）、评论最多的地区、点赞最多的前 top_n 条评论、性别-分类兴趣、评论作者获赞。
+    """
+    top_n = top_n or CACHE_CONFIG['top_comments']
+    comment_count = 0
+    genders = Counter()
+    regions = Counter()
+    interests = {key: Counter() for key in GENDER_KEYS.values()}
+    author_likes = Counter()
+    top = []  # (点赞数, 序号, 行) 小顶堆
+    for i, row in enumerate(iter_comments()):
+        comment_count += 1
+        likes = row[3] or 0
+        genders[row[7]] += 1
+        if row[4]:
+            regions[row[4]] += 1
+        gender_key = GENDER_KEYS.get(row[7])
+        typename = typenames.get(row[0])
+        if gender_key and typename:
+            interests[gender_key][typename] += 1
+        if row[6] and likes:
+            author_likes[row[6]] += likes
+        item = (likes, i, row)
+        if len(top) < top_n:
+            heapq.heappush(top, item)
+        elif item[0] > top[0][0]:
+            heapq.heapreplace(top, item)
+
+    most_common_city, most_common_city_count = regions.most_common(1)[0] if regions else ('', 0)
+    top_author_name, top_author_likes = author_likes.most_common(1)[0] if author_likes else ('', 0)
+    return {
+        'comment_count': comment_count,
+        'gender_distribution': {k: genders.get(k, 0) for k in GENDER_KEYS},
+        'most_common_city': most_common_city,
+        'most_common_city_count': most_common_city_count,
+        'top_author_name': top_author_name,
+        'top_author_likes': top_author_likes,
+        'top_comments': _top_comment_rows([row for _, _, row in sorted(top, reverse=True)]),
+        'gender_interest_data': {key: [{'name': t, 'value': counter.get(t, 0)} for t in INTEREST_TYPENAMES]
+                                 for key, counter in interests.items()},
+        'author_likes': author_likes,
+    }
+
+
+def _key_propagators(authors, author_likes, top_n=None):
+    """影响力 = 文章点赞 + 评论 + 转发 + 该作者评论获赞。"""
+    scored = ((likes + comments + reposts + author_likes.get(name, 0), name, likes, comments)
+              for name, (likes, comments, reposts) in authors.items())
+    return [{'authorName': name, 'influence_score': score,
+             'details': {'article_likes': likes, 'article_comments': comments,
+                         'comment_likes': author_likes.get(name, 0)}}
+            for score, name, likes, comments in heapq.nlargest(top_n or CACHE_CONFIG['key_propagators'], scored)]
+
+
+def _province_activity():
+    activity = {}
+    for code, articles, comments, users in _fetch(
+            "SELECT provinceCode, articles, comments, users FROM province_stats", None):
+        if code in region.DISPLAY_NAMES:
+            activity[region.DISPLAY_NAMES[code]] = {
+                'articles': articles, 'comments': comments, 'activeUsers': users,
+                'heatIndex': region.heat_index({'articles': articles, 'comments': comments, 'users': users})}
+    return activity
+
+
+def _word_cloud():
+    store = segment_service.TokenStore.load(CACHE_CONFIG['segment_store'])
+    return [{'name': word, 'value': count, 'textStyle': {'color': WORD_COLORS[i % len(WORD_COLORS)]}}
+            for i, (word, count) in enumerate(
+                segment_service.word_frequencies(store, top_k=CACHE_CONFIG['word_cloud_words']))]
+
+
+def precompute_home_data():
+    """生成首页缓存的全部数据；文章表、评论表各只完整读取一次。"""
+    with profiling.span('cache.article_stats'):
+        article_stats, typenames, authors = _stream_article_stats()
+    with profiling.span('cache.comment_stats'):
+        comment_stats = _stream_comment_stats(typenames)
+    del typenames
+    with profiling.span('cache.aggregates'):
+        activity = _province_activity()
+        sentiment = sentiment_series.distribution(_fetch)
+        word_cloud = _word_cloud()
+
+    author_likes = comment_stats.pop('author_likes')
+    home_tags = {
+        'article_count': article_stats['article_count'],
+        'comment_count': comment_stats['comment_count'],
+        'top_author_name': comment_stats['top_author_name'],
+        'top_author_likes': comment_stats['top_author_likes'],
+        'most_common_city': comment_stats['most_common_city'],
+        'most_common_city_count': comment_stats['most_common_city_count'],
+        'most_active_city_heatIndex': max((v['heatIndex'] for v in activity.values()), default=0),
+        'gender_distribution': comment_stats['gender_distribution'],
+    }
+    return {
+        'home_tags_data': home_tags,
+        'home_comments_top_four': comment_stats['top_comments'],
+        'china_province_activity': activity,
+        'sentiment_distribution': sentiment,
+        'gender_interest_data': comment_stats['gender_interest_data'],
+        'word_cloud_data': word_cloud,
+        'top_articles_by_interaction': article_stats['top_articles_by_interaction'],
+        'hot_trends': article_stats['hot_trends'],
+        'key_propagators': _key_propagators(authors, author_likes),
+    }
 
 
 def update_cache_file():
@@ -11,16 +245,20 @@ def update_cache_file():
     start_time = time.time()
     print("开始更新首页数据缓存...")
 
-    # 调用正确的函数名
-    all_data = _precompute_all_data()
+    with profiling.span('cache.precompute'):
+        all_data = precompute_home_data()
 
-    with open(CACHE_FILE_PATH, 'w', encoding='utf-8') as f:
+    tmp_path = f"{CACHE_FILE_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         # 使用 ensure_ascii=False 以便正确保存中文字符
         json.dump(all_data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, CACHE_FILE_PATH)
 
     end_time = time.time()
     print(f"数据缓存更新完成，耗时: {end_time - start_time:.2f} 秒。")
 
 
 if __name__ == '__main__':
-    update_cache_file()
\ No newline at end of file
+    profiling.start_run('update_cache', sys.argv)
+    update_cache_file()
+    profiling.finish_run()
@@ -0,0 +1,59 @@
+import json
+import os
+
+from flask import Blueprint, abort, request, send_file
+
+# 由 utils/geo_assets.py 生成：多级简化的 GeoJSON，文件名带内容哈希，并附带预压缩版本
+GEO_DIR = os.path.join('static', 'data', 'geo')
+MANIFEST_FILE = os.path.join(GEO_DIR, 'manifest.json')
+LONG_CACHE = 'public, max-age=31536000, immutable'
+
+# Accept-Encoding 支持的预压缩格式，按优先级排列
+_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+gb = Blueprint('geo', __name__, url_prefix="/geo")
+
+_manifest_cache = {'mtime': None, 'files': set()}
+
+
+def _known_files():
+    """manifest 中登记的文件名集合；manifest 更新后自动重新读取"""
+    try:
+        mtime = os.path.getmtime(MANIFEST_FILE)
+    except OSError:
+        return set()
+    if _manifest_cache['mtime'] != mtime:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        _manifest_cache['files'] = {info['file'] for info in manifest.values()}
+        _manifest_cache['mtime'] = mtime
+    return _manifest_cache['files']
+
+
+@gb.route('/manifest.json')
+def manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        abort(404)
+    response = send_file(os.path.abspath(MANIFEST_FILE), mimetype='application/json', max_age=0)
+    # manifest 文件名固定，必须每次校验；实际数据文件则可长期缓存
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@gb.route('/<filename>')
+def geo_file(filename):
+    if filename not in _known_files():
+        abort(404)
+    path = os.path.abspath(os.path.join(GEO_DIR, filename))
+
+    accepted = request.accept_encodings
+    for encoding, suffix in _ENCODINGS:
+        if accepted[encoding] and os.path.exists(path + suffix):
+            response = send_file(path + suffix, mimetype='application/json', conditional=True)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_file(path, mimetype='application/json', conditional=True)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = LONG_CACHE
+    return response
@@ -0,0 +1,86 @@
+from flask import Blueprint, jsonify, request, session
+
+from spiders.job_manager import COMMANDS, JOB_KINDS, JobStore
+
+from views.user.utils import get_current_user_info
+
+# 后台任务接口：/jobs/api
+# 任务由独立的管理进程（spiders/job_manager.py serve）在工作进程中执行，
+# 这里只读写任务表，不在 Web 进程内运行任何爬取或计算。
+
+ADMIN_ROLES = {'admin', 'super_admin'}
+
+jb = Blueprint('jobs', __name__, url_prefix="/jobs")
+
+_store = None
+
+
+def _job_store():
+    global _store
+    if _store is None:
+        _store = JobStore()
+    return _store
+
+
+def _require_admin():
+    username = session.get('username')
+    if not username:
+        return None, (jsonify({'success': False, 'message': '请先登录'}), 401)
+    current_user = get_current_user_info(username)
+    if not current_user or current_user['role'] not in ADMIN_ROLES:
+        return None, (jsonify({'success': False, 'message': '权限不足'}), 403)
+    return username, None
+
+
+@jb.route('/api', methods=['GET'])
+def list_jobs():
+    _, error = _require_admin()
+    if error:
+        return error
+    status = request.args.get('status')
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 200))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit 必须为整数'}), 400
+    return jsonify({'success': True, 'jobs': _job_store().list(status=status.split(',') if status else None,
+                                                                limit=limit)})
+
+
+@jb.route('/api', methods=['POST'])
+def create_job():
+    username, error = _require_admin()
+    if error:
+        return error
+    payload = request.get_json(silent=True) or {}
+    kind = payload.get('kind')
+    if kind not in JOB_KINDS:
+        return jsonify({'success': False, 'message': f"任务类型必须为 {'/'.join(JOB_KINDS)}"}), 400
+    params = payload.get('params') or {}
+    if not isinstance(params, dict):
+        return jsonify({'success': False, 'message': 'params 必须为对象'}), 400
+    job_id = _job_store().create(kind, params, created_by=username)
+    return jsonify({'success': True, 'job': _job_store().get(job_id)}), 201
+
+
+@jb.route('/api/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    _, error = _require_admin()
+    if error:
+        return error
+    job = _job_store().get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    return jsonify({'success': True, 'job': job})
+
+
+@jb.route('/api/<int:job_id>/<command>', methods=['POST'])
+def command_job(job_id, command):
+    _, error = _require_admin()
+    if error:
+        return error
+    if command not in COMMANDS:
+        return jsonify({'success': False, 'message': f"指令必须为 {'/'.join(COMMANDS)}"}), 400
+    if not _job_store().set_command(job_id, command):
+        return jsonify({'success': False, 'message': '任务不存在或已结束'}), 409
+    # 指令由管理进程在下一次轮询时执行，状态随后在任务表中更新
+    return jsonify({'success': True, 'job': _job_store().get(job_id)}), 202
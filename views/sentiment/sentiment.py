@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from flask import Blueprint, jsonify, request, session
+from utils.query import query
+
+from spiders import sentiment_series
+from spiders.region import normalize_region
+
+# 情感趋势接口：/sentiment/api/trend
+# 只读取 sentiment_rollups 预聚合表，按时间跨度自动选择分钟 / 小时 / 天粒度，
+# 返回的桶数有上限，几个月的趋势也只是一次主键范围扫描。
+
+MAX_DAYS = 3 * 365
+
+seb = Blueprint('sentiment', __name__, url_prefix="/sentiment")
+
+
+def _parse_time(value):
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"无法解析的时间: {value}")
+
+
+@seb.route('/api/trend', methods=['GET'])
+def trend_api():
+    if not session.get('username'):
+        return jsonify({'success': False, 'message': '请先登录'}), 401
+
+    args = request.args
+    dimension = args.get('dimension', 'all')
+    value = args.get('value', '')
+    if dimension not in sentiment_series.DIMENSIONS:
+        return jsonify({'success': False, 'message': f"dimension 必须为 {'/'.join(sentiment_series.DIMENSIONS)}"}), 400
+    if dimension == 'region' and value and not value.isdigit():
+        # 允许传省份名称（"广东"、"发布于 广东"），统一换成行政区划代码
+        value = normalize_region(value)
+        if value is None:
+            return jsonify({'success': False, 'message': '无法识别的地区'}), 400
+    if dimension != 'all' and not value:
+        return jsonify({'success': False, 'message': '缺少 value 参数'}), 400
+
+    resolution = args.get('resolution')
+    if resolution and resolution not in sentiment_series.SERIES_CONFIG['resolutions']:
+        return jsonify({'success': False, 'message': '未知的汇总粒度'}), 400
+    try:
+        end = _parse_time(args['end']) if args.get('end') else datetime.now()
+        start = _parse_time(args['start']) if args.get('start') else end - timedelta(days=int(args.get('days', 30)))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if start >= end or end - start > timedelta(days=MAX_DAYS):
+        return jsonify({'success': False, 'message': f'时间范围必须在 0 到 {MAX_DAYS} 天之间'}), 400
+    width = sentiment_series.SERIES_CONFIG['resolutions'].get(resolution)
+    if width and (end - start).total_seconds() / width > sentiment_series.SERIES_CONFIG['max_points']:
+        return jsonify({'success': False, 'message': '时间范围过长，请使用更粗的粒度'}), 400
+
+    result = sentiment_series.trend(lambda sql, params: query(sql, params, 'select'),
+                                    dimension, value, start, end, resolution,
+                                    fill=args.get('fill', '1') != '0')
+    return jsonify(dict(result, success=True, dimension=dimension, value=value,
+                        start=start.strftime('%Y-%m-%d %H:%M:%S'), end=end.strftime('%Y-%m-%d %H:%M:%S')))
@@ -0,0 +1,182 @@
+import json
+import os
+import queue
+import threading
+import time
+
+from utils.query import query
+
+from spiders import sentiment_series
+
+# 仪表盘实时推送的扇出中心：
+# - 全进程只有一个生产者线程轮询数据源，所有浏览器标签页共享同一份结果；
+# - 只在数据变化时发布增量事件（counts / sentiment / crawl），每个订阅者一个有界队列；
+# - 慢客户端的队列满时丢弃其积压事件并补发一次完整快照，不拖慢生产者和其他订阅者；
+# - 没有订阅者时生产者线程退出，不再查询数据库。
+
+# --- 配置区 ---
+HUB_CONFIG = {
+    'poll_interval': 2.0,      # 生产者轮询间隔（秒）
+    'subscriber_queue': 100,   # 每个订阅者最多积压的事件数
+}
+CRAWL_PROGRESS_FILE = os.path.join('spiders', 'crawl_progress.json')
+
+
+def _read_stats_marker():
+    """province_stats 只有 34 行，用其最后更新时间判断是否有新数据入库。"""
+    rows = query("SELECT MAX(updated_at) FROM province_stats", [], 'select')
+    if not rows or rows[0][0] is None:
+        return None
+    return str(rows[0][0])
+
+
+def _read_sentiment():
+    """
+    情感构成与首页饼图初始数据同一口径（sentiment_rollups 天级 all 汇总，含没有省份的评论）；
+    只扫描天级汇总的几百行，每次轮询都读取，不依赖 province_stats 的更新时间。
+    """
+    return sentiment_series.distribution(lambda sql, params: query(sql, params, 'select'))
+
+
+def _read_counts():
+    articles = query("SELECT COUNT(*) FROM articles", [], 'select')
+    comments = query("SELECT COUNT(*) FROM comments", [], 'select')
+    return {'articles': articles[0][0] if articles else 0, 'comments': comments[0][0] if comments else 0}
+
+
+_crawl_cache = {'mtime': None, 'data': None}
+
+
+def _read_crawl_progress():
+    cache = _crawl_cache
+    try:
+        mtime = os.path.getmtime(CRAWL_PROGRESS_FILE)
+    except OSError:
+        return None
+    if cache['mtime'] != mtime:
+        try:
+            with open(CRAWL_PROGRESS_FILE, 'r', encoding='utf-8') as f:
+                cache['data'] = json.load(f)
+            cache['mtime'] = mtime
+        except (OSError, ValueError):
+            pass  # 写入方使用原子替换，读取失败说明文件刚被删除，下次再读
+    return cache['data']
+
+
+class _Subscriber:
+    __slots__ = ('queue', 'resync')
+
+    def __init__(self, size):
+        self.queue = queue.Queue(maxsize=size)
+        self.resync = False
+
+
+class EventHub:
+    def __init__(self, poll_interval=None):
+        self.poll_interval = poll_interval or HUB_CONFIG['poll_interval']
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._producer = None
+        self._state = {}          # 各类事件的最新完整值，用于新订阅者的快照
+        self._stats_marker = None
+        self._event_id = 0
+
+    # ---------- 订阅 ----------
+
+    def subscribe(self):
+        subscriber = _Subscriber(HUB_CONFIG['subscriber_queue'])
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._producer is None or not self._producer.is_alive():
+                self._producer = threading.Thread(target=self._run, name='dashboard-hub', daemon=True)
+                self._producer.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def snapshot(self):
+        with self._lock:
+            return self._event_id, dict(self._state)
+
+    def next_events(self, subscriber, timeout):
+        """
+        取出订阅者的下一批事件 [(id, 事件名, 数据)]；超时返回空列表（调用方发送心跳）。
+        若该订阅者曾因积压被丢弃事件，返回一条完整快照代替。
+        """
+        try:
+            first = subscriber.queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        events = [first]
+        while True:
+            try:
+                events.append(subscriber.queue.get_nowait())
+            except queue.Empty:
+                break
+        if subscriber.resync:
+            subscriber.resync = False
+            event_id, state = self.snapshot()
+            return [(event_id, 'snapshot', state)]
+        return events
+
+    # ---------- 发布 ----------
+
+    def publish(self, event, data, state=None):
+        """发布增量事件；state 为该类事件合并后的完整值，供之后连接的客户端做快照。"""
+        with self._lock:
+            self._event_id += 1
+            self._state[event] = data if state is None else state
+            item = (self._event_id, event, data)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(item)
+            except queue.Full:
+                # 丢弃积压，下次读取时补发快照
+                subscriber.resync = True
+                while True:
+                    try:
+                        subscriber.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                subscriber.queue.put_nowait(item)
+
+    def _poll(self):
+        marker = _read_stats_marker()
+        if marker is not None and marker != self._stats_marker:
+            self._stats_marker = marker
+            counts = _read_counts()
+            previous = self._state.get('counts')
+            if counts != previous:
+                delta = dict(counts)
+                if previous:
+                    delta['delta'] = {k: counts[k] - previous.get(k, 0) for k in counts}
+                self.publish('counts', delta, state=counts)
+
+        sentiment = _read_sentiment()
+        if sentiment['total'] and sentiment != self._state.get('sentiment'):
+            self.publish('sentiment', sentiment)
+
+        progress = _read_crawl_progress()
+        previous = self._state.get('crawl')
+        if progress and progress != previous:
+            # 只发送变化的字段
+            changed = {k: v for k, v in progress.items() if not previous or previous.get(k) != v}
+            self.publish('crawl', changed, state=dict(progress))
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._producer = None
+                    return
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"[仪表盘推送] 轮询数据失败: {e}")
+            time.sleep(self.poll_interval)
+
+
+hub = EventHub()
@@ -0,0 +1,52 @@
+import json
+
+from flask import Blueprint, Response, jsonify, session, stream_with_context
+
+from .hub import hub
+
+# 仪表盘实时推送（Server-Sent Events）：/stream/dashboard
+# 连接建立后先发送一条 snapshot（各类数据的当前值），之后只推送变化：
+#   counts    {articles, comments, delta: {articles, comments}}
+#   sentiment {counts: {positive, neutral, negative}, total}（读取 sentiment_rollups 的全量情感构成）
+#   crawl     爬取进度中变化的字段（state / total_articles / done_articles / comments_written ...）
+# 每个连接占用一个工作线程，部署时需使用线程或协程模式的 WSGI 服务器。
+
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 5000
+
+sb = Blueprint('stream', __name__, url_prefix="/stream")
+
+
+def _format_event(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+def _event_stream(subscriber):
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        event_id, state = hub.snapshot()
+        yield _format_event(event_id, 'snapshot', state)
+        while True:
+            events = hub.next_events(subscriber, HEARTBEAT_SECONDS)
+            if not events:
+                # 注释行作为心跳，防止代理断开空闲连接，也能尽快发现客户端已断开
+                yield ": ping\n\n"
+                continue
+            # 订阅后、快照前已入队的事件已包含在快照中，跳过
+            events = [e for e in events if e[1] == 'snapshot' or e[0] > event_id]
+            if events:
+                event_id = max(event_id, events[-1][0])
+                yield ''.join(_format_event(*event) for event in events)
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+@sb.route('/dashboard')
+def dashboard_stream():
+    if not session.get('username'):
+        return jsonify({'success': False, 'message': '请先登录'}), 401
+    subscriber = hub.subscribe()
+    response = Response(stream_with_context(_event_stream(subscriber)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 关闭 nginx 缓冲
+    return response
@@ -0,0 +1,208 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Blueprint, Response, jsonify, request, session, stream_with_context
+from utils.query import query
+
+from views.user.utils import get_current_user_info
+
+# 表格数据接口：/table/api/<name>
+# - 键集分页（keyset）：按 (排序列, 主键) 定位下一页，翻到第几页都只扫描一页的数据，无 OFFSET；
+# - 排序、过滤、列投影全部在服务端完成，只允许白名单中的列；
+# - 每页条数有上限，结果以流的方式逐行输出 JSON，内存占用与表大小无关。
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# 每张表：主键、可返回的列、可排序的列（需有 (列, 主键) 复合索引）、可过滤的列及运算符、访问所需角色
+TABLES = {
+    'comments': {
+        'table': 'comments',
+        'key': 'commentId',
+        'columns': ['commentId', 'articleId', 'created_at', 'like_counts', 'region', 'content',
+                    'authorName', 'authorGender', 'authorAddress', 'authorAvatar'],
+        'sortable': {'commentId', 'created_at', 'like_counts'},
+        'nullable': {'created_at', 'like_counts'},
+        'filters': {
+            'articleId': ('articleId', '='), 'region': ('region', '='), 'authorGender': ('authorGender', '='),
+            'authorName': ('authorName', '='), 'since': ('created_at', '>='), 'until': ('created_at', '<='),
+            'min_likes': ('like_counts', '>='), 'q': ('content', 'LIKE'),
+        },
+        'roles': None,
+    },
+    'articles': {
+        'table': 'articles',
+        'key': 'id',
+        'columns': ['id', 'typename', 'content', 'created_at', 'likeNum', 'commentsLen', 'reposts_count',
+                    'region', 'contentLen', 'detailUrl', 'authorName', 'authorDetail', 'authorAvatar', 'isVip'],
+        'sortable': {'id', 'created_at', 'likeNum', 'commentsLen', 'reposts_count'},
+        'nullable': {'created_at', 'likeNum', 'commentsLen', 'reposts_count'},
+        'filters': {
+            'typename': ('typename', '='), 'region': ('region', '='), 'authorName': ('authorName', '='),
+            'since': ('created_at', '>='), 'until': ('created_at', '<='), 'min_likes': ('likeNum', '>='),
+            'q': ('content', 'LIKE'),
+        },
+        'roles': None,
+    },
+    'users': {
+        'table': 'user',
+        'key': 'username',
+        # 不包含 password 等敏感列
+        'columns': ['username', 'nickname', 'email', 'role', 'status', 'createTime', 'avatar'],
+        'sortable': {'username', 'createTime'},
+        'nullable': {'createTime'},
+        'filters': {'role': ('role', '='), 'status': ('status', '='), 'email': ('email', '=')},
+        'roles': {'admin', 'super_admin'},
+    },
+}
+
+tb = Blueprint('table', __name__, url_prefix="/table")
+
+
+class TableRequestError(ValueError):
+    pass
+
+
+def _sort_token(sort_column, descending):
+    return ('-' if descending else '') + sort_column
+
+
+def encode_cursor(sort_column, descending, values):
+    """游标 = [排序（列名，降序带 - 前缀）, 排序列值, 主键值]；排序一并编码，换了排序的旧游标会被拒绝。"""
+    raw = json.dumps([_sort_token(sort_column, descending)] + list(values), ensure_ascii=False,
+                     default=_json_default).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort_column, descending):
+    """返回 (排序列值, 主键值)；游标损坏、值不是标量或与本次请求的排序不一致时抛出 TableRequestError。"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        raise TableRequestError('无效的分页游标')
+    if not isinstance(values, list) or len(values) != 3:
+        raise TableRequestError('无效的分页游标')
+    sort, sort_value, key_value = values
+    # bool 是 int 的子类，也不是合法的列值
+    if any(not isinstance(v, (str, int, float)) or isinstance(v, bool) for v in (sort_value, key_value)):
+        raise TableRequestError('无效的分页游标')
+    if sort != _sort_token(sort_column, descending):
+        raise TableRequestError('分页游标与当前排序不一致，请从第一页重新请求')
+    return sort_value, key_value
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+
+def build_page_query(spec, args):
+    """
+    根据请求参数构造一页数据的 SQL。
+    args: columns=a,b,c  sort=-created_at（前缀 - 表示降序）  limit=50  cursor=<上一页返回的 next_cursor>
+          以及 spec['filters'] 中列出的过滤参数。
+    返回 (sql, params, columns, sort_column, descending, limit)。
+    """
+    key = spec['key']
+    columns = [c for c in (args.get('columns') or '').split(',') if c] or list(spec['columns'])
+    unknown = [c for c in columns if c not in spec['columns']]
+    if unknown:
+        raise TableRequestError(f"不支持的列: {', '.join(unknown)}")
+
+    sort = args.get('sort') or f"-{key}"
+    descending = sort.startswith('-')
+    sort_column = sort.lstrip('-+')
+    if sort_column not in spec['sortable']:
+        raise TableRequestError(f"不支持按 {sort_column} 排序")
+
+    try:
+        limit = int(args.get('limit') or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        raise TableRequestError('limit 必须为整数')
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    conditions, params = [], []
+    for name, (column, op) in spec['filters'].items():
+        value = args.get(name)
+        if value in (None, ''):
+            continue
+        if op == 'LIKE':
+            conditions.append(f"{column} LIKE %s")
+            params.append('%' + value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        else:
+            conditions.append(f"{column} {op} %s")
+            params.append(value)
+
+    if sort_column != key and sort_column in spec['nullable']:
+        # NULL 无法参与键集比较，按该列排序时不返回该列为空的行
+        conditions.append(f"{sort_column} IS NOT NULL")
+
+    cursor = args.get('cursor')
+    if cursor:
+        sort_value, key_value = decode_cursor(cursor, sort_column, descending)
+        op = '<' if descending else '>'
+        if sort_column == key:
+            conditions.append(f"{key} {op} %s")
+            params.append(key_value)
+        else:
+            conditions.append(f"({sort_column} {op} %s OR ({sort_column} = %s AND {key} {op} %s))")
+            params.extend([sort_value, sort_value, key_value])
+
+    # 额外取出排序列与主键用于生成下一页游标，多取一行用于判断是否还有下一页
+    select_columns = columns + [c for c in (sort_column, key) if c not in columns]
+    direction = 'DESC' if descending else 'ASC'
+    sql = f"SELECT {', '.join(select_columns)} FROM {spec['table']}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {sort_column} {direction}, {key} {direction} LIMIT %s"
+    params.append(limit + 1)
+    return sql, params, columns, sort_column, descending, limit
+
+
+def _stream_page(rows, columns, select_columns, sort_column, descending, key, limit):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    sort_index = select_columns.index(sort_column)
+    key_index = select_columns.index(key)
+    next_cursor = (encode_cursor(sort_column, descending, [rows[-1][sort_index], rows[-1][key_index]])
+                   if has_more and rows else None)
+    n = len(columns)
+
+    yield '{"columns":' + json.dumps(columns, ensure_ascii=False) + ',"rows":['
+    for i, row in enumerate(rows):
+        yield (',' if i else '') + json.dumps(list(row[:n]), ensure_ascii=False, default=_json_default)
+    yield '],"count":' + str(len(rows)) + ',"next_cursor":' + json.dumps(next_cursor) + '}'
+
+
+@tb.route('/api/<name>', methods=['GET'])
+def table_api(name):
+    spec = TABLES.get(name)
+    if spec is None:
+        return jsonify({'success': False, 'message': f'未知的数据表: {name}'}), 404
+    username = session.get('username')
+    if not username:
+        return jsonify({'success': False, 'message': '请先登录'}), 401
+    if spec['roles']:
+        current_user = get_current_user_info(username)
+        if not current_user or current_user['role'] not in spec['roles']:
+            return jsonify({'success': False, 'message': '权限不足'}), 403
+
+    try:
+        sql, params, columns, sort_column, descending, limit = build_page_query(spec, request.args)
+    except TableRequestError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    rows = query(sql, params, 'select')
+    select_columns = columns + [c for c in (sort_column, spec['key']) if c not in columns]
+    return Response(
+        stream_with_context(_stream_page(list(rows), columns, select_columns, sort_column, descending, spec['key'],
+                                         limit)),
+        mimetype='application/json')
@@ -0,0 +1,182 @@
+import hashlib
+import io
+import itertools
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from utils.query import query
+
+from .utils import invalidate_user_info
+
+# 头像处理流水线：
+# - 上传请求内只做哈希与格式校验，解码、缩放、编码在线程池中完成（Pillow 在缩放/编码时释放 GIL）；
+# - 每张头像按内容 SHA-256 存放在 static/avatars/<前两位>/<哈希>/ 下，生成固定尺寸的 WebP 与 JPEG；
+#   相同内容的上传直接复用已有文件；
+# - 文件名由内容决定、永不修改，因此可以返回一年期的 immutable 缓存头；
+# - 每次上传按用户记录序号，后台处理完成时只有该用户最新一次上传才写入数据库，
+#   先传 A 再传 B、A 后处理完时不会把头像改回 A。
+
+# --- 配置区 ---
+AVATAR_CONFIG = {
+    'root': 'static/avatars',
+    'sizes': (48, 96, 256),       # 正方形边长（像素）
+    'default_size': 256,          # 数据库中记录的尺寸
+    'formats': {'webp': {'quality': 82, 'method': 4}, 'jpg': {'quality': 85, 'optimize': True, 'progressive': True}},
+    'max_pixels': 40_000_000,     # 超过此像素数的图片直接拒绝，防止解压炸弹
+    'workers': 2,
+    'cache_max_age': 365 * 24 * 3600,
+}
+
+# 只接受可以安全解码为位图的格式（SVG 可以携带脚本，不再作为头像存储）
+ALLOWED_FORMATS = {'PNG', 'JPEG', 'GIF', 'WEBP'}
+
+_DIGEST_PATH = re.compile(r'^/static/avatars/[0-9a-f]{2}/[0-9a-f]{64}/\d+\.(webp|jpg)$')
+
+_executor = ThreadPoolExecutor(max_workers=AVATAR_CONFIG['workers'], thread_name_prefix='avatar')
+_in_flight = {}  # 哈希 -> Future，避免同一内容被并发处理多次
+_in_flight_lock = threading.Lock()
+_upload_seq = itertools.count(1)
+_latest_upload = {}  # 用户名 -> 最近一次上传的序号
+_latest_lock = threading.Lock()
+
+
+class AvatarError(ValueError):
+    pass
+
+
+def _digest_dir(digest):
+    return os.path.join(AVATAR_CONFIG['root'], digest[:2], digest)
+
+
+def avatar_path(digest, size=None, fmt='webp'):
+    """数据库 / 模板中使用的相对路径（相对于 static/）。"""
+    size = size or AVATAR_CONFIG['default_size']
+    return f"avatars/{digest[:2]}/{digest}/{size}.{fmt}"
+
+
+def avatar_variant(path, size, fmt='webp'):
+    """把数据库中的头像路径换成指定尺寸 / 格式；旧版（非内容寻址）路径原样返回。"""
+    parts = (path or '').split('/')
+    if len(parts) == 4 and parts[0] == 'avatars' and len(parts[2]) == 64:
+        return avatar_path(parts[2], size, fmt)
+    return path
+
+
+def _is_complete(digest):
+    directory = _digest_dir(digest)
+    return all(os.path.exists(os.path.join(directory, f"{size}.{fmt}"))
+               for size in AVATAR_CONFIG['sizes'] for fmt in AVATAR_CONFIG['formats'])
+
+
+def inspect_upload(data):
+    """请求内的快速校验：只读取文件头，不解码像素；返回 (哈希, 格式)。"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            fmt = image.format
+            width, height = image.size
+    except (UnidentifiedImageError, OSError):
+        raise AvatarError('无法识别的图片文件')
+    if fmt not in ALLOWED_FORMATS:
+        raise AvatarError('不支持的头像文件类型')
+    if width * height > AVATAR_CONFIG['max_pixels']:
+        raise AvatarError('图片尺寸过大')
+    return hashlib.sha256(data).hexdigest(), fmt
+
+
+def _render(data, digest):
+    """解码一次，居中裁成正方形后依次缩放到各尺寸并编码；先写临时文件再原子替换。"""
+    directory = _digest_dir(digest)
+    os.makedirs(directory, exist_ok=True)
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft('RGB', (max(AVATAR_CONFIG['sizes']) * 2,) * 2)  # JPEG 可直接按比例解码，省去大图全尺寸解码
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+        width, height = image.size
+        side = min(width, height)
+        left, top = (width - side) // 2, (height - side) // 2
+        image = image.crop((left, top, left + side, top + side))
+        for size in sorted(AVATAR_CONFIG['sizes'], reverse=True):
+            # 从上一级（更大的）结果缩放，避免每个尺寸都从原图开始
+            image = image.resize((size, size), Image.Resampling.LANCZOS) if image.size[0] > size else image
+            for fmt, options in AVATAR_CONFIG['formats'].items():
+                path = os.path.join(directory, f"{size}.{fmt}")
+                tmp_path = f"{path}.tmp"
+                image.save(tmp_path, format='WEBP' if fmt == 'webp' else 'JPEG', **options)
+                os.replace(tmp_path, path)
+
+
+def _record(digest, username):
+    query("UPDATE user SET avatar = %s WHERE username = %s", [avatar_path(digest), username])
+    invalidate_user_info(username)
+
+
+def submit_avatar(data, username):
+    """
+    保存用户上传的头像。内容已处理过时同步更新数据库并返回 (路径, True)；
+    否则提交到线程池，处理完成后再更新数据库，立即返回 (路径, False)。
+    """
+    digest, _ = inspect_upload(data)
+    with _latest_lock:
+        seq = next(_upload_seq)
+        _latest_upload[username] = seq
+    if _is_complete(digest):
+        _record_if_latest(digest, username, seq)
+        return avatar_path(digest), True
+    with _in_flight_lock:
+        future = _in_flight.get(digest)
+        if future is None or future.done():
+            future = _executor.submit(_render, data, digest)
+            _in_flight[digest] = future
+            future.add_done_callback(lambda f: _forget(digest, f))
+    future.add_done_callback(lambda f: _on_rendered(f, digest, username, seq))
+    return avatar_path(digest), False
+
+
+def _forget(digest, future):
+    with _in_flight_lock:
+        if _in_flight.get(digest) is future:
+            del _in_flight[digest]
+
+
+def _record_if_latest(digest, username, seq):
+    """只有 seq 仍是该用户最新一次上传时才写入；返回是否写入。"""
+    with _latest_lock:
+        if _latest_upload.get(username) != seq:
+            return False
+        _record(digest, username)
+        del _latest_upload[username]
+        return True
+
+
+def _on_rendered(future, digest, username, seq):
+    error = future.exception()
+    if error is not None:
+        print(f"头像处理失败（{username}）: {error}")
+        return
+    try:
+        _record_if_latest(digest, username, seq)
+    except Exception as e:
+        print(f"头像保存失败（{username}）: {e}")
+
+
+def is_ready(digest):
+    return bool(re.fullmatch(r'[0-9a-f]{64}', digest or '')) and _is_complete(digest)
+
+
+def apply_cache_headers(response, path):
+    """内容寻址的头像文件永不变化，允许浏览器与 CDN 缓存一年。"""
+    if response.status_code == 200 and _DIGEST_PATH.match(path):
+        response.cache_control.public = True
+        response.cache_control.max_age = AVATAR_CONFIG['cache_max_age']
+        response.cache_control.immutable = True
+    return response
@@ -3,24 +3,41 @@ import time
 import random
 
 from flask import Flask, session, render_template, redirect, Blueprint, request, flash, url_for, jsonify
-from werkzeug.utils import secure_filename
 from utils.query import query
-from werkzeug.security import check_password_hash, generate_password_hash
+from utils.password_hashing import hash_password, verify_and_update, verify_password
 import re
 
 from itsdangerous import SignatureExpired, BadTimeSignature
-from extensions import mail
+from extensions import mail_queue
 from flask_mail import Message
 
-from .utils import get_current_user_info, get_serializer
+from .utils import get_current_user_info, get_serializer, invalidate_user_info
+from .avatar import AvatarError, apply_cache_headers, avatar_variant, is_ready, submit_avatar
 
 ub = Blueprint('user', __name__, url_prefix="/user", template_folder='templates')
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'svg'}
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 UPLOAD_FOLDER = 'static/avatars'
 if not os.path.exists(UPLOAD_FOLDER): os.makedirs(UPLOAD_FOLDER)
 
 def allowed_file(filename): return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+
+@ub.app_template_global()
+def avatar_src(avatar_url, size=96, fmt='webp'):
+    """模板中按显示尺寸取头像缩略图：/static/{{ avatar_src(avatar_url, 96) }}"""
+    return avatar_variant(avatar_url, size, fmt)
+
+
+@ub.after_app_request
+def _avatar_cache_headers(response):
+    return apply_cache_headers(response, request.path)
+
+
+@ub.route('/avatar/<digest>/status', methods=['GET'])
+def avatar_status(digest):
+    # 上传后前端可轮询此接口，缩略图生成完成后再切换显示
+    return jsonify({'ready': is_ready(digest)})
+
 def _push_ban_notice(reason, details):
     session['ban_notice'] = {
         'title': '账户已被禁用',
@@ -56,9 +73,13 @@ def login():
 
         username, db_password, status, ban_reason, ban_details = users[0]
 
-        if not check_password_hash(db_password, password):
+        password_ok, upgraded_hash = verify_and_update(db_password, password)
+        if not password_ok:
             flash("❌ 登录失败：用户名/邮箱或密码错误", category="error")
             return redirect('/user/login')
+        if upgraded_hash:
+            # 哈希参数已调整，登录成功时用明文透明地重新哈希
+            query("UPDATE user SET password = %s WHERE username = %s", [upgraded_hash, username])
 
         # [V3] 显示详细的封禁提示
         if status == 'disabled':
@@ -66,6 +87,8 @@ def login():
             flash('账户访问受限||您的账户已被禁用，请点击申诉按钮或联系管理员。', 'error')
             return redirect('/user/login')
 
+        # 登录时丢弃旧的缓存资料，确保封禁/解封等状态立即生效
+        invalidate_user_info(username)
         session['username'] = username
         flash('登录成功||欢迎回来，{}！'.format(username), 'success')
         return redirect('/page/home')
@@ -142,7 +165,7 @@ def register():
         )
     email_count = query('SELECT count(*) FROM user WHERE email = %s', [email], 'select')
     if email_count and email_count[0][0] > 0: flash("❌ 注册失败！原因：该电子邮箱已被使用", category="error"); return render_template('register_portal.html', prefill=form_data, ban_notice=ban_notice)
-    session.pop('verification_code', None); hashed_password = generate_password_hash(password, method='pbkdf2:sha256'); create_time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
+    session.pop('verification_code', None); hashed_password = hash_password(password); create_time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
     query("INSERT INTO user(username, password, nickname, email, createTime, role) VALUES(%s, %s, %s, %s, %s, %s)", [username, hashed_password, nickname, email, create_time_str, 'user'])
     flash("注册成功||请使用新账号登录 😊", category="success"); return redirect('/user/login')
 @ub.route('/logout')
@@ -163,9 +186,11 @@ def update_profile():
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
     original_email = current_user.get('email'); nickname = request.form.get('nickname', '').strip(); new_email = request.form.get('email', '').strip()
     query("UPDATE user SET nickname = %s WHERE username = %s", [nickname, username])
+    invalidate_user_info(username)
 
     avatar_updated = False
     avatar_url_value = None
+    avatar_ready = True
     if 'avatar' in request.files:
         file = request.files['avatar']
         if file and file.filename != '':
@@ -188,9 +213,14 @@ def update_profile():
                     return jsonify({'success': False, 'message': '头像大小不能超过 5MB'}), 400
                 flash('头像大小不能超过 5MB', 'error'); return redirect(url_for('user.profile_page'))
 
-            timestamp = int(time.time()); filename = secure_filename(f"{username}_{timestamp}_{file.filename}"); filepath = os.path.join(UPLOAD_FOLDER, filename); file.save(filepath); db_path = os.path.join('avatars', filename).replace('\\', '/'); query("UPDATE user SET avatar = %s WHERE username = %s", [db_path, username])
+            # 缩放与缩略图在后台线程池中生成，完成后才更新数据库；相同内容的图片直接复用
+            try:
+                avatar_url_value, avatar_ready = submit_avatar(file.read(), username)
+            except AvatarError as e:
+                if is_ajax:
+                    return jsonify({'success': False, 'message': str(e)}), 400
+                flash(str(e), 'error'); return redirect(url_for('user.profile_page'))
             avatar_updated = True
-            avatar_url_value = db_path
 
     if new_email and new_email != original_email:
         verification_code = request.form.get('verification_code', ''); stored_code_info = session.get('verification_code'); target_email = original_email if original_email else new_email
@@ -198,12 +228,12 @@ def update_profile():
         if time.time() - stored_code_info.get('timestamp', 0) > 300: flash("❌ 电子邮箱更新失败！原因：验证码已过期，请重试。", category="error"); return redirect(url_for('user.profile_page'))
         email_count = query('SELECT count(*) FROM user WHERE email = %s', [new_email], 'select')
         if email_count and email_count[0][0] > 0: flash("❌ 电子邮箱更新失败！原因：该邮箱已被其他用户注册。", category="error"); return redirect(url_for('user.profile_page'))
-        query("UPDATE user SET email = %s WHERE username = %s", [new_email, username]); session.pop('verification_code', None)
+        query("UPDATE user SET email = %s WHERE username = %s", [new_email, username]); invalidate_user_info(username); session.pop('verification_code', None)
         if is_ajax:
-            return jsonify({'success': True, 'message': '个人资料（包括电子邮箱）更新成功！', 'avatar_updated': avatar_updated, 'avatar_url': avatar_url_value})
+            return jsonify({'success': True, 'message': '个人资料（包括电子邮箱）更新成功！', 'avatar_updated': avatar_updated, 'avatar_url': avatar_url_value, 'avatar_ready': avatar_ready})
         flash('✅ 个人资料（包括电子邮箱）更新成功！', 'success'); return redirect('/user/profile')
     if is_ajax:
-        return jsonify({'success': True, 'message': '个人资料更新成功！', 'avatar_updated': avatar_updated, 'avatar_url': avatar_url_value})
+        return jsonify({'success': True, 'message': '个人资料更新成功！', 'avatar_updated': avatar_updated, 'avatar_url': avatar_url_value, 'avatar_ready': avatar_ready})
     flash('✅ 个人资料更新成功！', 'success'); return redirect('/user/profile')
 @ub.route('/password/update', methods=['POST'])
 def update_password():
@@ -219,8 +249,8 @@ def update_password():
     user_data = query("SELECT password FROM user WHERE username = %s LIMIT 1", [username], 'select')
     if not user_data: flash("❌ 用户不存在。", "error"); return redirect('/user/profile')
     stored_hash = user_data[0][0] or '';
-    if not check_password_hash(stored_hash, old_password): flash("❌ 密码更新失败：旧密码不正确。", "error"); return redirect('/user/profile')
-    session.pop('verification_code', None); new_hashed = generate_password_hash(new_password, method='pbkdf2:sha256'); query("UPDATE user SET password = %s WHERE username = %s", [new_hashed, username]); flash("✅ 密码更新成功！", "success"); return redirect('/user/profile')
+    if not verify_password(stored_hash, old_password): flash("❌ 密码更新失败：旧密码不正确。", "error"); return redirect('/user/profile')
+    session.pop('verification_code', None); new_hashed = hash_password(new_password); query("UPDATE user SET password = %s WHERE username = %s", [new_hashed, username]); invalidate_user_info(username); flash("✅ 密码更新成功！", "success"); return redirect('/user/profile')
 @ub.route('/send-verification-code', methods=['POST'])
 def send_verification_code():
     email = request.json.get('email', '').strip()
@@ -230,8 +260,10 @@ def send_verification_code():
     session['verification_code'] = { 'code': code, 'email': email, 'timestamp': time.time() }
     try:
         msg = Message(subject="[情感分析平台] - 邮箱验证码", recipients=[email], html=f"""<p>您的验证码是：<strong style="font-size: 18px; color: #007bff;">{code}</strong></p><p>此验证码将在5分钟后失效。</p>""", charset='utf-8')
-        mail.send(msg); return jsonify({'success': True, 'message': '验证码已发送，请注意查收。'})
-    except Exception as e: print(f"邮件发送失败: {e}"); return jsonify({'success': False, 'message': '邮件发送失败，请稍后重试或联系管理员'}), 500
+        # 只入队，由后台线程发送，SMTP 慢或不可用时不阻塞请求
+        if not mail_queue.enqueue(msg): return jsonify({'success': False, 'message': '邮件服务繁忙，请稍后重试'}), 503
+        return jsonify({'success': True, 'message': '验证码已发送，请注意查收。'})
+    except Exception as e: print(f"邮件入队失败: {e}"); return jsonify({'success': False, 'message': '邮件发送失败，请稍后重试或联系管理员'}), 500
 @ub.route('/forgot-password', methods=['GET', 'POST'])
 def forgot_password():
     if request.method == 'GET':
@@ -241,7 +273,7 @@ def forgot_password():
     if user_data:
         token = get_serializer().dumps(email, salt='password-reset-salt'); reset_url = url_for('user.reset_with_token', token=token, _external=True)
         msg = Message(subject="[情感分析平台] - 密码重置请求", recipients=[email], html=f"""<p>请点击链接重置密码：<a href="{reset_url}">{reset_url}</a></p><p>此链接将在30分钟后失效。</p>""", charset='utf-8')
-        mail.send(msg)
+        if not mail_queue.enqueue(msg): print(f"密码重置邮件入队失败（队列已满）: {email}")
     flash("邮件发送成功||如果该邮箱已注册，我们已发送密码重置链接。", "success"); return redirect(url_for('user.login'))
 @ub.route('/reset-password/<token>', methods=['GET', 'POST'])
 def reset_with_token(token):
@@ -260,8 +292,9 @@ def reset_with_token(token):
         if len(new_password) < 8 or not re.search(r'\d', new_password) or not re.search(r'[A-Za-z]', new_password):
             flash("密码更新失败||新密码需至少8位并包含字母、数字。", "warning")
             return render_template('reset_password.html', token=token)
-        new_hashed = generate_password_hash(new_password, method='pbkdf2:sha256')
+        new_hashed = hash_password(new_password)
         query("UPDATE user SET password = %s WHERE email = %s", [new_hashed, email])
+        invalidate_user_info(email=email)
         flash("密码已成功重置||现在可以使用新密码登录。", "success")
         return redirect(url_for('user.login'))
 
@@ -281,4 +314,4 @@ def login_with_code():
         _push_ban_notice(ban_reason, ban_details)
         flash('账户访问受限||您的账户已被禁用，请点击申诉按钮或联系管理员。', 'error')
         return redirect('/user/login')
-    session.pop('verification_code', None); session['username'] = username; flash('登录成功||欢迎回来，{}！'.format(username), 'success'); return redirect('/page/home')
+    session.pop('verification_code', None); invalidate_user_info(username); session['username'] = username; flash('登录成功||欢迎回来，{}！'.format(username), 'success'); return redirect('/page/home')
@@ -1,18 +1,38 @@
+import threading
+import time
+from collections import OrderedDict
+
 from utils.query import query
 from itsdangerous import URLSafeTimedSerializer
-from flask import current_app
+from flask import current_app, g, has_app_context
+
+# --- 用户信息缓存配置 ---
+# 同一请求内重复调用直接命中 flask.g；跨请求使用进程内的 TTL + LRU 缓存。
+# 本进程内的资料/密码/头像/封禁修改会显式失效；其他进程的修改最多延迟 ttl 秒可见。
+USER_CACHE_CONFIG = {
+    'ttl': 30,         # 秒
+    'max_size': 1024,  # 最多缓存的用户数
+}
+
+_user_cache = OrderedDict()  # username -> (过期时间, 用户信息)
+_user_cache_lock = threading.Lock()
+
 
 def get_serializer():
     """Create a URLSafeTimedSerializer using current app's secret key."""
     secret = current_app.config.get('SECRET_KEY') or current_app.secret_key
     return URLSafeTimedSerializer(secret)
 
-def get_current_user_info(username):
-    """
-    一个独立的用户信息获取函数，不依赖于任何蓝图或app实例。
-    """
-    if not username:
+
+def _request_memo():
+    if not has_app_context():
         return None
+    if not hasattr(g, '_user_info_memo'):
+        g._user_info_memo = {}
+    return g._user_info_memo
+
+
+def _load_user_info(username):
     # 在查询中增加 status 字段
     user_data = query(
         "SELECT role, avatar, createTime, nickname, email, status FROM user WHERE username = %s LIMIT 1",
@@ -30,3 +50,60 @@ def get_current_user_info(username):
             'status': status
         }
     return None
+
+
+def get_current_user_info(username):
+    """
+    一个独立的用户信息获取函数，不依赖于任何蓝图或app实例。
+    结果先查请求内缓存（flask.g），再查进程内 TTL 缓存，都未命中才查询数据库。
+    """
+    if not username:
+        return None
+    memo = _request_memo()
+    if memo is not None and username in memo:
+        info = memo[username]
+        return dict(info) if info else None
+
+    now = time.monotonic()
+    with _user_cache_lock:
+        entry = _user_cache.get(username)
+        if entry and entry[0] > now:
+            _user_cache.move_to_end(username)
+            info = entry[1]
+        else:
+            info = None
+            if entry:
+                del _user_cache[username]
+
+    if info is None:
+        info = _load_user_info(username)
+        if info is not None:
+            with _user_cache_lock:
+                _user_cache[username] = (now + USER_CACHE_CONFIG['ttl'], info)
+                _user_cache.move_to_end(username)
+                while len(_user_cache) > USER_CACHE_CONFIG['max_size']:
+                    _user_cache.popitem(last=False)
+
+    if memo is not None:
+        memo[username] = info
+    return dict(info) if info else None
+
+
+def invalidate_user_info(username=None, email=None):
+    """
+    用户资料、密码、头像或封禁状态修改后调用，清除该用户的缓存（请求内与进程内）。
+    只知道邮箱时（如通过邮件重置密码）按邮箱匹配。
+    """
+    with _user_cache_lock:
+        if username is not None:
+            _user_cache.pop(username, None)
+        if email is not None:
+            for name in [n for n, (_, info) in _user_cache.items() if info.get('email') == email]:
+                del _user_cache[name]
+    memo = _request_memo()
+    if memo:
+        if username is not None:
+            memo.pop(username, None)
+        if email is not None:
+            for name in [n for n, info in memo.items() if info and info.get('email') == email]:
+                del memo[name]